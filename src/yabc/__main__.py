@@ -11,34 +11,85 @@ python -m yabc statement_from_coinbase.csv my_gemini_statement.csv adhoc.csv
 File types are automatically detected.
 """
 import argparse
+import collections
+import decimal
 import sys
 
 import yabc.transaction_parser
 from yabc import basis
 from yabc import coinpool
+from yabc import parsecache
 from yabc.costbasisreport import ReportBatch
 
 
+def _print_streamed_reports(processor):
+    """
+    Print reports as the processor yields them, followed by the same totals
+    as ReportBatch.human_readable_report().
+    """
+    count = 0
+    totals = collections.defaultdict(decimal.Decimal)
+    for reports, flags in processor.process_iter():
+        for flag in flags:
+            print(flag, file=sys.stderr)
+        for report in reports:
+            count += 1
+            for key in ReportBatch.KEYS:
+                totals[key] += getattr(report, key)
+            print(report)
+    print("\n{} transactions reported".format(count))
+    print(
+        "\ntotal gain or loss for above transactions: {}".format(totals["gain_or_loss"])
+    )
+    print("\ntotal basis for above transactions: {}".format(totals["basis"]))
+    print("total proceeds for above transactions: {}".format(totals["proceeds"]))
+
+
 def main():
     parser = argparse.ArgumentParser()
     yabc.formats.add_supported_exchanges()
     parser.add_argument("filenames", nargs="+", metavar="filename")
+    parser.add_argument(
+        "--stream",
+        action="store_true",
+        help="print each report as soon as it is calculated, without holding all of them in memory",
+    )
+    parser.add_argument(
+        "--jobs",
+        type=int,
+        default=1,
+        help="parse the input files on this many processes",
+    )
+    parser.add_argument(
+        "--cache-dir",
+        help="reuse transactions parsed from identical files, stored in this directory",
+    )
     args = parser.parse_args()
     tx_files = [
         yabc.transaction_parser.TxFile(open(fname), open(fname, "br"), None)
         for fname in args.filenames
     ]
-    parser = yabc.transaction_parser.TransactionParser(tx_files)
+    cache = None
+    if args.cache_dir:
+        cache = parsecache.DirectoryCache(args.cache_dir)
+    parser = yabc.transaction_parser.TransactionParser(
+        tx_files, max_workers=args.jobs, cache=cache
+    )
     parser.parse()
     if parser.flags:
         for flag in parser.flags:
             print(flag, file=sys.stderr)
         print("Quitting yabc.", file=sys.stderr)
         sys.exit(1)
-    processor = basis.BasisProcessor(coinpool.PoolMethod.FIFO, parser.txs)
-    reports = processor.process()
-    batch = ReportBatch(reports)
-    print(batch.human_readable_report())
+    if args.stream:
+        txs = sorted(parser.txs, key=lambda tx: tx.date)
+        processor = basis.BasisProcessor(coinpool.PoolMethod.FIFO, txs)
+        _print_streamed_reports(processor)
+    else:
+        processor = basis.BasisProcessor(coinpool.PoolMethod.FIFO, parser.txs)
+        reports = processor.process()
+        batch = ReportBatch(reports)
+        print(batch.human_readable_report())
     print("Remaining coins after sales:")
     for symbol in processor.get_pool().known_symbols():
         for coin in processor.get_pool().get(symbol):
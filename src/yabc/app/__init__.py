@@ -5,6 +5,8 @@ from flask import Flask
 import yabc.server.sql_backend
 import yabc.server.yabc_api
 from yabc import ohlcprovider
+from yabc import ohlcstore
+from yabc import pricegraph
 
 
 def create_app(test_config=None):
@@ -15,10 +17,14 @@ def create_app(test_config=None):
     2) any DATABASE value set in config.py
     3) sqlite:///{app.instance_path}/yabc.sqlite
 
+    Prices come from the OHLC store in OHLC_DIR, if set, through a cache of
+    OHLC_CACHE_SIZE prices. Recent prices expire after OHLC_CACHE_TTL seconds
+    when that is set. Trades are valued at each candle's OHLC_PRICE_FIELD,
+    "high" by default. Coins without fiat prices in the store are priced
+    through the quotes it holds, such as XLM-BTC.
     """
 
     app = Flask(__name__, instance_relative_config=True)
-    app.ohlc = ohlcprovider.OhlcProvider()
     app.config.from_mapping(
         SECRET_KEY="dev",
         DATABASE="sqlite:///{}".format(os.path.join(app.instance_path, "yabc.sqlite")),
@@ -33,7 +39,20 @@ def create_app(test_config=None):
     except OSError:
         pass
 
+    price_field = app.config.get("OHLC_PRICE_FIELD", "high")
+    if app.config.get("OHLC_DIR"):
+        store = ohlcstore.OhlcStore(app.config["OHLC_DIR"], price_field)
+        app.ohlc = pricegraph.PriceGraph(store, pricegraph.pairs_in(store.symbols()))
+    else:
+        app.ohlc = ohlcprovider.OhlcProvider(price_field)
+    app.ohlc = ohlcprovider.CachingOhlcProvider(
+        app.ohlc,
+        max_size=app.config.get("OHLC_CACHE_SIZE", 100000),
+        recent_ttl=app.config.get("OHLC_CACHE_TTL"),
+    )
+
     app.register_blueprint(yabc.server.yabc_api.bp)
+    app.cli.add_command(ohlcstore.load_ohlc_command)
     yabc.server.sql_backend.init_app(app)
 
     return app
@@ -2,10 +2,16 @@
 Calculate the cost basis.
 """
 import csv
+import datetime
 import decimal
 import io
+import itertools
 from decimal import Decimal
+from typing import Iterable
+from typing import Iterator
+from typing import List
 from typing import Sequence
+from typing import Tuple
 
 from yabc import coinpool
 from yabc import ohlcprovider
@@ -16,6 +22,17 @@ from yabc.transaction import is_fiat
 
 BASIS_INFORMATION_FLAG = "Transaction without basis information"
 
+# Transactions whose prices are looked up together, in one get_many() call.
+PREFETCH_BATCH = 1000
+
+# Saving a pool costs roughly as much per coin as processing a transaction,
+# so checkpoints are only taken at a month boundary once at least this many
+# transactions, and twice as many as the pool holds coins, have been
+# processed since the last one. That keeps checkpoints to a small share of a
+# full run while bounding how far an incremental run has to replay.
+CHECKPOINT_MIN_TXS = 1000
+CHECKPOINT_TXS_PER_COIN = 2
+
 __author__ = "Robert Karl <robertkarljr@gmail.com>"
 
 
@@ -67,8 +84,8 @@ def _fiat_value_for_trade(
 
     :param prefer_traded: If True, prefer the symbol_traded leg.
     """
-    traded = lambda: ohlc.get(tx.symbol_traded, tx.date).high * tx.quantity_traded
-    received = lambda: ohlc.get(tx.symbol_received, tx.date).high * tx.quantity_received
+    traded = lambda: ohlc.price(tx.symbol_traded, tx.date) * tx.quantity_traded
+    received = lambda: ohlc.price(tx.symbol_received, tx.date) * tx.quantity_received
     if prefer_traded:
         lambdas = (traded, received)
     else:
@@ -145,7 +162,8 @@ def _process_one(trans, pool, ohlc_source=None):
     required to process this one tx.
 
     It is assumed that the coin to sell is at the front, at `pool[0]`, so this
-    works for both LIFO and FIFO.
+    works for both LIFO and FIFO. The number of coins covering a sale is found
+    with a binary search over the pool's running totals.
 
     - If transaction is a buy, just return the add-to-pool op.
     - Otherwise, for a sale:
@@ -169,17 +187,19 @@ def _process_one(trans, pool, ohlc_source=None):
         diff.add(trans.symbol_received, trans)
         return ([], diff, [])
     # At this point, trans is a sell
-    while amount < trans.quantity_traded:
-        pool_index += 1
+    if amount < trans.quantity_traded:
         curr_pool = pool.get(trans.symbol_traded)
-        if pool_index >= len(curr_pool):
+        coins_needed = curr_pool.coins_needed(trans.quantity_traded)
+        if coins_needed is None:
             # If we get here, we have partial information about the tx.
             # Use a basis of zero for the sale.
             flags.append((BASIS_INFORMATION_FLAG, trans))
             basis_information_absent = True
             amount = trans.quantity_traded
+            pool_index = len(curr_pool)
         else:
-            amount += curr_pool[pool_index].quantity_received
+            amount = curr_pool.quantity(coins_needed)
+            pool_index = coins_needed - 1
     needs_split = (amount - trans.quantity_traded) > 1e-5
 
     if needs_split:
@@ -244,7 +264,7 @@ def _get_coin_to_coin_input(trans, ohlc):
 def _build_no_basis_report(
     trans: transaction.Transaction, ohlc: ohlcprovider.OhlcProvider
 ):
-    proceeds = trans.quantity_received * ohlc.get("BTC", trans.date).high
+    proceeds = trans.quantity_received * ohlc.price("BTC", trans.date)
     basis = 0
     if abs(proceeds) < 1:
         return []
@@ -284,7 +304,7 @@ def _build_sale_reports(pool, pool_index, trans, basis_information_absent, ohlc)
         return _build_no_basis_report(trans, ohlc)
     if not is_fiat(trans.fee_symbol):
         try:
-            fees_in_fiat = ohlc.get(trans.fee_symbol, trans.date).high * trans.fees
+            fees_in_fiat = ohlc.price(trans.fee_symbol, trans.date) * trans.fees
         except ohlcprovider.NoDataError:
             fees_in_fiat = decimal.Decimal("0")
     if not is_fiat(trans.symbol_received):
@@ -323,7 +343,7 @@ def _build_sale_reports(pool, pool_index, trans, basis_information_absent, ohlc)
                 sell_fees = trans.fees
             else:
                 try:
-                    sell_fees = ohlc.get(trans.fee_symbol, trans.date).high * trans.fees
+                    sell_fees = ohlc.price(trans.fee_symbol, trans.date) * trans.fees
                 except ohlcprovider.NoDataError:
                     sell_fees = decimal.Decimal("0")
             report = CostBasisReport(
@@ -369,8 +389,102 @@ def reports_to_csv(reports: Sequence[CostBasisReport]):
     return of
 
 
-def _process_all(method, txs, ohlc_source=None):
-    # type: (coinpool.PoolMethod, Sequence[Transaction], ohlcprovider.OhlcProvider) -> Sequence
+def _price_keys(tx):
+    # type: (transaction.Transaction) -> List[Tuple[str, datetime.datetime]]
+    """
+    Every (symbol, date) price that processing `tx` may look up.
+    """
+    if not isinstance(tx, transaction.Transaction) or tx.is_simple_input():
+        return []
+    if tx.operation == transaction.Operation.PERPETUAL_PNL:
+        return [("BTC", tx.date)]
+    keys = []
+    if not is_fiat(tx.fee_symbol):
+        keys.append((tx.fee_symbol, tx.date))
+    if not is_fiat(tx.symbol_received):
+        keys.append((tx.symbol_received, tx.date))
+        keys.append((tx.symbol_traded, tx.date))
+    return keys
+
+
+def _with_prices(txs, ohlc_source):
+    """
+    Pair each transaction with a PriceTable holding the prices it needs.
+
+    Prices for each batch of PREFETCH_BATCH transactions are resolved in a
+    single get_many() call, instead of one get() per lookup.
+    """
+    batch = []
+    for tx in itertools.chain(txs, [None]):
+        if tx is not None:
+            batch.append(tx)
+            if len(batch) < PREFETCH_BATCH:
+                continue
+        if not batch:
+            break
+        keys = [key for curr in batch for key in _price_keys(curr)]
+        prices = ohlcprovider.PriceTable(
+            ohlc_source.get_many(keys) if keys else {}, ohlc_source.price_field
+        )
+        for curr in batch:
+            yield curr, prices
+        batch = []
+
+
+def _month_start(date):
+    # type: (datetime.datetime) -> datetime.datetime
+    return datetime.datetime(date.year, date.month, 1)
+
+
+def _process_iter(pool, txs, ohlc_source=None, checkpoints=None):
+    # type: (coinpool.CoinPool, Iterable[Transaction], ohlcprovider.OhlcProvider, list) -> Iterator
+    """
+    Process date-ordered transactions one at a time, applying each to `pool`.
+
+    Only the pool is held in memory; txs can be any iterator. Prices are
+    looked up ahead of each batch of PREFETCH_BATCH transactions.
+
+    :param checkpoints: optionally, a list. When processing crosses into a
+        new month and enough transactions have been processed since the last
+        checkpoint (see CHECKPOINT_MIN_TXS), a (month start, serialized pool)
+        tuple is appended for the pool as it stood before that month's first
+        transaction.
+    :return: a generator of (reports, flags) tuples, one for each transaction
+        that produced either.
+    """
+    current_month = None
+    since_checkpoint = 0
+    last_date = None
+    if ohlc_source is None:
+        txs = ((tx, None) for tx in txs)
+    else:
+        txs = _with_prices(txs, ohlc_source)
+    for tx, prices in txs:
+        if not isinstance(tx, transaction.Transaction):
+            raise RuntimeError("Need transactions in txs")
+        if last_date is not None and tx.date < last_date:
+            raise RuntimeError("Transactions must be sorted by date")
+        last_date = tx.date
+        if checkpoints is not None:
+            month = _month_start(tx.date)
+            if (
+                current_month is not None
+                and month != current_month
+                and since_checkpoint >= CHECKPOINT_MIN_TXS
+                and since_checkpoint >= CHECKPOINT_TXS_PER_COIN * pool.lot_count()
+            ):
+                checkpoints.append((month, pool.to_json()))
+                since_checkpoint = 0
+            current_month = month
+            since_checkpoint += 1
+        reports, diff, curr_flags = _process_one(tx, pool, prices)
+        pool.apply(diff)
+        if reports or curr_flags:
+            yield reports, curr_flags
+
+
+def _process_all(method, txs, ohlc_source=None, pool=None, checkpoints=None):
+    # type: (coinpool.PoolMethod, Sequence[Transaction], ohlcprovider.OhlcProvider, coinpool.CoinPool, list) -> Sequence
     """
     Create a transaction pool, and iteratively process txs.
 
@@ -378,21 +492,26 @@ def _process_all(method, txs, ohlc_source=None):
 
     :param method: LIFO or FIFO
     :param txs: a list of transactions (doesn't need to be sorted)
+    :param pool: optionally, a pool to continue from instead of an empty one.
+        It must reflect every transaction dated before the first of `txs`.
+    :param checkpoints: see _process_iter.
     :return: reports to be sent to tax authorities, and a tx pool.
     """
     assert method in coinpool.PoolMethod
-    pool = coinpool.CoinPool(method)
+    if pool is None:
+        pool = coinpool.CoinPool(method)
+    assert pool.method == method
     for tx in txs:
         if not isinstance(tx, transaction.Transaction):
             raise RuntimeError("Need transactions in txs")
     to_process = sorted(txs, key=lambda trans: trans.date)
     irs_reports = []
     flags = []
-    for tx in to_process:
-        reports, diff, curr_flags = _process_one(tx, pool, ohlc_source)
-        flags.extend(curr_flags)
-        pool.apply(diff)
+    for reports, curr_flags in _process_iter(
+        pool, to_process, ohlc_source, checkpoints
+    ):
         irs_reports.extend(reports)
+        flags.extend(curr_flags)
     return irs_reports, pool, flags
 
 
@@ -406,14 +525,28 @@ class BasisProcessor:
     See self.pool and self.flags after running process()
     """
 
-    def __init__(self, method, txs, ohlc=ohlcprovider.OhlcProvider()):
-        # type: (coinpool.PoolMethod, Sequence, ohlcprovider.OhlcProvider) -> None
+    def __init__(
+        self,
+        method,
+        txs,
+        ohlc=ohlcprovider.OhlcProvider(),
+        pool=None,
+        take_checkpoints=False,
+    ):
+        # type: (coinpool.PoolMethod, Sequence, ohlcprovider.OhlcProvider, coinpool.CoinPool, bool) -> None
+        """
+        :param pool: a CoinPool to continue from, for example one restored
+            from a checkpoint. `txs` must then only hold later transactions.
+        :param take_checkpoints: if True, save the pool at some month
+            boundaries. See checkpoints() and CHECKPOINT_MIN_TXS.
+        """
         self.ohlc = ohlc
         self._method = method
         self._txs = txs
         self._reports = []
-        self._pool = None
+        self._pool = pool
         self._flags = None
+        self._checkpoints = [] if take_checkpoints else None
 
     def flags(self):
         if self._flags is None:
@@ -424,6 +557,37 @@ class BasisProcessor:
         # type: () -> coinpool.CoinPool
         return self._pool
 
+    def checkpoints(self):
+        """
+        :return: (datetime, str) tuples; the pool, as CoinPool.to_json(),
+            before any transaction on or after that datetime was processed.
+        """
+        if self._checkpoints is None:
+            raise RuntimeError("Checkpoints were not requested")
+        return self._checkpoints
+
+    def process_iter(self):
+        # type: () -> Iterator
+        """
+        Streaming version of process(), for histories too large to hold in
+        memory.
+
+        The txs passed to the constructor can be any iterable, for example a
+        database cursor, but must already be sorted by date. Reports are not
+        kept by the processor; flags and the pool are saved as in process().
+
+        :return: a generator of (reports, flags) tuples, one for each
+            transaction that produced either.
+        """
+        if self._pool is None:
+            self._pool = coinpool.CoinPool(self._method)
+        self._flags = []
+        for reports, flags in _process_iter(
+            self._pool, self._txs, self.ohlc, self._checkpoints
+        ):
+            self._flags.extend(flags)
+            yield reports, flags
+
     def process(self):
         # type: () -> Sequence[CostBasisReport]
         """
@@ -433,7 +597,9 @@ class BasisProcessor:
 
         :return: the CostBasisReports generated.
         """
-        reports, pool, flags = _process_all(self._method, self._txs, self.ohlc)
+        reports, pool, flags = _process_all(
+            self._method, self._txs, self.ohlc, self._pool, self._checkpoints
+        )
         self._reports = reports
         self._pool = pool
         self._flags = flags
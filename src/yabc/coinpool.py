@@ -1,11 +1,20 @@
 #  Copyright (c) 2019. Robert Karl. All rights reserved.
 #  Licensed under the MIT License. See LICENSE in the project root for license information.
+import bisect
+import collections.abc
+import decimal
 import enum
+import itertools
+import json
 from collections import defaultdict
+from typing import Optional
 from typing import Sequence
 
 from yabc import transaction
 
+# Sums of quantities are kept exact; the default context would round them.
+_EXACT = decimal.Context(prec=decimal.MAX_PREC)
+
 
 @enum.unique
 class PoolMethod(enum.Enum):
@@ -37,11 +46,131 @@ class PoolDiff:
         self.to_remove.append((symbol, index))
 
 
+class LotQueue(collections.abc.Sequence):
+    """
+    The coins held for a single symbol, in the order they will be sold.
+
+    Backed by a list that keeps free slots in front of the first live coin.
+    Coins can be consumed from the front, or added at either end, in amortized
+    O(1), and indexing stays O(1). The free space at the front is reclaimed
+    once it dominates the list.
+
+    A running total of quantity_received is kept alongside the coins, so the
+    number of coins needed to cover a sale is found with a binary search.
+    `_cumulative[i]` is the total up to and including `_items[i]`, measured
+    from an arbitrary origin; `_base` is the total just before the first live
+    coin.
+    """
+
+    _MIN_GROWTH = 8
+
+    def __init__(self, coins=()):
+        self._items = []
+        self._cumulative = []
+        self._head = 0
+        self._base = decimal.Decimal(0)
+        for coin in coins:
+            self.append(coin)
+
+    def __len__(self):
+        return len(self._items) - self._head
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return self._items[self._head :][index]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("LotQueue index out of range")
+        return self._items[self._head + index]
+
+    def __iter__(self):
+        return itertools.islice(self._items, self._head, None)
+
+    def __eq__(self, other):
+        if isinstance(other, str) or not isinstance(other, collections.abc.Sequence):
+            return NotImplemented
+        return len(self) == len(other) and all(a == b for a, b in zip(self, other))
+
+    __hash__ = None
+
+    def __repr__(self):
+        return "LotQueue({!r})".format(list(self))
+
+    def _running_total(self):
+        if self._head < len(self._items):
+            return self._cumulative[-1]
+        return self._base
+
+    def append(self, coin):
+        self._cumulative.append(
+            _EXACT.add(self._running_total(), coin.quantity_received)
+        )
+        self._items.append(coin)
+
+    def appendleft(self, coin):
+        if self._head == 0:
+            growth = max(len(self), self._MIN_GROWTH)
+            self._items[0:0] = [None] * growth
+            self._cumulative[0:0] = [None] * growth
+            self._head = growth
+        self._head -= 1
+        self._items[self._head] = coin
+        self._cumulative[self._head] = self._base
+        self._base = _EXACT.subtract(self._base, coin.quantity_received)
+
+    def popleft(self, count=1):
+        """
+        Drop the first `count` coins.
+        """
+        if count > len(self):
+            count = len(self)
+        if count <= 0:
+            return
+        end = self._head + count
+        self._base = self._cumulative[end - 1]
+        for i in range(self._head, end):
+            self._items[i] = None
+            self._cumulative[i] = None
+        self._head = end
+        remaining = len(self)
+        if self._head > self._MIN_GROWTH and self._head > 2 * remaining:
+            # Keep as many free slots in front as there are coins left.
+            del self._items[: self._head - remaining]
+            del self._cumulative[: self._head - remaining]
+            self._head = remaining
+
+    def quantity(self, count):
+        """
+        Total quantity_received of the first `count` coins.
+        """
+        if count <= 0:
+            return decimal.Decimal(0)
+        return _EXACT.subtract(self._cumulative[self._head + count - 1], self._base)
+
+    def coins_needed(self, quantity):
+        # type: (decimal.Decimal) -> Optional[int]
+        """
+        The fewest coins, taken from the front, whose quantities add up to at
+        least `quantity`.
+
+        :return: a count of coins, or None if the whole queue falls short.
+        """
+        if quantity <= 0:
+            return 0
+        target = _EXACT.add(self._base, quantity)
+        end = len(self._items)
+        index = bisect.bisect_left(self._cumulative, target, self._head, end)
+        if index == end:
+            return None
+        return index - self._head + 1
+
+
 def _handle_add_lifo(pool, to_add: transaction.Transaction):
     """
     Simply put any new transaction, including splits, at the beginning.
     """
-    pool.insert(0, to_add)
+    pool.appendleft(to_add)
 
 
 def _handle_add_fifo(pool, to_add: transaction.Transaction):
@@ -50,7 +179,7 @@ def _handle_add_fifo(pool, to_add: transaction.Transaction):
     For split coins, they need to be sold first.
     """
     if to_add.operation == transaction.Operation.SPLIT:
-        pool.insert(0, to_add)
+        pool.appendleft(to_add)
     else:
         assert to_add.operation in [
             transaction.Operation.BUY,
@@ -71,18 +200,26 @@ class CoinPool:
         - if so, need to add BTC to the pool
 
     Internal representation note: by convention, the coins at the START of the
-    list will be sold first. This is for LIFO and FIFO.
+    list will be sold first. This is for LIFO and FIFO. Each symbol's coins are
+    kept in a LotQueue so that sales don't copy the remaining coins.
     """
 
     def __init__(self, method):
         # type: (PoolMethod) -> None
         assert method in PoolMethod
-        self._coins = defaultdict(list)
+        self._coins = defaultdict(LotQueue)
         self.method = method
 
     def known_symbols(self):
         return self._coins.keys()
 
+    def lot_count(self):
+        # type: () -> int
+        """
+        The number of coins held, across every symbol.
+        """
+        return sum(len(coins) for coins in self._coins.values())
+
     def get(self, coin_name):
         # type: (str) -> Sequence[transaction.Transaction]
         """
@@ -91,10 +228,51 @@ class CoinPool:
         Note that it's read-only by convention, and clients who modify the returned value are in for trouble.
         TODO: Consider returning a copy here (?)
 
-        :return: A sequence of Transaction
+        :return: A sequence of Transaction (a LotQueue)
         """
         return self._coins[coin_name]
 
+    def to_json(self):
+        # type: () -> str
+        """
+        Serialize the method and every coin, in selling order, to a string.
+        """
+        return json.dumps(
+            {
+                "method": self.method.name,
+                "coins": {
+                    symbol: [coin.to_record() for coin in coins]
+                    for symbol, coins in self._coins.items()
+                    if coins
+                },
+            }
+        )
+
+    @staticmethod
+    def from_json(contents):
+        # type: (str) -> CoinPool
+        """
+        Rebuild a pool saved with `to_json`.
+        """
+        loaded = json.loads(contents)
+        pool = CoinPool(PoolMethod[loaded["method"]])
+        for symbol, records in loaded["coins"].items():
+            pool._coins[symbol] = LotQueue(
+                transaction.Transaction.from_record(record) for record in records
+            )
+        return pool
+
+    def merge(self, other):
+        # type: (CoinPool) -> None
+        """
+        Take over the coins of another pool that holds none of our symbols.
+        """
+        assert other.method == self.method
+        for symbol, coins in other._coins.items():
+            if symbol in self._coins:
+                raise RuntimeError("Both pools hold {}".format(symbol))
+            self._coins[symbol] = coins
+
     def apply(self, diff: PoolDiff):
         """
         Pop from the front of a list of txs, or add in the correct spot based on method.
@@ -108,4 +286,4 @@ class CoinPool:
             elif self.method == PoolMethod.FIFO:
                 _handle_add_fifo(coin_list, item)
         for symbol, index in diff.to_remove:
-            self._coins[symbol] = self._coins[symbol][index + 1 :]
+            self._coins[symbol].popleft(index + 1)
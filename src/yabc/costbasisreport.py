@@ -13,7 +13,10 @@ from sqlalchemy import Integer
 from sqlalchemy import orm
 
 import yabc
+from yabc.transaction import CENT_PLACES
+from yabc.transaction import RECORD_DATE_FORMAT
 from yabc.transaction import PreciseDecimalString
+from yabc.transaction import ScaledDecimal
 
 CSV_ROWS = [
     "Description of Property",
@@ -70,14 +73,18 @@ class CostBasisReport(yabc.Base):
     ]
 
     __tablename__ = "basis_report"
+    __table_args__ = (
+        sqlalchemy.Index("ix_basis_report_user_id_date_sold", "user_id", "date_sold"),
+    )
     id = Column(Integer, primary_key=True)
     asset_name = Column(sqlalchemy.String)
-    basis = Column(PreciseDecimalString)
+    basis = Column(ScaledDecimal(CENT_PLACES))
     date_purchased = Column(DateTime)
     date_sold = Column(DateTime)
-    proceeds = Column(PreciseDecimalString)
+    proceeds = Column(ScaledDecimal(CENT_PLACES))
+    # Crypto quantities can be finer than a satoshi, so they stay strings.
     quantity = Column(PreciseDecimalString)
-    adjustment = Column(PreciseDecimalString)
+    adjustment = Column(ScaledDecimal(CENT_PLACES))
     long_term = Column(Boolean)
     user_id = Column(sqlalchemy.Integer, ForeignKey("user.id"))
     secondary_asset = Column(sqlalchemy.String)  # Needed for coin/coin trades.
@@ -134,6 +141,52 @@ class CostBasisReport(yabc.Base):
         self.triggering_transaction = triggering_transaction
         self.secondary_asset = secondary_asset
 
+    def to_record(self):
+        """
+        A compact, picklable tuple of the fields needed to rebuild this report
+        with `from_record`. The triggering transaction is not included.
+        """
+        return (
+            self.user_id,
+            str(self.basis),
+            str(self.quantity),
+            self.date_purchased.strftime(RECORD_DATE_FORMAT),
+            str(self.proceeds),
+            self.date_sold.strftime(RECORD_DATE_FORMAT),
+            self.asset_name,
+            str(self.adjustment),
+            self.secondary_asset,
+        )
+
+    @staticmethod
+    def from_record(record, triggering_transaction=None):
+        """
+        Inverse of `to_record`.
+        """
+        (
+            userid,
+            basis,
+            quantity,
+            date_purchased,
+            proceeds,
+            date_sold,
+            asset,
+            adjustment,
+            secondary_asset,
+        ) = record
+        return CostBasisReport(
+            userid,
+            Decimal(basis),
+            Decimal(quantity),
+            datetime.datetime.strptime(date_purchased, RECORD_DATE_FORMAT),
+            Decimal(proceeds),
+            datetime.datetime.strptime(date_sold, RECORD_DATE_FORMAT),
+            asset,
+            adjustment=Decimal(adjustment),
+            triggering_transaction=triggering_transaction,
+            secondary_asset=secondary_asset,
+        )
+
     def _is_long_term(self):
         return (self.date_sold - self.date_purchased) > datetime.timedelta(364)
 
@@ -4,11 +4,39 @@
 from . import formatbase
 
 Format = formatbase.Format
+FileSample = formatbase.FileSample
 
 
 FORMAT_CLASSES = []
 
 
+def detect(sample):
+    # type: (FileSample) -> list
+    """
+    The formats to try for a file, most likely first: those whose signature
+    matches the sample. If none does, formats without a signature.
+    """
+    matches = []
+    unsure = []
+    for constructor in FORMAT_CLASSES:
+        sniffed = constructor.sniff(sample)
+        if sniffed:
+            matches.append(constructor)
+        elif sniffed is None:
+            unsure.append(constructor)
+    return matches or unsure
+
+
+def candidates(sample):
+    # type: (FileSample) -> list
+    """
+    Every format, in the order to try parsing a file: detect()'s first, then
+    the rest, in case a signature is out of date.
+    """
+    likely = detect(sample)
+    return likely + [c for c in FORMAT_CLASSES if c not in likely]
+
+
 def add_supported_exchanges():
     """
     TODO: these are circular imports; these files then attempt to import THIS file.
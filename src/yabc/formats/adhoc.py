@@ -6,11 +6,10 @@ import csv
 import datetime
 import decimal
 
-import delorean
-
 from yabc import transaction
 from yabc.formats import FORMAT_CLASSES
 from yabc.formats import Format
+from yabc.formats.timestamps import TimestampParser
 
 _TRANSACTION_TYPE_HEADER = "Type"
 _RECEIVED_CURRENCY = "ReceivedCurrency"
@@ -52,6 +51,7 @@ class AdhocParser(Format):
     FORMAT_NAME = "adhoc CSV"
     EXCHANGE_HUMAN_READABLE_NAME = "adhoc"
     _EXCHANGE_ID_STR = "adhoc"
+    HEADER_TOKENS = tuple(_FIELD_NAMES)
 
     def validate_headers(self, curr):
         for header_name in _FIELD_NAMES:
@@ -73,20 +73,14 @@ class AdhocParser(Format):
             self.validate_headers(csv_file[0])
         else:
             csv_file.seek(0)
-            contents = []
-            while True:
-                line = csv_file.readline()
-                if line:
-                    contents.append(line)
-                else:
-                    break
-            rawcsv = list(csv.reader(contents))
-            if not rawcsv:
+            # Only the header row is read up front.
+            fieldnames = next(csv.reader([csv_file.readline()]), None)
+            if not fieldnames:
                 raise RuntimeError("not enough rows in adhoc file {}".format(csv_file))
-            fieldnames = rawcsv[0]
             self.validate_headers(fieldnames)
             csv_file.seek(0)
         self._file = csv_file
+        self._timestamps = TimestampParser()
         self.reader = csv.DictReader(self._file)
 
     def __next__(self):
@@ -99,7 +93,7 @@ class AdhocParser(Format):
                 op = t
         if not op:
             return transaction.Transaction(operation=transaction.Operation.NOOP)
-        trans_date = delorean.parse(curr[_TIMESTAMP_HEADER], dayfirst=False).datetime
+        trans_date = self._timestamps.parse(curr[_TIMESTAMP_HEADER])
 
         if op == transaction.Operation.MINING:
             return _handle_mining(trans_date, curr)
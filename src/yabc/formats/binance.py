@@ -9,12 +9,11 @@ import datetime
 import decimal
 from typing import Sequence
 
-import delorean
-import openpyxl
-
 from yabc import transaction
 from yabc.formats import FORMAT_CLASSES
 from yabc.formats import Format
+from yabc.formats.formatbase import xlsx_rows
+from yabc.formats.timestamps import TimestampParser
 
 _HEADERS = (
     "Date(UTC)",
@@ -141,65 +140,65 @@ def _transaction_from_binance_dict(
 
 def _raise_if_headers_bad(row):
     for i, h in enumerate(_HEADERS):
-        if not row[i].value == h:
+        if not row[i] == h:
             raise RuntimeError(
-                "Not a valid Binance file, header {} found".format(row[i].value)
+                "Not a valid Binance file, header {} found".format(row[i])
             )
 
 
-def _tx_from_binance_row(line):
-    date = delorean.parse(line[0].value, dayfirst=False).datetime
-    market = line[1].value
-    operation = _BINANCE_TYPE_MAP[line[2].value]
-    amount = decimal.Decimal(line[4].value)
-    total = decimal.Decimal(line[5].value)
-    fee = decimal.Decimal(line[6].value)
-    fee_coin = line[7].value
+def _tx_from_binance_row(line, timestamps=None):
+    """
+    :param timestamps: the TimestampParser for the file the row came from.
+    """
+    date = (timestamps or TimestampParser()).parse(line[0])
+    market = line[1]
+    operation = _BINANCE_TYPE_MAP[line[2]]
+    amount = decimal.Decimal(line[4])
+    total = decimal.Decimal(line[5])
+    fee = decimal.Decimal(line[6])
+    fee_coin = line[7]
     return _transaction_from_binance_dict(
         date, market, operation, amount, total, fee, fee_coin
     )
 
 
-def _read_binance_txs_from_file(f):
-    ans = []
-    f.seek(0)
-    workbook = openpyxl.load_workbook(f)
-    sheet = workbook.active
-    all_contents = list(sheet.rows)
-    _raise_if_headers_bad(all_contents[0])
-    contents = all_contents[1:]
-    for row in contents:
-        item = _tx_from_binance_row(row)
-        if item is not None:
-            ans.append(item)
-    return ans
+def _read_binance_rows(f):
+    """
+    Check the header row and return an iterator over the remaining rows.
+    """
+    rows = xlsx_rows(f)
+    try:
+        header = next(rows, None)
+        if header is None:
+            raise RuntimeError("Not a valid Binance file, no rows found")
+        _raise_if_headers_bad(header)
+    except:
+        rows.close()
+        raise
+    return rows
 
 
 class BinanceParser(Format):
     EXCHANGE_HUMAN_READABLE_NAME = "Binance"
     _EXCHANGE_ID_STR = _BINANCE_EXCHANGE_ID_STR
+    HEADER_TOKENS = _HEADERS
 
     @staticmethod
     def needs_binary():
         return True
 
-    def parse(self):
-        self._reports = _read_binance_txs_from_file(self._file)
-
     def __init__(self, file=None, filename: str = None):
         self._file = file
-        self._reports = []
         self._filename = filename
-        self.parse()
+        self._transactions = self._parse(_read_binance_rows(self._file))
+
+    def _parse(self, rows):
+        timestamps = TimestampParser()
+        for row in rows:
+            item = _tx_from_binance_row(row, timestamps)
+            if item is not None:
+                yield item
         self.cleanup()
 
-    def __next__(self):
-        if not self._reports:
-            raise StopIteration
-        return self._reports.pop(0)
-
-    def __iter__(self):
-        return self
-
 
 FORMAT_CLASSES.append(BinanceParser)
@@ -8,11 +8,10 @@ import csv
 import datetime
 import decimal
 
-import delorean
-
 from yabc import transaction
 from yabc.formats import FORMAT_CLASSES
 from yabc.formats import Format
+from yabc.formats.timestamps import TimestampParser
 
 _TIMESTAMP_HEADER = "transactTime"
 _TRANSACTION_TYPE_HEADER = "transactType"
@@ -32,13 +31,14 @@ _REQUIRED_HEADERS = [
 class BitMEXParser(Format):
     EXCHANGE_HUMAN_READABLE_NAME = "BitMEX"
     _EXCHANGE_ID_STR = "bitmex"
+    HEADER_TOKENS = tuple(_REQUIRED_HEADERS)
 
     def read_transaction(self, line):
         """
         Return None if the row is not taxable.
         """
         try:
-            date = delorean.parse(line[_TIMESTAMP_HEADER], dayfirst=False).datetime
+            date = self._timestamps.parse(line[_TIMESTAMP_HEADER])
             if date == self._last_date:
                 date += self._trade_time_delta
             self._last_date = date
@@ -64,21 +64,16 @@ class BitMEXParser(Format):
     def __init__(self, open_file):
         self._last_date = None
         self._trade_time_delta = datetime.timedelta(seconds=1)
+        self._timestamps = TimestampParser()
         self._file = open_file
         self._reader = csv.DictReader(open_file)
-        self.txs = []
+        self._transactions = self._parse()
+
+    def _parse(self):
         for line in self._reader:
             tx = self.read_transaction(line)
             if tx is not None:
-                self.txs.append(tx)
-
-    def __iter__(self):
-        return self
-
-    def __next__(self):
-        if not self.txs:
-            raise StopIteration
-        return self.txs.pop(0)
+                yield tx
 
     def cleanup(self):
         try:
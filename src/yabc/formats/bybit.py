@@ -4,12 +4,11 @@ Bybit perpetual PnL.
 
 import decimal
 
-import delorean
-import openpyxl
-
 from yabc import transaction
 from yabc.formats import FORMAT_CLASSES
 from yabc.formats import Format
+from yabc.formats.formatbase import xlsx_rows
+from yabc.formats.timestamps import TimestampParser
 
 _TIMESTAMP_INDEX = 0
 _TYPE_INDEX = 2
@@ -24,32 +23,32 @@ _TYPE_CELL_CONTENTS = "Realized P&L"
 class BybitPNLParser(Format):
     EXCHANGE_HUMAN_READABLE_NAME = "Bybit PnL"
     _EXCHANGE_ID_STR = "bybit"
+    HEADER_TOKENS = tuple(_REQUIRED_HEADERS)
 
     @staticmethod
     def needs_binary():
         return True
 
-    def _check_headers(self):
-        vals = [cell.value for cell in self._rows[0]]
-        for header in _REQUIRED_HEADERS:
-            if header not in vals:
-                raise ValueError("Required header '{}' not found".format(header))
+    def _check_headers(self, header):
+        for name in _REQUIRED_HEADERS:
+            if name not in header:
+                raise ValueError("Required header '{}' not found".format(name))
 
     def read_transaction(self, line):
         """
         Return None if the row is not taxable.
         """
         try:
-            if line[_TYPE_INDEX].value != _TYPE_CELL_CONTENTS:
+            if line[_TYPE_INDEX] != _TYPE_CELL_CONTENTS:
                 return None
-            amt = decimal.Decimal(str(line[_AMOUNT_INDEX].value))
-            date = delorean.parse(line[_TIMESTAMP_INDEX].value, dayfirst=False).datetime
+            amt = decimal.Decimal(str(line[_AMOUNT_INDEX]))
+            date = self._timestamps.parse(line[_TIMESTAMP_INDEX])
             # realized profit is measured in BTC
             return transaction.Transaction(
                 operation=transaction.Operation.PERPETUAL_PNL,
                 quantity_received=amt,
                 quantity_traded=0,
-                symbol_traded=line[_ADDRESS_INDEX].value,
+                symbol_traded=line[_ADDRESS_INDEX],
                 symbol_received="BTC",
                 date=date,
                 fees=decimal.Decimal(0),
@@ -62,23 +61,20 @@ class BybitPNLParser(Format):
 
     def __init__(self, open_file):
         self._file = open_file
-        open_file.seek(0)
-        workbook = openpyxl.load_workbook(open_file)
-        self._rows = list(workbook.active.rows)
-        self._check_headers()
-        self.txs = []
-        for line in self._rows[1:]:
+        self._timestamps = TimestampParser()
+        rows = xlsx_rows(open_file)
+        try:
+            self._check_headers(next(rows, ()))
+        except:
+            rows.close()
+            raise
+        self._transactions = self._parse(rows)
+
+    def _parse(self, rows):
+        for line in rows:
             tx = self.read_transaction(line)
             if tx is not None:
-                self.txs.append(tx)
-
-    def __iter__(self):
-        return self
-
-    def __next__(self):
-        if not self.txs:
-            raise StopIteration
-        return self.txs.pop(0)
+                yield tx
 
     def cleanup(self):
         try:
@@ -5,79 +5,99 @@ YABC is not affiliated with the company Coinbase or any of its products.
 """
 import csv
 import decimal
+import itertools
 
 from dateutil import parser
 
 from yabc import transaction
 from yabc.formats import FORMAT_CLASSES
 from yabc.formats import Format
+from yabc.formats.formatbase import close_after
+from yabc.formats.timestamps import TimestampParser
 
 
-def from_coinbase(f):
+def _coinbase_rows(f):
     """
+    Check the preamble and header of a coinbase file.
+
     :param f: a file-like object with csv data.
-    @return dictionaries with coinbase fields
+    :return: a generator of dictionaries with coinbase fields, reading the
+        rest of `f` as it goes.
     """
     f.seek(0)
-    rawcsv = [i for i in csv.reader(f)]
-    if len(rawcsv) < 5:
+    preamble = list(itertools.islice(csv.reader(f), 5))
+    if len(preamble) < 5:
         raise RuntimeError("Invalid CSV file, not enough rows.")
-    fieldnames = rawcsv[4]
+    fieldnames = preamble[4]
     if not len(fieldnames) >= 2 or not fieldnames[-2].count("Coinbase") > 0:
         raise RuntimeError("Invalid coinbase file encountered")
     fieldnames[-1] = "Bitcoin Hash"
     fieldnames[-2] = "Coinbase ID"
-    f.seek(0)
-    transactions = [i for i in csv.DictReader(f, fieldnames)]
     # Previously, coinbase column 4 had timestamp.  Documents generated as
     # of April 2019 have it as the first column.
-    # First meaningful row is 4; 3 has headers so we can check that.
-    assert transactions[3]["Timestamp"] == "Timestamp"
-    transactions = transactions[4:]
-    for i in transactions:
-        assert "Coinbase ID" in i
+    assert "Timestamp" in fieldnames
+    return _usd_rows(csv.DictReader(f, fieldnames))
+
+
+def _usd_rows(reader):
+    for i in reader:
         i["Site"] = "Coinbase"
-    USD_and_back = [
-        i
-        for i in transactions
-        if (i["Transfer Total"] is not "" and i["Transfer Total"] is not None)
-    ]
-    return USD_and_back
+        if i["Transfer Total"] != "" and i["Transfer Total"] is not None:
+            yield i
+
+
+def from_coinbase(f):
+    """
+    :param f: a file-like object with csv data.
+    @return dictionaries with coinbase fields
+    """
+    return list(_coinbase_rows(f))
 
 
 def txs_from_coinbase(f):
     """
     :param f: a filelike object with CSV data
-    :return: a list of transaction.Transaction
+    :return: a generator of transaction.Transaction
+    """
+    timestamps = coinbase_timestamps()
+    return (FromCoinbaseJSON(i, timestamps) for i in _coinbase_rows(f))
+
+
+def coinbase_timestamps():
+    """
+    A TimestampParser that agrees with dateutil, which coinbase rows have
+    always been parsed with.
     """
-    dicts = from_coinbase(f)
-    return [FromCoinbaseJSON(i) for i in dicts]
+    return TimestampParser(fallback=parser.parse, yearfirst=False)
 
 
 class CoinbaseParser(Format):
     FORMAT_NAME = "Coinbase (Trades Format)"
     EXCHANGE_HUMAN_READABLE_NAME = "Coinbase"
     _EXCHANGE_ID_STR = "coinbase"
+    HEADER_TOKENS = (
+        "Timestamp",
+        "Amount",
+        "Currency",
+        "Transfer Total",
+        "Transfer Fee",
+    )
 
     def __init__(self, file_or_fname):
         self._file = file_or_fname
-        self._reports = []
         if isinstance(file_or_fname, str):
-            with open(file_or_fname) as f:
-                self._reports = txs_from_coinbase(f)
+            f = open(file_or_fname)
+            try:
+                txs = txs_from_coinbase(f)
+            except Exception:
+                f.close()
+                raise
+            self._transactions = close_after(txs, f)
         else:
-            self._reports = txs_from_coinbase(file_or_fname)
-
-    def __iter__(self):
-        return self
-
-    def __next__(self):
-        if not self._reports:
-            raise StopIteration
-        return self._reports.pop(0)
+            self._transactions = txs_from_coinbase(file_or_fname)
 
 
-def FromCoinbaseJSON(json):
+def FromCoinbaseJSON(json, timestamps=None):
     """
     Arguments:
         json (dict): a coinbase-style dictionary with the following fields:
@@ -86,6 +106,7 @@ def FromCoinbaseJSON(json):
             - 'Amount': the amount of bitcoin sold. (It's negative for sales.)
             - 'Currency': which cryptocurrency was involved.
             - 'Timestamp': 'hour:min:sec.millisecs' formatted timestamp.
+        timestamps (TimestampParser): shared by the rows of one file.
     Returns: Transaction instance with important fields populated
     """
     operation = transaction.Transaction.Operation.BUY
@@ -97,11 +118,15 @@ def FromCoinbaseJSON(json):
         operation = transaction.Transaction.Operation.SELL
         quantity = abs(quantity)
     timestamp_str = json["Timestamp"]
+    if timestamps is None:
+        date = parser.parse(timestamp_str)
+    else:
+        date = timestamps.parse(timestamp_str)
     return transaction.Transaction(
         asset_name=asset_name,
         operation=operation,
         quantity=quantity,
-        date=parser.parse(timestamp_str),
+        date=date,
         fees=fee,
         source="coinbase",
         usd_subtotal=proceeds,
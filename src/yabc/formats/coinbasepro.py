@@ -2,11 +2,10 @@ import csv
 import datetime
 import decimal
 
-import delorean
-
 from yabc import transaction
 from yabc.formats import FORMAT_CLASSES
 from yabc.formats import Format
+from yabc.formats.timestamps import TimestampParser
 
 _DATE_HEADER = "created at"
 _SIZE_HEADER = "size"
@@ -145,8 +144,11 @@ def _raise_if_headers_bad(row):
             raise RuntimeError("Not a valid Coinbase Pro/Prime file.")
 
 
-def _tx_from_row(line):
-    date = delorean.parse(line[_DATE_HEADER], dayfirst=False).datetime
+def _tx_from_row(line, timestamps=None):
+    """
+    :param timestamps: the TimestampParser for the file the row came from.
+    """
+    date = (timestamps or TimestampParser()).parse(line[_DATE_HEADER])
     market = CoinbaseProMarket(line[_MARKET_HEADER])
     operation = _TYPE_MAP[line[_ORDER_TYPE_HEADER]]
     leg1 = FinancialQuantity(
@@ -159,42 +161,33 @@ def _tx_from_row(line):
     return _make_transaction(date, market, operation, leg1, leg2, fee)
 
 
-def _read_txs_from_file(f):
-    ans = []
+def _read_rows(f):
+    """
+    Check the header and return a reader over the remaining rows.
+    """
     f.seek(0)
-    contents = csv.DictReader(f)
-    checked_headers = False
-    for row in contents:
-        if not checked_headers:
-            _raise_if_headers_bad(row)
-            checked_headers = True
-        item = _tx_from_row(row)
-        if item is not None:
-            ans.append(item)
-    return ans
+    reader = csv.DictReader(f)
+    _raise_if_headers_bad(reader.fieldnames or [])
+    return reader
 
 
 class CoinbaseProParser(Format):
     EXCHANGE_HUMAN_READABLE_NAME = "Coinbase Pro/Prime"
     _EXCHANGE_ID_STR = "coinbasepro"
-
-    def parse(self):
-        self._reports = _read_txs_from_file(self._file)
+    HEADER_TOKENS = tuple(_HEADERS)
 
     def __init__(self, file=None, filename: str = None):
         self._file = file
-        self._reports = []
         self._filename = filename
-        self.parse()
+        self._transactions = self._parse(_read_rows(self._file))
+
+    def _parse(self, rows):
+        timestamps = TimestampParser()
+        for row in rows:
+            item = _tx_from_row(row, timestamps)
+            if item is not None:
+                yield item
         self.cleanup()
 
-    def __next__(self):
-        if not self._reports:
-            raise StopIteration
-        return self._reports.pop(0)
-
-    def __iter__(self):
-        return self
-
 
 FORMAT_CLASSES.append(CoinbaseProParser)
@@ -10,11 +10,10 @@ import csv
 import datetime
 import decimal
 
-import delorean
-
 from yabc import transaction
 from yabc.formats import FORMAT_CLASSES
 from yabc.formats import Format
+from yabc.formats.timestamps import TimestampParser
 
 TIMESTAMP_HEADER = "Timestamp"
 TRANSACTION_TYPE_HEADER = "Transaction Type"
@@ -40,6 +39,8 @@ class CoinbaseTTRParser(Format):
     FORMAT_NAME = "Coinbase (Tax Transaction Report Format)"
     EXCHANGE_HUMAN_READABLE_NAME = "Coinbase"
     _EXCHANGE_ID_STR = "coinbase"
+    # Later columns have been renamed between report versions.
+    HEADER_TOKENS = tuple(_ALL_HEADERS[:5])
 
     def attempt_read_transaction(self, line):
         """
@@ -53,7 +54,7 @@ class CoinbaseTTRParser(Format):
                 tx_type = transaction.Transaction.Operation.SELL
             else:
                 return None
-            date = delorean.parse(line[TIMESTAMP_HEADER], dayfirst=False).datetime
+            date = self._timestamps.parse(line[TIMESTAMP_HEADER])
             if date == self._last_date:
                 date += self._trade_time_delta
             self._last_date = date
@@ -87,6 +88,7 @@ class CoinbaseTTRParser(Format):
     def __init__(self, csv_content=None, filename=None):
         self._last_date = None
         self._trade_time_delta = datetime.timedelta(seconds=1)
+        self._timestamps = TimestampParser()
         if csv_content:
             assert not filename
             csv_content.seek(0)
@@ -96,25 +98,17 @@ class CoinbaseTTRParser(Format):
             assert not csv_content
             self._file = open(filename, "r")
             self._reader = csv.DictReader(self._file, fieldnames=_ALL_HEADERS)
-        self.txs = []
-        header_checked = False
+        disclaimer = next(self._reader, None)
+        if disclaimer is not None and "Coinbase" not in disclaimer[TIMESTAMP_HEADER]:
+            # The first line has a disclaimer which contains the word Coinbase
+            raise RuntimeError("Not a Coinbase TTR")
+        self._transactions = self._parse()
+
+    def _parse(self):
         for line in self._reader:
-            if not header_checked:
-                if "Coinbase" not in line[TIMESTAMP_HEADER]:
-                    # The first line has a disclaimer which contains the word Coinbase
-                    raise RuntimeError("Not a Coinbase TTR")
-                header_checked = True
             tx = self.attempt_read_transaction(line)
             if tx is not None:
-                self.txs.append(tx)
-
-    def __iter__(self):
-        return self
-
-    def __next__(self):
-        if not self.txs:
-            raise StopIteration
-        return self.txs.pop(0)
+                yield tx
 
     def cleanup(self):
         try:
@@ -0,0 +1,94 @@
+"""
+Unpack compressed uploads: gzip, bz2 or xz files, and zip archives holding
+several exports.
+
+Everything is decompressed in memory, in chunks, and stops with an error as
+soon as the total passes a cap, so a small upload can't expand without bound.
+"""
+import bz2
+import gzip
+import lzma
+import zipfile
+from typing import List
+from typing import Optional
+
+# The most uncompressed data accepted from a single upload.
+MAX_UNCOMPRESSED_BYTES = 256 * 1024 * 1024
+
+_CHUNK_BYTES = 1024 * 1024
+
+_STREAM_FORMATS = (
+    (b"\x1f\x8b", lambda f: gzip.GzipFile(fileobj=f, mode="rb")),
+    (b"BZh", bz2.BZ2File),
+    (b"\xfd7zXZ\x00", lzma.LZMAFile),
+)
+_ZIP_MAGIC = b"PK\x03\x04"
+
+# Present in every xlsx file, which is itself a zip archive.
+_XLSX_MEMBER = "[Content_Types].xml"
+
+
+def _read_capped(stream, budget, limit):
+    """
+    :return: the rest of `stream`, if it is no longer than `budget` bytes.
+    """
+    chunks = []
+    size = 0
+    while True:
+        chunk = stream.read(min(_CHUNK_BYTES, budget - size + 1))
+        if not chunk:
+            return b"".join(chunks)
+        size += len(chunk)
+        if size > budget:
+            raise RuntimeError(
+                "Upload is larger than {} bytes uncompressed".format(limit)
+            )
+        chunks.append(chunk)
+
+
+def _is_hidden(name):
+    return any(part.startswith((".", "__MACOSX")) for part in name.split("/"))
+
+
+def decompress(f, limit=MAX_UNCOMPRESSED_BYTES):
+    # type: (...) -> Optional[List[bytes]]
+    """
+    :param f: a binary file-like object.
+    :param limit: the most bytes to decompress, in total.
+    :return: the contents of each file in `f`, or None if `f` is not
+        compressed. An xlsx file is not treated as an archive.
+    """
+    try:
+        return _decompress(f, limit)
+    except (OSError, EOFError, lzma.LZMAError, zipfile.BadZipFile) as e:
+        raise RuntimeError("Could not decompress upload: {}".format(e))
+
+
+def _decompress(f, limit):
+    f.seek(0)
+    magic = f.read(8)
+    f.seek(0)
+    for prefix, opener in _STREAM_FORMATS:
+        if magic.startswith(prefix):
+            with opener(f) as stream:
+                contents = _read_capped(stream, limit, limit)
+            f.seek(0)
+            return [contents]
+    if not magic.startswith(_ZIP_MAGIC):
+        return None
+    with zipfile.ZipFile(f) as archive:
+        names = archive.namelist()
+        if _XLSX_MEMBER in names:
+            f.seek(0)
+            return None
+        members = []
+        budget = limit
+        for info in archive.infolist():
+            if info.filename.endswith("/") or _is_hidden(info.filename):
+                continue
+            with archive.open(info) as member:
+                contents = _read_capped(member, budget, limit)
+            budget -= len(contents)
+            members.append(contents)
+    f.seek(0)
+    return members
@@ -1,17 +1,141 @@
 # Copyright (c) Robert Karl. All rights reserved.
 # Licensed under the MIT License. See LICENSE in the project root for license information.
+import csv
+import itertools
 import logging
+from typing import Optional
+
+import openpyxl
+
+# How much of a file detection looks at.
+SNIFF_BYTES = 64 * 1024
+SNIFF_ROWS = 10
+
+_XLSX_MAGIC = b"PK\x03\x04"
+
+
+class FileSample:
+    """
+    The first rows of an uploaded file, read once so that every Format can
+    check its signature cheaply.
+
+    An xlsx file is recognized by its zip magic. Only its first rows are
+    loaded, in openpyxl's read-only mode.
+    """
+
+    def __init__(self, f, binary_file=None):
+        """
+        :param f: the file open in text mode
+        :param binary_file: the same file open in binary mode, if available
+        """
+        self.is_xlsx = False
+        self._binary_file = binary_file
+        self._xlsx_rows = None
+        if binary_file is not None:
+            binary_file.seek(0)
+            self.is_xlsx = binary_file.read(len(_XLSX_MAGIC)) == _XLSX_MAGIC
+            binary_file.seek(0)
+        self.csv_rows = []
+        if not self.is_xlsx:
+            f.seek(0)
+            try:
+                text = f.read(SNIFF_BYTES)
+            except UnicodeDecodeError:
+                text = ""
+            f.seek(0)
+            if isinstance(text, bytes):
+                text = text.decode("utf-8", errors="replace")
+            lines = text.splitlines()
+            if len(text) == SNIFF_BYTES:
+                # The last line may be cut short.
+                lines = lines[:-1]
+            self.csv_rows = _clean_rows(csv.reader(lines[: SNIFF_ROWS * 2]))
+
+    def xlsx_rows(self):
+        """
+        The first rows of the active sheet, as lists of cell values.
+        """
+        if self._xlsx_rows is None:
+            self._xlsx_rows = []
+            rows = xlsx_rows(self._binary_file)
+            try:
+                self._xlsx_rows = _clean_rows(itertools.islice(rows, SNIFF_ROWS))
+            except Exception as e:
+                logging.info("could not read xlsx sample: {}".format(e))
+            finally:
+                rows.close()
+            self._binary_file.seek(0)
+        return self._xlsx_rows
+
+    def rows(self):
+        return self.xlsx_rows() if self.is_xlsx else self.csv_rows
+
+
+def xlsx_rows(f):
+    """
+    Stream the rows of an xlsx file's active sheet as tuples of cell values.
+
+    The sheet is read with openpyxl in read-only mode, so no cell objects are
+    kept. Rows without any values are skipped, and the rest are padded with
+    None to the width of the first. `f` must stay open until the generator is
+    exhausted or closed.
+    """
+    f.seek(0)
+    workbook = openpyxl.load_workbook(f, read_only=True)
+    try:
+        sheet = workbook.active
+        # Exported files don't always record the sheet's size correctly, and
+        # read-only mode would stop at the recorded last row.
+        sheet.reset_dimensions()
+        width = None
+        for row in sheet.iter_rows(values_only=True):
+            if all(value is None for value in row):
+                continue
+            row = tuple(row)
+            if width is None:
+                width = len(row)
+            elif len(row) < width:
+                row += (None,) * (width - len(row))
+            yield row
+    finally:
+        workbook.close()
+
+
+def close_after(txs, f):
+    """
+    Yield from `txs`, then close the file they are read from.
+    """
+    with f:
+        yield from txs
+
+
+def _clean_rows(rows):
+    return [
+        [cell.strip() if isinstance(cell, str) else cell for cell in row]
+        for row in rows
+        if row
+    ][:SNIFF_ROWS]
 
 
 class Format:
     """
     Base class for formats from various exchanges.
+
+    A format is an iterator of transactions. Subclasses check the file's
+    headers when constructed, then set `_transactions` to a generator that
+    parses one row at a time, so memory use doesn't grow with the file and
+    the first transaction is ready before the file is fully read.
     """
 
     FORMAT_NAME = "Unknown exchange - CSV"
     EXCHANGE_HUMAN_READABLE_NAME = "Unknown exchange"
     _EXCHANGE_ID_STR = "unknown"
 
+    # Column headers that all appear in one of the first rows of a file in
+    # this format. A format without any can't be detected, and is only tried
+    # when no other format matches.
+    HEADER_TOKENS = ()
+
     @classmethod
     def exchange_id_str(cls):
         """
@@ -20,15 +144,35 @@ class Format:
         """
         return cls._EXCHANGE_ID_STR
 
-    def has_next(self):
-        if not self._reports:
-            return False
-        return True
+    _transactions = iter(())
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        return next(self._transactions)
 
     @staticmethod
     def needs_binary():
         return False
 
+    @classmethod
+    def sniff(cls, sample):
+        # type: (FileSample) -> Optional[bool]
+        """
+        Check a file's signature without parsing it.
+
+        :return: True if the sample looks like this format, False if it can't
+            be, and None if this format has no signature.
+        """
+        if not cls.HEADER_TOKENS:
+            return None
+        if cls.needs_binary() != sample.is_xlsx:
+            return False
+        return any(
+            all(token in row for token in cls.HEADER_TOKENS) for row in sample.rows()
+        )
+
     def cleanup(self):
         logging.info("cleaning up file {}".format(self._file))
         if self._file:
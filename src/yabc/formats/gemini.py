@@ -1,10 +1,10 @@
 import datetime
 import decimal
 
-import openpyxl
-
 from yabc import formats
 from yabc import transaction
+from yabc.formats.formatbase import close_after
+from yabc.formats.formatbase import xlsx_rows
 
 _CURRENCIES = ["BCH", "BTC", "ZEC", "ETH", "LTC"]
 _SOURCE_NAME = "gemini"
@@ -27,8 +27,8 @@ def _quantity(tx_row):
     """
     supported = [(10, "BTC"), (13, "ETH"), (16, "ZEC"), (19, "BCH"), (22, "LTC")]
     for index, currency_name in supported:
-        if tx_row[index].value:
-            val = tx_row[index].value
+        if tx_row[index]:
+            val = tx_row[index]
             if isinstance(val, datetime.datetime):
                 # For some reason, for cells that have type 'n', it's possible to end up with a date here.
                 # Could be an issue with openpyxl
@@ -45,14 +45,14 @@ def _tx_from_gemini_row(tx_row):
     :param tx_row: a dictionary with keys from a gemini transaction history spreadsheet.
     :return:  None if not a transaction needed for taxes. Otherwise a Transaction object.
     """
-    if tx_row[_TYPE_INDEX].value not in ("Buy", "Sell"):
+    if tx_row[_TYPE_INDEX] not in ("Buy", "Sell"):
         return None
-    date = tx_row[0].value
-    usd_subtotal = abs(decimal.Decimal(str(tx_row[_AMOUNT_INDEX].value)))
-    fees = abs(decimal.Decimal(str(tx_row[_USD_FEE].value)))
+    date = tx_row[0]
+    usd_subtotal = abs(decimal.Decimal(str(tx_row[_AMOUNT_INDEX])))
+    fees = abs(decimal.Decimal(str(tx_row[_USD_FEE])))
     quantity, currency = _quantity(tx_row)
     quantity = quantity
-    tp = _gemini_type_to_operation(tx_row[_TYPE_INDEX].value)
+    tp = _gemini_type_to_operation(tx_row[_TYPE_INDEX])
     if tp == transaction.Operation.BUY:
         tx = transaction.Transaction(
             operation=tp,
@@ -81,36 +81,42 @@ def _tx_from_gemini_row(tx_row):
 
 
 def _validate_header(row):
-    sheet_headers = [i.value for i in row]
     for header in _GEM_HEADERS:
-        if header not in sheet_headers:
+        if header not in row:
             raise ValueError("Gemini required headers not found '{}'".format(header))
 
 
-def _read_txs_from_file(f):
+def _read_rows(f):
     """
-    Validate headers and read buy/sell transactions from the open file-like object 'f'.
+    Validate headers and return an iterator over the remaining rows of the
+    open file-like object 'f'.
 
     Note: we use the seek method on f.
     """
-    ans = []
-    f.seek(0)
-    workbook = openpyxl.load_workbook(f)
-    sheet = workbook.active
-    all_contents = list(sheet.rows)
-    _validate_header(all_contents[0])
-    contents = all_contents[1:]
-    for row in contents:
+    rows = xlsx_rows(f)
+    try:
+        _validate_header(next(rows, ()))
+    except:
+        rows.close()
+        raise
+    return rows
+
+
+def _txs_from_rows(rows):
+    """
+    Read buy/sell transactions from rows.
+    """
+    for row in rows:
         item = _tx_from_gemini_row(row)
         if item is not None:
-            ans.append(item)
-    return ans
+            yield item
 
 
 class GeminiParser(formats.Format):
     FORMAT_NAME = "Gemini CSV"
     EXCHANGE_HUMAN_READABLE_NAME = "Gemini"
     _EXCHANGE_ID_STR = "gemini"
+    HEADER_TOKENS = tuple(_GEM_HEADERS)
 
     @staticmethod
     def needs_binary():
@@ -121,23 +127,19 @@ class GeminiParser(formats.Format):
         For gemini, which uses XLSX, the open file must be either in binary mode, or the name of a file for openpyxl.
         :param fname_or_file:
         """
-        self.txs = []
         self.flags = []
         self._file = fname_or_file
         if isinstance(fname_or_file, str):
-            with open(fname_or_file, "br") as f:
-                self.txs = _read_txs_from_file(f)
+            f = open(fname_or_file, "br")
+            try:
+                rows = _read_rows(f)
+            except Exception:
+                f.close()
+                raise
+            self._transactions = close_after(_txs_from_rows(rows), f)
         else:
             # it must be an open file
-            self.txs = _read_txs_from_file(fname_or_file)
-
-    def __iter__(self):
-        return self
-
-    def __next__(self):
-        if not self.txs:
-            raise StopIteration
-        return self.txs.pop(0)
+            self._transactions = _txs_from_rows(_read_rows(fname_or_file))
 
 
 def _gemini_type_to_operation(gemini_type: str):
@@ -2,11 +2,10 @@ import csv
 import decimal
 import enum
 
-import delorean
-
 from yabc import transaction
 from yabc.formats import FORMAT_CLASSES
 from yabc.formats import Format
+from yabc.formats.timestamps import TimestampParser
 from yabc.transaction import Operation
 
 
@@ -35,13 +34,18 @@ def _is_sell(trade_type: LocalBitcoinTradeTypes):
 class LocalBitcoinsParser(Format):
     _EXCHANGE_ID_STR = "localbitcoins"
     EXCHANGE_HUMAN_READABLE_NAME = "LocalBitcoins.com"
+    HEADER_TOKENS = (
+        "trade_type",
+        "transaction_released_at",
+        "btc_traded",
+        "fiat_amount",
+        "fiat_fee",
+    )
 
     def attempt_read_transaction(self, line):
         try:
             kind = LocalBitcoinTradeTypes[line["trade_type"]]
-            date = delorean.parse(
-                line["transaction_released_at"], dayfirst=False
-            ).datetime
+            date = self._timestamps.parse(line["transaction_released_at"])
             btc_amount = line["btc_traded"]
             fiat = decimal.Decimal(line["fiat_amount"])
             fiat_fee = decimal.Decimal(line["fiat_fee"])
@@ -73,18 +77,10 @@ class LocalBitcoinsParser(Format):
             assert not csv_content
             self._file = open(filename, "r")
             self._reader = csv.DictReader(self._file)
-        self.txs = []
-        for line in self._reader:
-            tx = self.attempt_read_transaction(line)
-            self.txs.append(tx)
-
-    def __iter__(self):
-        return self
-
-    def __next__(self):
-        if not self.txs:
-            raise StopIteration
-        return self.txs.pop(0)
+        self._timestamps = TimestampParser()
+        self._transactions = (
+            self.attempt_read_transaction(line) for line in self._reader
+        )
 
 
 FORMAT_CLASSES.append(LocalBitcoinsParser)
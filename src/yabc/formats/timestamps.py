@@ -0,0 +1,151 @@
+"""
+Fast timestamp parsing for the rows of one file.
+
+Exchange exports write every timestamp in the same format, but a generic
+parser like delorean.parse works out the format again for each row. A
+TimestampParser checks the first timestamps of a file against a few compiled
+patterns, and once one agrees with the generic parser it handles the rest of
+the file. Anything it doesn't match still goes to the generic parser.
+"""
+import datetime
+import re
+
+import delorean
+
+# Timestamps checked against the generic parser before the fast path is
+# trusted.
+SAMPLE_SIZE = 20
+
+# Parsed timestamps remembered per file. Exports repeat a timestamp for
+# each fill of an order, usually on consecutive rows.
+CACHE_SIZE = 1024
+
+_TIME = r"(?:[T ](\d{1,2}):(\d{2})(?::(\d{2})(?:\.(\d{1,6}))?)?)?"
+_ZONE = r"(Z|[+-]00:?00)?"
+
+# Each pattern's groups are year, month, day, hour, minute, second,
+# fraction and zone, in the order returned by its `fields` function.
+_PATTERNS = {
+    "iso": (
+        re.compile(r"(\d{4})[-/](\d{1,2})[-/](\d{1,2})" + _TIME + _ZONE + r"$"),
+        lambda groups: groups,
+    ),
+    # Month first, four digit year.
+    "us": (
+        re.compile(r"(\d{1,2})/(\d{1,2})/(\d{4})" + _TIME + r"()$"),
+        lambda groups: (groups[2], groups[0], groups[1]) + groups[3:],
+    ),
+    # Month first, two digit year in this century. Only used when the
+    # generic parser doesn't read the first number as the year.
+    "us_short_year": (
+        re.compile(r"(\d{1,2})/(\d{1,2})/([0-4]\d)" + _TIME + r"()$"),
+        lambda groups: ("20" + groups[2], groups[0], groups[1]) + groups[3:],
+    ),
+}
+
+
+def _delorean_parse(text):
+    return delorean.parse(text, dayfirst=False).datetime
+
+
+class TimestampParser:
+    """
+    Parse the timestamps of a single file.
+
+    Results match the generic parser exactly, including tzinfo: the first
+    SAMPLE_SIZE timestamps are parsed both ways, and any disagreement turns
+    the fast path off for the file.
+    """
+
+    def __init__(self, fallback=_delorean_parse, yearfirst=True):
+        """
+        :param fallback: the generic parser, a function from str to datetime.
+            The default is delorean.parse with dayfirst=False.
+        :param yearfirst: whether the fallback reads an ambiguous first number
+            as the year, as delorean does.
+        """
+        self._fallback = fallback
+        self._candidates = ["iso", "us"]
+        if not yearfirst:
+            self._candidates.append("us_short_year")
+        self._pattern = None
+        self._enabled = True
+        self._checked = 0
+        # The tzinfo the fallback attaches, for each zone suffix seen.
+        self._tzinfo = {}
+        self._cache = {}
+
+    def parse(self, text):
+        # type: (str) -> datetime.datetime
+        if not isinstance(text, str):
+            return self._fallback(text)
+        result = self._cache.get(text)
+        if result is None:
+            result = self._parse(text.strip())
+            if len(self._cache) >= CACHE_SIZE:
+                self._cache.clear()
+            self._cache[text] = result
+        return result
+
+    def _parse(self, text):
+        if not self._enabled:
+            return self._fallback(text)
+        if self._checked < SAMPLE_SIZE:
+            return self._check(text)
+        matched = self._match(text, [self._pattern])
+        if matched is None:
+            return self._fallback(text)
+        naive, zone = matched
+        if zone not in self._tzinfo:
+            return self._check(text)
+        return naive.replace(tzinfo=self._tzinfo[zone])
+
+    def _check(self, text):
+        """
+        Parse with the fallback, and compare with the fast path.
+        """
+        expected = self._fallback(text)
+        candidates = [self._pattern] if self._pattern else self._candidates
+        matched = self._match(text, candidates)
+        if matched is None:
+            return expected
+        naive, zone = matched
+        tzinfo = expected.tzinfo
+        if (
+            expected.replace(tzinfo=None) != naive
+            or expected.utcoffset() not in (None, datetime.timedelta(0))
+            or self._tzinfo.get(zone, tzinfo) is not tzinfo
+        ):
+            self._enabled = False
+            return expected
+        self._tzinfo[zone] = tzinfo
+        self._checked += 1
+        return expected
+
+    def _match(self, text, candidates):
+        """
+        :return: a naive datetime and the zone suffix, or None.
+        """
+        for name in candidates:
+            pattern, fields = _PATTERNS[name]
+            match = pattern.match(text)
+            if match is None:
+                continue
+            year, month, day, hour, minute, second, fraction, zone = fields(
+                match.groups()
+            )
+            try:
+                naive = datetime.datetime(
+                    int(year),
+                    int(month),
+                    int(day),
+                    int(hour or 0),
+                    int(minute or 0),
+                    int(second or 0),
+                    int((fraction or "0").ljust(6, "0")),
+                )
+            except ValueError:
+                return None
+            self._pattern = name
+            return naive, zone or ""
+        return None
@@ -1,10 +1,21 @@
 #  Copyright (c) 2019. Robert Karl. All rights reserved.
 #  Licensed under the MIT License. See LICENSE in the project root for license information.
+import collections
 import datetime
 import decimal
+import threading
+import time
 from collections import namedtuple
+from typing import Dict
+from typing import Iterable
+from typing import Tuple
 
-OhlcData = namedtuple("OhlcData", ("open", "high", "low", "close"))
+OhlcData = namedtuple("OhlcData", ("open", "high", "low", "close", "vwap"))
+# Most sources have no volume-weighted price.
+OhlcData.__new__.__defaults__ = (None,)
+
+# The fields of OhlcData a provider can value trades at.
+PRICE_FIELDS = ("open", "high", "low", "close", "vwap")
 
 
 def _make_ohlc(ohlc_str):
@@ -36,13 +47,41 @@ class NoDataError(RuntimeError):
     pass
 
 
+def _check_price_field(price_field):
+    if price_field not in PRICE_FIELDS:
+        raise ValueError(
+            "Unknown price field {!r}, expected one of {}".format(
+                price_field, ", ".join(PRICE_FIELDS)
+            )
+        )
+
+
+def price_from(ohlc, price_field):
+    # type: (OhlcData, str) -> decimal.Decimal
+    """
+    Pick one price out of a candle.
+
+    A candle without a vwap is valued at its typical price, the mean of the
+    high, low and close, which is the usual stand-in when volume is unknown.
+    """
+    if price_field == "vwap" and ohlc.vwap is None:
+        return (ohlc.high + ohlc.low + ohlc.close) / 3
+    return getattr(ohlc, price_field)
+
+
 class OhlcProvider:
     """
     Daily OHLC data access stub.
+
+    Trades are valued at the candle's `price_field`, one of PRICE_FIELDS.
     """
 
-    def __init__(self):
-        pass
+    price_field = "high"
+
+    def __init__(self, price_field="high"):
+        # type: (str) -> None
+        _check_price_field(price_field)
+        self.price_field = price_field
 
     def get(self, symbol, dt):
         # type: (str, datetime.datetime) -> OhlcData
@@ -56,3 +95,193 @@ class OhlcProvider:
             return val
         except KeyError:
             raise NoDataError("No price data found for {} on {}.".format(symbol, dt))
+
+    def cache_key(self, symbol, dt):
+        # type: (str, datetime.datetime) -> Tuple
+        """
+        A key shared by every (symbol, dt) this provider gives the same
+        prices for. Daily sources key on the date.
+        """
+        if isinstance(dt, datetime.datetime):
+            dt = dt.date()
+        return (symbol, dt)
+
+    def price(self, symbol, dt):
+        # type: (str, datetime.datetime) -> decimal.Decimal
+        """
+        Return the fiat price used to value a trade of `symbol` at `dt`.
+        """
+        return price_from(self.get(symbol, dt), self.price_field)
+
+    def get_many(self, keys):
+        # type: (Iterable[Tuple[str, datetime.datetime]]) -> Dict[Tuple, OhlcData]
+        """
+        Look up many prices at once. Sources with a per-request cost should
+        override this to fetch them in one round trip.
+
+        :param keys: (symbol, dt) tuples, as they would be passed to get().
+        :return: a dict from each key with data to its prices. Keys without
+            data are left out.
+        """
+        prices = {}
+        for key in set(keys):
+            try:
+                prices[key] = self.get(*key)
+            except NoDataError:
+                pass
+        return prices
+
+
+class PriceTable(OhlcProvider):
+    """
+    Prices resolved ahead of time with get_many().
+    """
+
+    def __init__(self, prices, price_field="high"):
+        super().__init__(price_field)
+        self._prices = prices
+
+    def get(self, symbol, dt):
+        # type: (str, datetime.datetime) -> OhlcData
+        try:
+            return self._prices[(symbol, dt)]
+        except KeyError:
+            raise NoDataError("No price data found for {} on {}.".format(symbol, dt))
+
+    def cache_key(self, symbol, dt):
+        return (symbol, dt)
+
+
+# Cached in place of prices that the source has no data for.
+_NO_DATA = object()
+
+
+class CachingOhlcProvider(OhlcProvider):
+    """
+    Wrap a slow OhlcProvider with a bounded LRU cache. Trades are valued at
+    the source's price field.
+
+    Prices are cached under the source's cache_key(), so lookups for the same
+    symbol on one day share an entry unless the source has intraday candles.
+
+    Missing prices are cached too, so repeated NoDataErrors don't reach the
+    source. Prices for the last `recent_days` days, whose candles may still
+    be forming, expire after `recent_ttl` seconds; older ones stay until
+    evicted.
+
+    Safe to share between threads. Pickling keeps the source and settings
+    but not the cached prices, so each process builds its own cache.
+    """
+
+    def __init__(self, source, max_size=100000, recent_ttl=None, recent_days=2):
+        # type: (OhlcProvider, int, float, int) -> None
+        """
+        :param recent_ttl: seconds to keep recent prices, or None to keep
+            them like any other.
+        """
+        super().__init__(source.price_field)
+        self.source = source
+        self.max_size = max_size
+        self.recent_ttl = recent_ttl
+        self.recent_days = recent_days
+        self.hits = 0
+        self.misses = 0
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def __getstate__(self):
+        return {
+            "source": self.source,
+            "max_size": self.max_size,
+            "recent_ttl": self.recent_ttl,
+            "recent_days": self.recent_days,
+        }
+
+    def __setstate__(self, state):
+        self.__init__(**state)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "size": len(self._entries),
+            }
+
+    def _expiry(self, dt):
+        if self.recent_ttl is None:
+            return None
+        day = dt.date() if isinstance(dt, datetime.datetime) else dt
+        recent = datetime.datetime.utcnow().date() - datetime.timedelta(
+            days=self.recent_days
+        )
+        if day < recent:
+            return None
+        return time.monotonic() + self.recent_ttl
+
+    def _lookup(self, key):
+        """
+        :return: the cached value, _NO_DATA, or None on a miss. Call with the
+            lock held.
+        """
+        entry = self._entries.get(key)
+        if entry is not None:
+            value, expires = entry
+            if expires is None or time.monotonic() < expires:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return value
+            del self._entries[key]
+        self.misses += 1
+        return None
+
+    def _store(self, key, value):
+        with self._lock:
+            self._entries[key] = (value, self._expiry(key[1]))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def cache_key(self, symbol, dt):
+        return self.source.cache_key(symbol, dt)
+
+    def get(self, symbol, dt):
+        # type: (str, datetime.datetime) -> OhlcData
+        key = self.source.cache_key(symbol, dt)
+        with self._lock:
+            value = self._lookup(key)
+        if value is None:
+            # The source is called without the lock, so one slow lookup
+            # doesn't hold up the others.
+            try:
+                value = self.source.get(symbol, dt)
+            except NoDataError:
+                value = _NO_DATA
+            self._store(key, value)
+        if value is _NO_DATA:
+            raise NoDataError("No price data found for {} on {}.".format(symbol, dt))
+        return value
+
+    def get_many(self, keys):
+        # type: (Iterable[Tuple[str, datetime.datetime]]) -> Dict[Tuple, OhlcData]
+        groups = collections.defaultdict(list)
+        for key in set(keys):
+            groups[self.source.cache_key(*key)].append(key)
+        prices = {}
+        missing = {}
+        with self._lock:
+            for cache_key, group in groups.items():
+                value = self._lookup(cache_key)
+                if value is None:
+                    missing[cache_key] = group
+                elif value is not _NO_DATA:
+                    prices.update((key, value) for key in group)
+        if missing:
+            # One key per entry is enough to fetch it.
+            found = self.source.get_many([group[0] for group in missing.values()])
+            for cache_key, group in missing.items():
+                value = found.get(group[0], _NO_DATA)
+                self._store(cache_key, value)
+                if value is not _NO_DATA:
+                    prices.update((key, value) for key in group)
+        return prices
@@ -0,0 +1,453 @@
+"""
+Daily OHLC prices for many symbols, kept on disk and memory-mapped.
+
+Each symbol has its own file: a fixed header, then the open, high, low and
+close columns, each an array of little-endian int64 prices scaled by
+10**PLACES, with one slot per day from the first day in the file. Days
+without data hold MISSING. A lookup is an offset calculation and four reads
+from the mapping, so after the pages are warm it costs no I/O, and worker
+processes reading the same files share the operating system's page cache.
+
+A symbol can also have an intraday file of minute or hourly candles, stored
+as a sorted column of candle start times, in seconds since the epoch, next
+to the price columns and a volume-weighted price column. A lookup is a
+binary search over the mapped times.
+"""
+import bisect
+import csv
+import datetime
+import decimal
+import mmap
+import os
+import re
+import struct
+import sys
+import tempfile
+import threading
+from collections import defaultdict
+from typing import List
+
+import click
+import flask
+from flask.cli import with_appcontext
+
+from yabc import ohlcprovider
+from yabc.formats import timestamps
+
+MAGIC = b"YABCOHLC"
+INTRADAY_MAGIC = b"YABCOHLI"
+PLACES = 8
+MISSING = -(2 ** 63)
+_SCALE = decimal.Decimal(10) ** PLACES
+
+# Candle lengths, in seconds, that intraday files can hold.
+INTERVALS = {"minute": 60, "hour": 60 * 60}
+
+# Magic, scale, ordinal of the first day, number of days. Intraday files
+# store the candle length and the number of candles in the last two fields.
+_HEADER = struct.Struct("<8sqqq")
+_PRICE = struct.Struct("<q")
+_COLUMNS = 4
+_SUFFIX = ".ohlc"
+# Start time, open, high, low, close and vwap.
+_INTRADAY_COLUMNS = 6
+_INTRADAY_SUFFIX = ".intraday.ohlc"
+# Times between the entries of an intraday file's in-memory index.
+_STRIDE = 64
+_EPOCH = datetime.datetime(1970, 1, 1)
+_SECOND = datetime.timedelta(seconds=1)
+_SYMBOL_RE = re.compile(r"^[A-Za-z0-9_-]+$")
+
+
+def _to_scaled(value):
+    # type: (decimal.Decimal) -> int
+    scaled = decimal.Decimal(value).scaleb(PLACES)
+    if scaled != scaled.to_integral_value():
+        raise ValueError("{} has more than {} decimal places".format(value, PLACES))
+    return int(scaled)
+
+
+def _from_scaled(value):
+    # type: (int) -> decimal.Decimal
+    # Exact division keeps no more places than needed, and is several times
+    # faster than rescaling and normalizing.
+    return decimal.Decimal(value) / _SCALE
+
+
+def _path(directory, symbol, suffix=_SUFFIX):
+    if not _SYMBOL_RE.match(symbol):
+        raise ValueError("Invalid symbol {!r}".format(symbol))
+    return os.path.join(directory, symbol + suffix)
+
+
+def _timestamp(dt):
+    # type: (datetime.datetime) -> int
+    """
+    :return: whole seconds since the epoch. Naive times are taken as UTC.
+    """
+    if dt.tzinfo is not None:
+        dt = dt.replace(tzinfo=None) - dt.utcoffset()
+    return (dt - _EPOCH) // _SECOND
+
+
+class _SymbolFile:
+    """
+    A read-only mapping of one symbol's file.
+    """
+
+    def __init__(self, path):
+        with open(path, "rb") as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, places, self.first_day, self.days = _HEADER.unpack_from(self._map)
+        if magic != MAGIC or places != PLACES:
+            self._map.close()
+            raise ValueError("{} is not an OHLC store file".format(path))
+
+    def get(self, ordinal):
+        """
+        :return: the four scaled prices, or None.
+        """
+        index = ordinal - self.first_day
+        if not 0 <= index < self.days:
+            return None
+        column_bytes = self.days * _PRICE.size
+        offset = _HEADER.size + index * _PRICE.size
+        prices = tuple(
+            _PRICE.unpack_from(self._map, offset + column * column_bytes)[0]
+            for column in range(_COLUMNS)
+        )
+        if prices[0] == MISSING:
+            return None
+        return prices
+
+    def items(self):
+        """
+        :return: (ordinal, scaled prices) for every day with data.
+        """
+        for index in range(self.days):
+            prices = self.get(self.first_day + index)
+            if prices is not None:
+                yield self.first_day + index, prices
+
+    def close(self):
+        self._map.close()
+
+
+def write_symbol(directory, symbol, prices):
+    """
+    Replace a symbol's file.
+
+    The new file is written next to the old one and renamed into place, so
+    readers never see a partial file. Mappings already open keep the old
+    contents until the store is reopened.
+
+    :param prices: a dict from date ordinal to four scaled prices.
+    """
+    path = _path(directory, symbol)
+    first_day = min(prices)
+    days = max(prices) - first_day + 1
+    columns = [[MISSING] * days for _ in range(_COLUMNS)]
+    for ordinal, values in prices.items():
+        for column, value in zip(columns, values):
+            column[ordinal - first_day] = value
+    _write_columns(directory, path, (MAGIC, PLACES, first_day, days), columns)
+
+
+def _write_columns(directory, path, header, columns):
+    fd, temp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(_HEADER.pack(*header))
+            for column in columns:
+                f.write(struct.pack("<{}q".format(len(column)), *column))
+        os.replace(temp_path, path)
+    except BaseException:
+        os.unlink(temp_path)
+        raise
+
+
+class _IntradayFile:
+    """
+    A read-only mapping of one symbol's intraday candles.
+    """
+
+    def __init__(self, path):
+        with open(path, "rb") as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, places, self.interval, count = _HEADER.unpack_from(self._map)
+        if magic != INTRADAY_MAGIC or places != PLACES:
+            self._map.close()
+            raise ValueError("{} is not an intraday OHLC file".format(path))
+        column_bytes = count * _PRICE.size
+        starts = [
+            _HEADER.size + column * column_bytes for column in range(_INTRADAY_COLUMNS)
+        ]
+        if sys.byteorder == "little":
+            # Views straight into the mapping, which bisect can search
+            # without reading the file.
+            self._view = memoryview(self._map)
+            self._columns = [
+                self._view[start : start + column_bytes].cast("q") for start in starts
+            ]
+        else:
+            self._view = None
+            self._columns = [
+                struct.unpack_from("<{}q".format(count), self._map, start)
+                for start in starts
+            ]
+        self.times = self._columns[0]
+        self._count = count
+        # Every _STRIDE-th time, as Python ints, narrows the search to a few
+        # reads from the mapping.
+        self._index = list(self.times[::_STRIDE])
+
+    def get(self, timestamp):
+        """
+        :return: the scaled open, high, low, close and vwap of the candle
+            holding `timestamp`, or None.
+        """
+        times = self.times
+        if not self._count or timestamp < times[0]:
+            return None
+        # Without gaps, the candle's position follows from its start time.
+        index = (timestamp - times[0]) // self.interval
+        if not (
+            index < self._count
+            and times[index] <= timestamp
+            and (index + 1 == self._count or times[index + 1] > timestamp)
+        ):
+            block = bisect.bisect_right(self._index, timestamp) - 1
+            lo = block * _STRIDE
+            hi = min(lo + _STRIDE, self._count)
+            index = bisect.bisect_right(times, timestamp, lo, hi) - 1
+        if timestamp >= times[index] + self.interval:
+            return None
+        _, opens, highs, lows, closes, vwaps = self._columns
+        return (opens[index], highs[index], lows[index], closes[index], vwaps[index])
+
+    def items(self):
+        """
+        :return: (start time, scaled prices) for every candle.
+        """
+        for index, start in enumerate(self.times):
+            yield start, tuple(column[index] for column in self._columns[1:])
+
+    def close(self):
+        if self._view is not None:
+            for column in self._columns:
+                column.release()
+            self._view.release()
+        self._map.close()
+
+
+def write_intraday(directory, symbol, interval, candles):
+    """
+    Replace a symbol's intraday file, like write_symbol().
+
+    :param interval: the length of each candle, in seconds.
+    :param candles: a dict from candle start time, in seconds since the
+        epoch, to the five scaled prices. A vwap of MISSING means none.
+    """
+    path = _path(directory, symbol, _INTRADAY_SUFFIX)
+    times = sorted(candles)
+    columns = [times]
+    columns.extend([candles[start][column] for start in times] for column in range(5))
+    header = (INTRADAY_MAGIC, PLACES, interval, len(times))
+    _write_columns(directory, path, header, columns)
+
+
+def load_intraday_csv(directory, csv_file, interval):
+    # type: (str, ..., int) -> int
+    """
+    Bulk load intraday candles, merging them into the store.
+
+    :param csv_file: an open text file with the columns symbol, time (the
+        candle's start, in UTC unless it gives a zone), open, high, low,
+        close and optionally vwap, and a header row.
+    :param interval: the length of each candle, in seconds. It must match
+        any candles already stored for the symbol.
+    :return: the number of rows loaded.
+    """
+    os.makedirs(directory, exist_ok=True)
+    parser = timestamps.TimestampParser()
+    new_candles = defaultdict(dict)
+    count = 0
+    for row in csv.DictReader(csv_file):
+        start = _timestamp(parser.parse(row["time"].strip()))
+        vwap = (row.get("vwap") or "").strip()
+        new_candles[row["symbol"].strip()][start] = tuple(
+            _to_scaled(row[key]) for key in ("open", "high", "low", "close")
+        ) + ((_to_scaled(vwap) if vwap else MISSING),)
+        count += 1
+    for symbol, candles in new_candles.items():
+        path = _path(directory, symbol, _INTRADAY_SUFFIX)
+        if os.path.exists(path):
+            existing = _IntradayFile(path)
+            try:
+                if existing.interval != interval:
+                    raise ValueError(
+                        "{} already has {} second candles".format(
+                            symbol, existing.interval
+                        )
+                    )
+                merged = dict(existing.items())
+            finally:
+                existing.close()
+            merged.update(candles)
+            candles = merged
+        write_intraday(directory, symbol, interval, candles)
+    return count
+
+
+def load_csv(directory, csv_file):
+    # type: (str, ...) -> int
+    """
+    Bulk load daily prices, merging them into the store.
+
+    :param csv_file: an open text file with the columns symbol, date
+        (YYYY-MM-DD), open, high, low and close, and a header row. Rows for a
+        day already stored replace it.
+    :return: the number of rows loaded.
+    """
+    os.makedirs(directory, exist_ok=True)
+    new_prices = defaultdict(dict)
+    count = 0
+    for row in csv.DictReader(csv_file):
+        day = datetime.datetime.strptime(row["date"].strip(), "%Y-%m-%d").date()
+        new_prices[row["symbol"].strip()][day.toordinal()] = tuple(
+            _to_scaled(row[key]) for key in ("open", "high", "low", "close")
+        )
+        count += 1
+    for symbol, prices in new_prices.items():
+        path = _path(directory, symbol)
+        if os.path.exists(path):
+            existing = _SymbolFile(path)
+            try:
+                merged = dict(existing.items())
+            finally:
+                existing.close()
+            merged.update(prices)
+            prices = merged
+        write_symbol(directory, symbol, prices)
+    return count
+
+
+class OhlcStore(ohlcprovider.OhlcProvider):
+    """
+    OHLC prices from a directory of symbol files.
+
+    A time inside one of a symbol's intraday candles gets that candle;
+    anything else gets the day's candle.
+
+    Files are mapped on first use; call close() to pick up files loaded
+    since. Lookups and close() share a lock, so close() is safe while other
+    threads read, and later lookups map the files again. The store can be
+    pickled, for example to send to worker processes, which map the files
+    again themselves.
+    """
+
+    def __init__(self, directory, price_field="high"):
+        # type: (str, str) -> None
+        super().__init__(price_field)
+        self.directory = directory
+        self._files = {}
+        self._lock = threading.Lock()
+
+    def __getstate__(self):
+        return {"directory": self.directory, "price_field": self.price_field}
+
+    def __setstate__(self, state):
+        self.__init__(**state)
+
+    def symbols(self):
+        # type: () -> List[str]
+        """
+        :return: every symbol with daily prices in the store.
+        """
+        names = os.listdir(self.directory) if os.path.isdir(self.directory) else []
+        return sorted(
+            name[: -len(_SUFFIX)]
+            for name in names
+            if name.endswith(_SUFFIX) and not name.endswith(_INTRADAY_SUFFIX)
+        )
+
+    def _file(self, symbol, suffix=_SUFFIX):
+        """
+        The caller must hold self._lock.
+        """
+        key = (symbol, suffix)
+        if key not in self._files:
+            opener = _IntradayFile if suffix == _INTRADAY_SUFFIX else _SymbolFile
+            try:
+                self._files[key] = opener(_path(self.directory, symbol, suffix))
+            except (OSError, ValueError):
+                self._files[key] = None
+        return self._files[key]
+
+    def _lookup(self, symbol, suffix, key):
+        """
+        :return: the scaled prices at `key` in one of `symbol`'s files, or
+            None.
+        """
+        # Read under the lock, so close() can't unmap the file mid-lookup.
+        with self._lock:
+            mapped = self._file(symbol, suffix)
+            return mapped.get(key) if mapped else None
+
+    def cache_key(self, symbol, dt):
+        if isinstance(dt, datetime.datetime):
+            with self._lock:
+                intraday = self._file(symbol, _INTRADAY_SUFFIX) is not None
+            if intraday:
+                return (symbol, dt)
+        return super().cache_key(symbol, dt)
+
+    def get(self, symbol, dt):
+        # type: (str, datetime.datetime) -> ohlcprovider.OhlcData
+        if isinstance(dt, datetime.datetime):
+            prices = self._lookup(symbol, _INTRADAY_SUFFIX, _timestamp(dt))
+            if prices is not None:
+                return ohlcprovider.OhlcData(
+                    *(
+                        None if price == MISSING else _from_scaled(price)
+                        for price in prices
+                    )
+                )
+            dt = dt.date()
+        prices = self._lookup(symbol, _SUFFIX, dt.toordinal())
+        if prices is None:
+            raise ohlcprovider.NoDataError(
+                "No price data found for {} on {}.".format(symbol, dt)
+            )
+        return ohlcprovider.OhlcData(*(_from_scaled(price) for price in prices))
+
+    def close(self):
+        with self._lock:
+            for symbol_file in self._files.values():
+                if symbol_file is not None:
+                    symbol_file.close()
+            self._files = {}
+
+
+@click.command("load-ohlc")
+@click.option(
+    "--interval",
+    type=click.Choice(["day"] + sorted(INTERVALS)),
+    default="day",
+    help="The length of the candles in the files.",
+)
+@click.argument("csv_files", nargs=-1, type=click.File("r"))
+@with_appcontext
+def load_ohlc_command(interval, csv_files):
+    """
+    Load daily or intraday prices from CSV files into the OHLC_DIR store.
+    """
+    directory = flask.current_app.config.get("OHLC_DIR")
+    if not directory:
+        raise click.UsageError("Set OHLC_DIR in the app config first.")
+    for csv_file in csv_files:
+        if interval == "day":
+            count = load_csv(directory, csv_file)
+        else:
+            count = load_intraday_csv(directory, csv_file, INTERVALS[interval])
+        click.echo("Loaded {} rows from {}".format(count, csv_file.name))
@@ -0,0 +1,188 @@
+"""
+Run basis calculations for independent groups of symbols in parallel.
+
+Each symbol has its own pool of coins. Only a coin/coin trade ties two pools
+together, by removing coins from one and adding a TRADE_INPUT to the other. The
+transactions are split along those ties, each partition is processed in its
+own worker process, and the results are merged back in the order the serial
+BasisProcessor would have produced them.
+"""
+import concurrent.futures
+import heapq
+import os
+from collections import defaultdict
+from typing import List
+from typing import Sequence
+
+from yabc import basis
+from yabc import coinpool
+from yabc import ohlcprovider
+from yabc import transaction
+from yabc.costbasisreport import CostBasisReport
+
+
+def _pool_symbols(tx):
+    # type: (transaction.Transaction) -> List[str]
+    """
+    The pool symbols that processing `tx` can read or modify.
+    """
+    if tx.is_simple_input():
+        return [tx.symbol_received]
+    symbols = [tx.symbol_traded]
+    if tx.is_coin_to_coin():
+        symbols.append(tx.symbol_received)
+    return symbols
+
+
+def partition(txs):
+    # type: (Sequence[transaction.Transaction]) -> List[List[int]]
+    """
+    Group transactions that share a pool, directly or through a chain of
+    coin/coin trades.
+
+    :return: lists of indexes into `txs`, each in ascending order.
+    """
+    parent = {}
+
+    def find(symbol):
+        root = symbol
+        while parent[root] != root:
+            root = parent[root]
+        while parent[symbol] != root:
+            parent[symbol], symbol = root, parent[symbol]
+        return root
+
+    for tx in txs:
+        symbols = _pool_symbols(tx)
+        for symbol in symbols:
+            parent.setdefault(symbol, symbol)
+        first = find(symbols[0])
+        for symbol in symbols[1:]:
+            parent[find(symbol)] = first
+    groups = defaultdict(list)
+    for index, tx in enumerate(txs):
+        groups[find(_pool_symbols(tx)[0])].append(index)
+    return list(groups.values())
+
+
+def _bin_groups(groups, bin_count):
+    """
+    Spread groups over `bin_count` bins of roughly equal transaction counts,
+    largest groups first.
+    """
+    bins = [(0, i, []) for i in range(bin_count)]
+    for group in sorted(groups, key=len, reverse=True):
+        size, i, members = heapq.heappop(bins)
+        members.extend(group)
+        heapq.heappush(bins, (size + len(group), i, members))
+    return [sorted(members) for _, _, members in sorted(bins, key=lambda b: b[1])]
+
+
+def _process_partition(method, indexed_records, ohlc):
+    """
+    Worker entry point. Runs one partition through a fresh pool.
+
+    Inputs and outputs are records rather than ORM objects so that they are
+    cheap to send between processes.
+
+    :param indexed_records: (index, Transaction.to_record()) tuples, sorted
+        by date.
+    :return: (index, report record) tuples, (index, flag message) tuples, and
+        the final pool as CoinPool.to_json().
+    """
+    txs = []
+    index_of = {}
+    for index, record in indexed_records:
+        tx = transaction.Transaction.from_record(record)
+        index_of[id(tx)] = index
+        txs.append(tx)
+    pool = coinpool.CoinPool(method)
+    reports = []
+    flags = []
+    for curr_reports, curr_flags in basis._process_iter(pool, txs, ohlc):
+        for report in curr_reports:
+            index = index_of[id(report.triggering_transaction)]
+            reports.append((index, report.to_record()))
+        for message, tx in curr_flags:
+            flags.append((index_of[id(tx)], message))
+    return reports, flags, pool.to_json()
+
+
+class ParallelBasisProcessor:
+    """
+    Drop-in replacement for basis.BasisProcessor that processes independent
+    symbol groups on a process pool.
+
+    Reports and flags match the serial processor, in the same order. Coins in
+    the final pool are copies of the originals, without database ids.
+    """
+
+    def __init__(self, method, txs, ohlc=ohlcprovider.OhlcProvider(), max_workers=None):
+        # type: (coinpool.PoolMethod, Sequence, ohlcprovider.OhlcProvider, int) -> None
+        """
+        :param max_workers: processes to use; defaults to the CPU count.
+        """
+        self.ohlc = ohlc
+        self._method = method
+        self._txs = txs
+        self._max_workers = max_workers or os.cpu_count() or 1
+        self._reports = []
+        self._pool = None
+        self._flags = None
+
+    def flags(self):
+        if self._flags is None:
+            raise RuntimeError("Run basis calculation first")
+        return self._flags
+
+    def get_pool(self):
+        # type: () -> coinpool.CoinPool
+        return self._pool
+
+    def process(self):
+        # type: () -> Sequence[CostBasisReport]
+        """
+        Perform the basis calculation given the txs passed to the constructor.
+
+        :return: the CostBasisReports generated.
+        """
+        for tx in self._txs:
+            if not isinstance(tx, transaction.Transaction):
+                raise RuntimeError("Need transactions in txs")
+        txs = sorted(self._txs, key=lambda trans: trans.date)
+        groups = partition(txs)
+        bin_count = min(self._max_workers, len(groups))
+        if bin_count <= 1:
+            reports, pool, flags = basis._process_all(self._method, txs, self.ohlc)
+            self._reports, self._pool, self._flags = reports, pool, flags
+            return self._reports
+
+        bins = _bin_groups(groups, bin_count)
+        with concurrent.futures.ProcessPoolExecutor(bin_count) as executor:
+            futures = [
+                executor.submit(
+                    _process_partition,
+                    self._method,
+                    [(i, txs[i].to_record()) for i in members],
+                    self.ohlc,
+                )
+                for members in bins
+            ]
+            results = [future.result() for future in futures]
+
+        indexed_reports = []
+        indexed_flags = []
+        self._pool = coinpool.CoinPool(self._method)
+        for reports, flags, pool_contents in results:
+            indexed_reports.extend(reports)
+            indexed_flags.extend(flags)
+            self._pool.merge(coinpool.CoinPool.from_json(pool_contents))
+        # Sorting is stable, so reports from a single transaction keep their order.
+        indexed_reports.sort(key=lambda item: item[0])
+        indexed_flags.sort(key=lambda item: item[0])
+        self._reports = [
+            CostBasisReport.from_record(record, txs[index])
+            for index, record in indexed_reports
+        ]
+        self._flags = [(message, txs[index]) for index, message in indexed_flags]
+        return self._reports
@@ -0,0 +1,116 @@
+"""
+Cache the transactions parsed from exchange files, keyed by file contents.
+
+Users upload the same exports again and again. A parse result is stored as
+compact JSON: the name of the Format that read the file and each transaction
+as Transaction.to_record(). The server keeps results in TaxDoc rows; the CLI
+keeps them in a directory.
+"""
+import gzip
+import hashlib
+import json
+import os
+import tempfile
+from typing import List
+from typing import Optional
+from typing import Tuple
+
+import yabc.formats
+from yabc import transaction
+
+# Bump whenever a parser changes the transactions it produces, so results
+# cached by older code are parsed again.
+PARSER_VERSION = 1
+
+# Bytes, or characters for a text stream, hashed at a time.
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+def content_hash(contents):
+    # type: (bytes) -> str
+    if isinstance(contents, str):
+        contents = contents.encode("utf-8")
+    return hashlib.sha256(contents).hexdigest()
+
+
+def stream_hash(stream):
+    # type: (...) -> str
+    """
+    content_hash() of the rest of a binary or text stream, read in chunks so
+    the file is never held in memory.
+    """
+    digest = hashlib.sha256()
+    while True:
+        chunk = stream.read(HASH_CHUNK_SIZE)
+        if not chunk:
+            return digest.hexdigest()
+        if isinstance(chunk, str):
+            chunk = chunk.encode("utf-8")
+        digest.update(chunk)
+
+
+def dumps(format_class, txs):
+    # type: (type, List[transaction.Transaction]) -> str
+    return json.dumps(
+        {
+            "version": PARSER_VERSION,
+            "format": format_class.__name__,
+            "transactions": [tx.to_record() for tx in txs],
+        },
+        separators=(",", ":"),
+    )
+
+
+def loads(contents):
+    # type: (str) -> Optional[Tuple[type, List[transaction.Transaction]]]
+    """
+    Inverse of `dumps`.
+
+    :return: the Format class and the transactions, or None if the result
+        was cached by a different parser version.
+    """
+    loaded = json.loads(contents)
+    if loaded.get("version") != PARSER_VERSION:
+        return None
+    for format_class in yabc.formats.FORMAT_CLASSES:
+        if format_class.__name__ == loaded["format"]:
+            break
+    else:
+        return None
+    txs = [transaction.Transaction.from_record(r) for r in loaded["transactions"]]
+    return format_class, txs
+
+
+class DirectoryCache:
+    """
+    Parse results stored as one gzipped file per content hash.
+    """
+
+    def __init__(self, directory):
+        self._directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, file_hash):
+        return os.path.join(self._directory, file_hash + ".json.gz")
+
+    def get(self, file_hash):
+        # type: (str) -> Optional[str]
+        try:
+            with gzip.open(self._path(file_hash), "rt") as f:
+                return f.read()
+        except (OSError, EOFError):
+            return None
+
+    def put(self, file_hash, contents, format_class):
+        """
+        Write the result atomically, so concurrent runs never read a partial
+        file.
+        """
+        fd, temp_path = tempfile.mkstemp(dir=self._directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as raw, gzip.open(raw, "wt") as f:
+                f.write(contents)
+            os.replace(temp_path, self._path(file_hash))
+        except BaseException:
+            os.unlink(temp_path)
+            raise
@@ -0,0 +1,40 @@
+from sqlalchemy import Column
+from sqlalchemy import DateTime
+from sqlalchemy import ForeignKey
+from sqlalchemy import Index
+from sqlalchemy import Integer
+from sqlalchemy import String
+
+import yabc
+from yabc import coinpool
+
+
+class PoolSnapshot(yabc.Base):
+    """
+    A user's CoinPool as it stood before any transaction dated on or after
+    `date` was processed.
+
+    Saved at some month boundaries by run_basis so that a change to the
+    transaction history only needs to be replayed from the latest snapshot
+    before it.
+    """
+
+    __tablename__ = "pool_snapshot"
+    __table_args__ = (
+        Index("ix_pool_snapshot_user_id_method_date", "user_id", "method", "date"),
+    )
+    id = Column(Integer, primary_key=True)
+    user_id = Column(Integer, ForeignKey("user.id"))
+    method = Column(String)
+    date = Column(DateTime)
+    contents = Column(String)
+
+    def __init__(self, user_id, method, date, contents):
+        self.user_id = user_id
+        self.method = method.name
+        self.date = date
+        self.contents = contents
+
+    def restore(self):
+        # type: () -> coinpool.CoinPool
+        return coinpool.CoinPool.from_json(self.contents)
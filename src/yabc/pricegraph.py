@@ -0,0 +1,182 @@
+"""
+Fiat prices for coins that are only quoted against other coins.
+
+Many coins trade only against BTC, ETH or a stablecoin, so there is no fiat
+price for them, but there is a chain of quotes that leads to one: XLM to BTC
+to USD, or XYZ to USDT to USD. A PriceGraph finds the shortest such chain for
+every coin, one day at a time, and multiplies the quotes along it.
+"""
+import collections
+import datetime
+import decimal
+import threading
+from typing import Dict
+from typing import Iterable
+from typing import List
+from typing import Tuple
+
+from yabc import ohlcprovider
+from yabc import transaction
+
+# Joins the two symbols of a quote, as stored in a price source. The candles
+# of "XLM-BTC" are the price of one XLM in BTC.
+PAIR_SEPARATOR = "-"
+
+_UNIT = ohlcprovider.OhlcData(*[decimal.Decimal(1)] * 5)
+
+
+def pair_symbol(base, quote):
+    # type: (str, str) -> str
+    return base + PAIR_SEPARATOR + quote
+
+
+def pairs_in(symbols):
+    # type: (Iterable[str]) -> List[Tuple[str, str]]
+    """
+    :return: (base, quote) for each of `symbols` that names a quote.
+    """
+    pairs = []
+    for symbol in symbols:
+        parts = symbol.split(PAIR_SEPARATOR)
+        if len(parts) == 2 and all(parts):
+            pairs.append(tuple(parts))
+    return pairs
+
+
+def _times(a, b):
+    """
+    Chain two candles. The highs and lows are bounds, not prices that were
+    seen together.
+    """
+    vwap = a.vwap * b.vwap if a.vwap is not None and b.vwap is not None else None
+    return ohlcprovider.OhlcData(
+        a.open * b.open, a.high * b.high, a.low * b.low, a.close * b.close, vwap
+    )
+
+
+def _inverse(ohlc):
+    """
+    The candle for the opposite quote, in which the high and low swap, or
+    None if a price is zero.
+    """
+    if not all(ohlc[:4]):
+        return None
+    return ohlcprovider.OhlcData(
+        1 / ohlc.open,
+        1 / ohlc.low,
+        1 / ohlc.high,
+        1 / ohlc.close,
+        1 / ohlc.vwap if ohlc.vwap else None,
+    )
+
+
+class PriceGraph(ohlcprovider.OhlcProvider):
+    """
+    Wrap an OhlcProvider, deriving fiat prices through quotes between coins
+    when it has no price for a coin.
+
+    The first lookup for a day fetches that day's quotes and fiat prices in
+    one get_many() call and works out every coin's price from the shortest
+    chain of quotes, so later lookups for the day are a dict access. Derived
+    prices are daily, even when the source has intraday candles. Up to
+    `max_days` days are kept.
+
+    Safe to share between threads. Pickling keeps the source and settings
+    but not the derived prices.
+    """
+
+    def __init__(self, source, pairs, max_days=1000):
+        # type: (ohlcprovider.OhlcProvider, Iterable[Tuple[str, str]], int) -> None
+        """
+        :param pairs: (base, quote) for each quote `source` has candles for,
+            under pair_symbol(base, quote).
+        """
+        super().__init__(source.price_field)
+        self.source = source
+        self.pairs = sorted(set(pairs))
+        self.max_days = max_days
+        self._days = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def __getstate__(self):
+        return {"source": self.source, "pairs": self.pairs, "max_days": self.max_days}
+
+    def __setstate__(self, state):
+        self.__init__(**state)
+
+    def _build(self, day):
+        # type: (datetime.date) -> Dict[str, ohlcprovider.OhlcData]
+        """
+        :return: the fiat price of every coin on `day` that has one,
+            directly or through quotes.
+        """
+        coins = sorted({coin for pair in self.pairs for coin in pair})
+        keys = [(coin, day) for coin in coins if not transaction.is_fiat(coin)]
+        keys.extend((pair_symbol(*pair), day) for pair in self.pairs)
+        found = self.source.get_many(keys)
+        neighbours = collections.defaultdict(list)
+        for base, quote in self.pairs:
+            quoted = found.get((pair_symbol(base, quote), day))
+            if quoted is None:
+                continue
+            neighbours[quote].append((base, quoted))
+            inverse = _inverse(quoted)
+            if inverse is not None:
+                neighbours[base].append((quote, inverse))
+        prices = {}
+        for coin in coins:
+            if transaction.is_fiat(coin):
+                prices[coin] = _UNIT
+            elif (coin, day) in found:
+                prices[coin] = found[(coin, day)]
+        # Breadth first from every coin with a fiat price, so each coin is
+        # priced through the fewest quotes.
+        queue = collections.deque(prices)
+        while queue:
+            coin = queue.popleft()
+            for other, quoted in neighbours[coin]:
+                if other not in prices:
+                    prices[other] = _times(quoted, prices[coin])
+                    queue.append(other)
+        return prices
+
+    def _prices(self, day):
+        with self._lock:
+            prices = self._days.get(day)
+            if prices is not None:
+                self._days.move_to_end(day)
+                return prices
+        # Built without the lock; two threads may build the same day.
+        prices = self._build(day)
+        with self._lock:
+            self._days[day] = prices
+            while len(self._days) > self.max_days:
+                self._days.popitem(last=False)
+        return prices
+
+    def _derived(self, symbol, dt):
+        day = dt.date() if isinstance(dt, datetime.datetime) else dt
+        return self._prices(day).get(symbol)
+
+    def cache_key(self, symbol, dt):
+        return self.source.cache_key(symbol, dt)
+
+    def get(self, symbol, dt):
+        # type: (str, datetime.datetime) -> ohlcprovider.OhlcData
+        try:
+            return self.source.get(symbol, dt)
+        except ohlcprovider.NoDataError:
+            derived = self._derived(symbol, dt)
+            if derived is None:
+                raise
+            return derived
+
+    def get_many(self, keys):
+        # type: (Iterable[Tuple[str, datetime.datetime]]) -> Dict[Tuple, ohlcprovider.OhlcData]
+        keys = set(keys)
+        prices = self.source.get_many(keys)
+        for symbol, dt in keys - set(prices):
+            derived = self._derived(symbol, dt)
+            if derived is not None:
+                prices[(symbol, dt)] = derived
+        return prices
@@ -1,18 +1,27 @@
 """
 Track the sql alchemy session and provide methods for endpoints.
 """
+import collections
 import datetime
 import decimal
+import functools
 import io
 import json
 import logging
+import multiprocessing
+import os
+import queue
+import threading
+import time
 from io import TextIOWrapper
+from typing import List
 from typing import Sequence
 
 import click
 import flask
 import sqlalchemy
 import sqlalchemy.orm
+from dateutil import parser
 from flask import make_response
 from flask.cli import with_appcontext
 from sqlalchemy.orm import sessionmaker
@@ -22,10 +31,13 @@ from yabc import basis
 from yabc import coinpool
 from yabc import costbasisreport
 from yabc import formats
+from yabc import taxdoc
 from yabc import transaction
 from yabc import user
 from yabc.costbasisreport import CostBasisReport
 from yabc.formats import coinbase
+from yabc.formats import compression
+from yabc.poolsnapshot import PoolSnapshot
 from yabc.transaction_parser import TransactionParser
 from yabc.transaction_parser import TxFile
 
@@ -36,6 +48,33 @@ __author__ = "Robert Karl <robertkarljr@gmail.com>"
 
 DB_KEY = "yabc_db"
 
+# Default rows read or written per round trip, for streaming basis
+# calculations and bulk inserts. Override with the DB_CHUNK_SIZE config key.
+BATCH_SIZE = 1000
+
+# Connection pool settings, overridable by the config key in each tuple. The
+# defaults are SQLAlchemy's own.
+POOL_OPTIONS = (
+    ("DB_POOL_SIZE", "pool_size", 5),
+    ("DB_MAX_OVERFLOW", "max_overflow", 10),
+    ("DB_POOL_TIMEOUT", "pool_timeout", 30),
+    ("DB_POOL_RECYCLE", "pool_recycle", -1),
+    ("DB_POOL_PRE_PING", "pool_pre_ping", False),
+)
+
+# A checkout that waits longer than this many seconds for a free connection
+# is logged. Override with the DB_POOL_SLOW_CHECKOUT config key.
+SLOW_CHECKOUT = 0.1
+
+# Indexes that earlier versions created and migrate() drops, by table. The
+# (user_id, source) index is covered by ix_transaction_user_id_source_date.
+OBSOLETE_INDEXES = {"transaction": ("ix_transaction_user_id_source",)}
+
+# Engines shared by every request in this process, keyed by process id, url
+# and pool options.
+_engines = {}
+_engines_lock = threading.Lock()
+
 
 @click.command("init-db")
 @with_appcontext
@@ -45,16 +84,267 @@ def init_db_command():
     click.echo("Initialized the database.")
 
 
+@click.command("migrate-db")
+@with_appcontext
+def migrate_db_command():
+    """
+    Bring an existing database up to the current schema.
+    """
+    db = get_db()
+    created = db.migrate()
+    for name in created:
+        click.echo("Updated {}".format(name))
+    click.echo("Database is up to date.")
+
+
 @click.command("show-db-config")
 @with_appcontext
 def show_db_command():
     db = get_db()
     click.echo(db._db_url)
+    for key, option, default in POOL_OPTIONS:
+        click.echo("{} = {}".format(option, flask.current_app.config.get(key, default)))
+    # Only this process's checkouts; the server's are at /yabc/v1/db_stats.
+    click.echo("checkouts: {}".format(db.engine.pool.checkout_stats))
+
+
+@click.command("recompute-basis")
+@click.option(
+    "--user-id",
+    "user_ids",
+    type=int,
+    multiple=True,
+    help="Only recompute this user. May be given more than once.",
+)
+@click.option(
+    "--workers", type=int, default=None, help="Worker processes. Default: CPU count."
+)
+@click.option(
+    "--queue-size", type=int, default=100, help="Users queued ahead of the workers."
+)
+@click.option(
+    "--progress-every", type=int, default=100, help="Report progress every N users."
+)
+@with_appcontext
+def recompute_basis_command(user_ids, workers, queue_size, progress_every):
+    """
+    Recalculate cost basis for every user, or only those given.
+
+    Each worker process has its own engine. A user whose calculation fails is
+    rolled back and reported, and the run continues.
+    """
+    db = get_db()
+    db_url = db._db_url
+    if user_ids:
+        userids = list(user_ids)
+    else:
+        userids = [
+            userid
+            for (userid,) in db.session.query(user.User.id).order_by(user.User.id)
+        ]
+    close_db()
+    db.engine.dispose()
+    workers = max(1, min(workers or os.cpu_count() or 1, len(userids)))
+    tasks = multiprocessing.Queue(queue_size)
+    results = multiprocessing.Queue()
+    processes = [
+        multiprocessing.Process(
+            target=_recompute_worker,
+            args=(db_url, flask.current_app.ohlc, tasks, results),
+        )
+        for _ in range(workers)
+    ]
+    for process in processes:
+        process.start()
+
+    def feed():
+        for userid in userids:
+            tasks.put(userid)
+        for _ in processes:
+            tasks.put(None)
+
+    feeder = threading.Thread(target=feed, daemon=True)
+    feeder.start()
+    done = 0
+    failures = []
+    while done < len(userids):
+        try:
+            userid, error = results.get(timeout=1)
+        except queue.Empty:
+            if not any(process.is_alive() for process in processes):
+                break
+            continue
+        done += 1
+        if error is not None:
+            failures.append(userid)
+            click.echo("User {} failed: {}".format(userid, error), err=True)
+        if done % progress_every == 0 or done == len(userids):
+            click.echo(
+                "Recomputed {}/{} users, {} failed.".format(
+                    done, len(userids), len(failures)
+                )
+            )
+    for process in processes:
+        process.join()
+    if done < len(userids):
+        raise click.ClickException(
+            "Workers exited with {} users left.".format(len(userids) - done)
+        )
+    if failures:
+        raise click.ClickException(
+            "Failed users: {}".format(", ".join(str(i) for i in failures))
+        )
+
+
+def _recompute_worker(db_url, ohlc, tasks, results):
+    """
+    Run basis for user ids from `tasks` until None arrives, putting a
+    (userid, error or None) tuple on `results` for each.
+    """
+    db = SqlBackend(db_url)
+    try:
+        for userid in iter(tasks.get, None):
+            try:
+                db.run_basis(userid, ohlc=ohlc)
+                results.put((userid, None))
+            except Exception as e:
+                db.session.rollback()
+                results.put((userid, "{}: {}".format(type(e).__name__, e)))
+    finally:
+        db.session.close()
+        db.engine.dispose()
+
+
+def _parse_decimal(value):
+    """
+    Read a value stored by PreciseDecimalString.
+    """
+    if not value or value == "None":
+        value = 0
+    return decimal.Decimal(value)
+
+
+@functools.lru_cache()
+def _insert_columns(model):
+    """
+    Attribute names of a mapped class's columns, except its primary key.
+    """
+    return [
+        attr.key
+        for attr in sqlalchemy.inspect(model).column_attrs
+        if not any(column.primary_key for column in attr.columns)
+    ]
+
+
+class CheckoutStats:
+    """
+    How long checkouts from a connection pool waited for a free connection.
+    """
+
+    def __init__(self, slow_checkout=SLOW_CHECKOUT):
+        self.slow_checkout = slow_checkout
+        self.count = 0
+        self.total = 0.0
+        self.longest = 0.0
+        self._lock = threading.Lock()
+
+    def record(self, wait):
+        with self._lock:
+            self.count += 1
+            self.total += wait
+            self.longest = max(self.longest, wait)
+
+    def mean(self):
+        return self.total / self.count if self.count else 0.0
+
+    def as_dict(self):
+        """
+        :return: the number of checkouts, and their mean and longest waits in
+            seconds.
+        """
+        with self._lock:
+            return {
+                "count": self.count,
+                "mean_wait": self.mean(),
+                "max_wait": self.longest,
+            }
+
+    def __str__(self):
+        return "{} checkouts, mean wait {:.4f}s, longest {:.4f}s".format(
+            self.count, self.mean(), self.longest
+        )
+
+
+class _TimedQueuePool(sqlalchemy.pool.QueuePool):
+    """
+    A QueuePool that records in `checkout_stats` how long each checkout
+    waited, and logs the slow ones along with the pool's status.
+    """
+
+    def __init__(self, creator, checkout_stats=None, **kw):
+        super().__init__(creator, **kw)
+        self.checkout_stats = checkout_stats or CheckoutStats()
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            wait = time.perf_counter() - start
+            self.checkout_stats.record(wait)
+            if wait > self.checkout_stats.slow_checkout:
+                logging.warning(
+                    "Waited {:.3f}s for a database connection. {}".format(
+                        wait, self.status()
+                    )
+                )
+
+    def recreate(self):
+        # dispose() swaps in a new pool; keep counting across it.
+        pool = super().recreate()
+        pool.checkout_stats = self.checkout_stats
+        return pool
+
+
+def get_engine(db_url, slow_checkout=SLOW_CHECKOUT, **pool_options):
+    """
+    The engine for `db_url` shared by this process, created on first use.
+
+    :param pool_options: keyword arguments for sqlalchemy.create_engine, such
+        as pool_size and pool_recycle.
+    """
+    key = (os.getpid(), db_url, tuple(sorted(pool_options.items())))
+    with _engines_lock:
+        engine = _engines.get(key)
+        if engine is None:
+            engine = sqlalchemy.create_engine(
+                db_url, poolclass=_TimedQueuePool, **pool_options
+            )
+            engine.pool.checkout_stats.slow_checkout = slow_checkout
+            _engines[key] = engine
+    return engine
+
+
+def _app_engine():
+    config = flask.current_app.config
+    return get_engine(
+        config["DATABASE"],
+        slow_checkout=config.get("DB_POOL_SLOW_CHECKOUT", SLOW_CHECKOUT),
+        **{option: config.get(key, default) for key, option, default in POOL_OPTIONS}
+    )
 
 
 def get_db():
+    """
+    The SqlBackend for this request. Its session is drawn from the process's
+    shared engine and closed by close_db() when the app context ends.
+    """
     if DB_KEY not in flask.g:
-        flask.g.yabc_db = SqlBackend(flask.current_app.config["DATABASE"])
+        flask.g.yabc_db = SqlBackend(
+            flask.current_app.config["DATABASE"],
+            chunk_size=flask.current_app.config.get("DB_CHUNK_SIZE", BATCH_SIZE),
+            engine=_app_engine(),
+        )
     return flask.g.yabc_db
 
 
@@ -66,10 +356,45 @@ def close_db(e=None):
 
 def init_app(app):
     app.cli.add_command(init_db_command)
+    app.cli.add_command(migrate_db_command)
     app.cli.add_command(show_db_command)
+    app.cli.add_command(recompute_basis_command)
     app.teardown_appcontext(close_db)
 
 
+class _TaxDocCache:
+    """
+    Parse results for one user's uploads, stored in TaxDoc rows.
+    """
+
+    def __init__(self, session, userid, file_name):
+        self._session = session
+        self._userid = userid
+        self._file_name = file_name
+
+    def get(self, file_hash):
+        doc = (
+            self._session.query(taxdoc.TaxDoc)
+            .filter(taxdoc.TaxDoc.user_id == self._userid)
+            .filter(taxdoc.TaxDoc.file_hash == file_hash)
+            .order_by(taxdoc.TaxDoc.id.desc())
+            .first()
+        )
+        return doc.contents if doc is not None else None
+
+    def put(self, file_hash, contents, format_class):
+        self._session.add(
+            taxdoc.TaxDoc(
+                user_id=self._userid,
+                file_name=self._file_name,
+                file_hash=file_hash,
+                exchange=format_class.exchange_id_str(),
+                contents=contents,
+            )
+        )
+        self._session.commit()
+
+
 class SqlBackend:
     """
     Handle to the database as well as where DB routines are stored.
@@ -82,15 +407,20 @@ class SqlBackend:
     NOTE: We must be able to create SqlBackends without a flask instance running.
     """
 
-    def __init__(self, db_url=None):
+    def __init__(self, db_url=None, chunk_size=BATCH_SIZE, engine=None):
+        """
+        :param engine: an engine to share, from get_engine(). Without one, the
+            backend creates and owns its own.
+        """
         if db_url is None:
             db_url = flask.current_app.config["DATABASE"]
         self._db_url = db_url
-        # Note: some web servers (aka Flask) will create a new instance of this
-        # class for each request.
-        self.engine = sqlalchemy.create_engine(
-            db_url, poolclass=sqlalchemy.pool.QueuePool
-        )
+        self.chunk_size = chunk_size
+        if engine is None:
+            engine = sqlalchemy.create_engine(
+                db_url, poolclass=sqlalchemy.pool.QueuePool
+            )
+        self.engine = engine
         Session = sessionmaker(bind=self.engine)
         self.session = Session()
 
@@ -101,17 +431,161 @@ class SqlBackend:
     def create_tables(self):
         Base.metadata.create_all(self.engine, checkfirst=True)
 
+    def migrate(self):
+        # type: () -> List[str]
+        """
+        Create missing tables, and indexes missing from existing tables, and
+        drop OBSOLETE_INDEXES. Tables with ScaledDecimal columns still stored
+        as strings are rebuilt.
+
+        create_all() skips a table that already exists, along with any index
+        declared on it since the table was created.
+
+        :return: the names of the tables and indexes created, rebuilt or
+            dropped.
+        """
+        inspector = sqlalchemy.inspect(self.engine)
+        existing = set(inspector.get_table_names())
+        created = []
+        for table in Base.metadata.sorted_tables:
+            if table.name not in existing:
+                table.create(self.engine)
+                created.append(table.name)
+                continue
+            if self._has_unscaled_columns(inspector, table):
+                self._rebuild_table(table)
+                created.append(table.name)
+            indexes = {index["name"] for index in inspector.get_indexes(table.name)}
+            obsolete = indexes.intersection(OBSOLETE_INDEXES.get(table.name, ()))
+            if obsolete:
+                reflected = sqlalchemy.Table(
+                    table.name,
+                    sqlalchemy.MetaData(),
+                    autoload=True,
+                    autoload_with=self.engine,
+                )
+                for index in reflected.indexes:
+                    if index.name in obsolete:
+                        index.drop(self.engine)
+                        created.append(index.name)
+            for index in table.indexes:
+                if index.name not in indexes:
+                    index.create(self.engine)
+                    created.append(index.name)
+        return created
+
+    @staticmethod
+    def _has_unscaled_columns(inspector, table):
+        stored = {
+            column["name"]: column["type"]
+            for column in inspector.get_columns(table.name)
+        }
+        return any(
+            isinstance(column.type, transaction.ScaledDecimal)
+            and not isinstance(stored[column.name], sqlalchemy.Integer)
+            for column in table.columns
+        )
+
+    def _rebuild_table(self, table):
+        """
+        Copy an existing table into a new one with the declared schema,
+        converting values into ScaledDecimal columns, and swap it in.
+
+        Indexes are left to the caller.
+        """
+        old = sqlalchemy.Table(
+            table.name, sqlalchemy.MetaData(), autoload=True, autoload_with=self.engine
+        )
+        scratch = sqlalchemy.MetaData()
+        for referred in Base.metadata.sorted_tables:
+            if referred is not table:
+                referred.tometadata(scratch)
+        new = table.tometadata(scratch, name="{}_migrating".format(table.name))
+        scaled = {
+            column.name
+            for column in table.columns
+            if isinstance(column.type, transaction.ScaledDecimal)
+        }
+        names = [column.name for column in table.columns if column.name in old.c]
+        preparer = self.engine.dialect.identifier_preparer
+        with self.engine.begin() as conn:
+            conn.execute(sqlalchemy.schema.CreateTable(new))
+            result = conn.execute(sqlalchemy.select([old.c[name] for name in names]))
+            while True:
+                rows = result.fetchmany(self.chunk_size)
+                if not rows:
+                    break
+                conn.execute(
+                    new.insert(),
+                    [
+                        {
+                            name: _parse_decimal(value) if name in scaled else value
+                            for name, value in zip(names, row)
+                        }
+                        for row in rows
+                    ],
+                )
+            old.drop(conn)
+            conn.execute(
+                "ALTER TABLE {} RENAME TO {}".format(
+                    preparer.quote(new.name), preparer.quote(table.name)
+                )
+            )
+            if self.engine.dialect.name == "postgresql":
+                # Copied ids bypassed the new table's sequence.
+                conn.execute(
+                    "SELECT setval(pg_get_serial_sequence('{0}', 'id'), "
+                    "COALESCE(MAX(id), 0) + 1, false) FROM {0}".format(
+                        preparer.quote(table.name)
+                    )
+                )
+
+    def _insert_rows(self, objects):
+        """
+        Insert mapped objects of a single class with one executemany,
+        bypassing the ORM unit of work. The objects are not added to the
+        session and don't receive ids.
+        """
+        if not objects:
+            return
+        model = type(objects[0])
+        columns = _insert_columns(model)
+        rows = [{key: getattr(obj, key) for key in columns} for obj in objects]
+        self.session.execute(model.__table__.insert(), rows)
+
+    def insert_transactions(self, txs):
+        # type: (Sequence[transaction.Transaction]) -> None
+        """
+        Bulk insert transactions, committing every self.chunk_size rows.
+        """
+        for start in range(0, len(txs), self.chunk_size):
+            self._insert_rows(txs[start : start + self.chunk_size])
+            self.session.commit()
+
     def add_tx(self, userid, tx):
         assert tx
         loaded_tx = coinbase.FromCoinbaseJSON(json.loads(tx))
         loaded_tx.user_id = userid
         self.session.add(loaded_tx)
+        self._drop_snapshots(userid, loaded_tx.date)
         self.session.commit()
         val = "Transaction added for user {}. Operation is {}.\n".format(
             userid, loaded_tx.operation
         )
         return val
 
+    def _drop_snapshots(self, userid, date):
+        """
+        Delete saved pools that a change to a transaction dated `date` makes
+        stale, so a later run_basis() with `since` can't replay from them.
+
+        With no `date`, delete all of the user's saved pools.
+        """
+        snapshots = self.session.query(PoolSnapshot).filter_by(user_id=userid)
+        if date is not None:
+            snapshots = snapshots.filter(PoolSnapshot.date >= date)
+        snapshots.delete()
+
     def user_create(self, name):
         user_obj = user.User(username=name, password="")
         self.session.add(user_obj)
@@ -132,27 +606,31 @@ class SqlBackend:
         :param txid:
         :return:
         """
-        self.session.query(transaction.Transaction).filter_by(
+        txs = self.session.query(transaction.Transaction).filter_by(
             user_id=userid, id=txid
-        ).delete()
-        self.session.query(CostBasisReport).filter_by(user_id=userid).delete()
+        )
+        deleted = txs.first()
+        since = deleted.date if deleted is not None else None
+        txs.delete()
         self.session.commit()
-        self.run_basis(userid)
+        self.run_basis(userid, since)
 
     def tx_delete_by_exchange(self, userid, exchange, rerun_basis=True):
         """
         Deletes CBRs.
         """
-        count = (
-            self.session.query(transaction.Transaction)
-            .filter_by(user_id=userid, source=exchange)
-            .delete()
+        txs = self.session.query(transaction.Transaction).filter_by(
+            user_id=userid, source=exchange
         )
+        since = txs.with_entities(
+            sqlalchemy.func.min(transaction.Transaction.date)
+        ).scalar()
+        count = txs.delete()
         if count != 0:
-            self.session.query(CostBasisReport).filter_by(user_id=userid).delete()
+            self._drop_snapshots(userid, since)
             self.session.commit()
         if rerun_basis:
-            self.run_basis(userid)
+            self.run_basis(userid, since)
         return count
 
     def transactions_clear_all(self, userid):
@@ -170,9 +648,15 @@ class SqlBackend:
             user_id=userid, id=txid
         )
         obj = docs.all()[0]
+        old_date = obj.date
         for key in values:
             if key in obj.__dict__:
-                setattr(obj, key, values[key])
+                value = values[key]
+                if key == "date" and isinstance(value, str):
+                    value = parser.parse(value).replace(tzinfo=None)
+                setattr(obj, key, value)
+        dates = [d for d in (old_date, obj.date) if isinstance(d, datetime.datetime)]
+        self._drop_snapshots(userid, min(dates) if dates else None)
         self.session.commit()
 
     def tx_list(self, userid):
@@ -223,44 +707,119 @@ class SqlBackend:
             item["date"] = str(item["date"])
         return json.dumps(ans)
 
-    def import_transaction_document(self, userid, submitted_file):
+    def import_transaction_document(self, userid, submitted_file, incremental=False):
         """
         Add the tx doc for this user.
 
         - Perform inserts for each of its rows.
         - Recalculate CostBasisReports also.
 
-        @param submitted_file: a filelike object
+        @param submitted_file: a filelike object, plain or compressed with
+            gzip, bz2, xz or zip
+        @param incremental: for a newer version of an export that was already
+            imported. Only rows from the latest imported date of each source
+            onwards are kept, and basis is recalculated from the earliest of
+            those.
         exchange and userid should be strings.
         """
         text_mode_file = TextIOWrapper(submitted_file)
         submitted_file.seek(0)
         tx_file = TxFile(text_mode_file, None, None)
-        parser = TransactionParser([tx_file])
+        # A file this user uploaded before is not parsed again.
+        cache = _TaxDocCache(
+            self.session, userid, getattr(submitted_file, "filename", None)
+        )
+        since = self._latest_dates(userid) if incremental else None
+        max_uncompressed = flask.current_app.config.get(
+            "UPLOAD_MAX_UNCOMPRESSED", compression.MAX_UNCOMPRESSED_BYTES
+        )
+        parser = TransactionParser(
+            [tx_file], cache=cache, since=since, max_uncompressed=max_uncompressed
+        )
         parser.parse()
         if not parser.succeeded():
             val = flask.jsonify({"result": "failure", "flags": parser.flags})
             return make_response(val, 400)
-        parsed_txs = parser.txs
+        parsed_txs = self._without_stored(userid, parser.txs)
+        if not parsed_txs:
+            return flask.jsonify({"result": "success"})
         for tx in parsed_txs:
             tx.user_id = userid
-            self.session.add(tx)
-        self.session.commit()
+        self.insert_transactions(parsed_txs)
+        since = min((tx.date for tx in parsed_txs if tx.date), default=None)
         try:
             # It's possible for this to fail if the user uploads documents out of order (sells before buys)
             # TODO: gracefully handle transaction histories where a user reports SELL txs with no basis.
-            self.run_basis(
-                userid
-            )  # TODO: determine if this is a performance bottleneck.
+            self.run_basis(userid, since)
         except Exception as e:
             logging.warning("Failed to run basis {}".format(e))
             return flask.jsonify({"result": "failure"})
         return flask.jsonify({"result": "success"})
 
-    def run_basis(self, userid):
+    def _latest_dates(self, userid):
+        """
+        :return: the date of the user's latest transaction from each source.
+        """
+        Transaction = transaction.Transaction
+        rows = (
+            self.session.query(
+                Transaction.source, sqlalchemy.func.max(Transaction.date)
+            )
+            .filter(Transaction.user_id == userid)
+            .group_by(Transaction.source)
+        )
+        return {source: latest for source, latest in rows if latest is not None}
+
+    def _without_stored(self, userid, txs):
+        # type: (int, Sequence[transaction.Transaction]) -> List[transaction.Transaction]
+        """
+        Drop the rows of an upload that the user already has, as happens when
+        exchange exports overlap in time.
+
+        Stored transactions in the upload's date range are counted by
+        fingerprint, and each stored copy cancels one uploaded copy. Rows that
+        legitimately repeat within a file are kept, unless stored as often.
+        """
+        dates = [tx.date for tx in txs if tx.date]
+        if not dates:
+            return list(txs)
+        stored = collections.Counter(
+            tx.fingerprint()
+            for tx in self.session.query(transaction.Transaction)
+            .filter(transaction.Transaction.user_id == userid)
+            .filter(transaction.Transaction.date >= min(dates))
+            .filter(transaction.Transaction.date <= max(dates))
+            .yield_per(self.chunk_size)
+        )
+        if not stored:
+            return list(txs)
+        new_txs = []
+        for tx in txs:
+            fingerprint = tx.fingerprint()
+            if stored[fingerprint] > 0:
+                stored[fingerprint] -= 1
+            else:
+                new_txs.append(tx)
+        logging.info(
+            "skipped {} previously imported transactions".format(
+                len(txs) - len(new_txs)
+            )
+        )
+        return new_txs
+
+    def run_basis(self, userid, since=None, ohlc=None):
         """
         Clear any CostBasisReports for this user in the database. Then recalculate them.
 
+        Transactions are streamed from the database and reports bulk inserted
+        in chunks, so memory is bounded by the pool rather than the history.
+        The old reports are replaced in a single database transaction.
+
+        The pool is saved at each month boundary. When `since` is given, only
+        transactions from the latest saved pool at or before `since` onwards
+        are replayed, and only reports and saved pools after that point are
+        replaced. Flags then only cover the replayed transactions.
+
         TODO: There is some impedance mismatch between flask and python's csv
             module.  csv requires CSVs to be written as strings, while flask's
             underlying web server requires applications to write binary responses.
@@ -268,24 +827,65 @@ class SqlBackend:
             contents into memory and write to an in-memory binary file-like object
             which is handed off to flask. Fix.
 
-        Returns: just a status
+        :param since: the earliest date affected by a change to this user's
+            transactions, or None to recalculate everything.
+        :param ohlc: price source; defaults to the flask app's.
+        Returns: the BasisProcessor used
         """
-        self.session.query(costbasisreport.CostBasisReport).filter_by(
+        if ohlc is None:
+            ohlc = flask.current_app.ohlc
+        method = coinpool.PoolMethod.FIFO
+        txs = self.session.query(transaction.Transaction).filter_by(user_id=userid)
+        reports = self.session.query(costbasisreport.CostBasisReport).filter_by(
             user_id=userid
-        ).delete()
-        all_txs = list(
-            self.session.query(transaction.Transaction).filter_by(user_id=userid)
         )
+        snapshots = self.session.query(PoolSnapshot).filter_by(user_id=userid)
+        checkpoint = None
+        if since is not None:
+            checkpoint = (
+                snapshots.filter_by(method=method.name)
+                .filter(PoolSnapshot.date <= since)
+                .order_by(PoolSnapshot.date.desc())
+                .first()
+            )
+        pool = None
+        if checkpoint is not None:
+            pool = checkpoint.restore()
+            txs = txs.filter(transaction.Transaction.date >= checkpoint.date)
+            reports = reports.filter(
+                costbasisreport.CostBasisReport.date_sold >= checkpoint.date
+            )
+            snapshots = snapshots.filter(PoolSnapshot.date > checkpoint.date)
+        reports.delete()
+        snapshots.delete()
+        ordered_txs = txs.order_by(
+            transaction.Transaction.date.asc(), transaction.Transaction.id.asc()
+        ).yield_per(self.chunk_size)
         bp = basis.BasisProcessor(
-            coinpool.PoolMethod.FIFO, all_txs, flask.current_app.ohlc
+            method, ordered_txs, ohlc, pool=pool, take_checkpoints=True
         )
-        basis_reports = bp.process()
-
-        for i in basis_reports:
-            self.session.add(i)
+        checkpoints = bp.checkpoints()
+        pending = []
+        for reports, _ in bp.process_iter():
+            pending.extend(reports)
+            if len(pending) >= self.chunk_size:
+                self._insert_rows(pending)
+                self._add_snapshots(userid, method, checkpoints)
+                self.session.flush()
+                pending = []
+        self._insert_rows(pending)
+        self._add_snapshots(userid, method, checkpoints)
         self.session.commit()
         return bp
 
+    def _add_snapshots(self, userid, method, checkpoints):
+        """
+        Move checkpoints taken by a BasisProcessor into the session.
+        """
+        for date, contents in checkpoints:
+            self.session.add(PoolSnapshot(userid, method, date, contents))
+        del checkpoints[:]
+
     def reports_in_taxyear(self, userid, taxyear):
         start, end = self.get_tax_year_bounds(userid, taxyear)
         reports = (
@@ -296,6 +896,49 @@ class SqlBackend:
         )
         return reports
 
+    def report_totals(self, userid, taxyear=None):
+        """
+        Sum the user's basis reports in the database, grouped by tax year,
+        asset and holding period.
+
+        :param taxyear: optionally, only this year.
+        :return: a list of dicts with keys tax_year, asset, long_term, count,
+            proceeds, basis and gain_or_loss, ordered by the first three.
+        """
+        year = sqlalchemy.extract("year", CostBasisReport.date_sold)
+        groups = (
+            self.session.query(
+                year,
+                CostBasisReport.asset_name,
+                CostBasisReport.long_term,
+                sqlalchemy.func.count(CostBasisReport.id),
+                sqlalchemy.func.sum(CostBasisReport.proceeds),
+                sqlalchemy.func.sum(CostBasisReport.basis),
+            )
+            .filter(CostBasisReport.user_id == userid)
+            .group_by(year, CostBasisReport.asset_name, CostBasisReport.long_term)
+            .order_by(year, CostBasisReport.asset_name, CostBasisReport.long_term)
+        )
+        if taxyear is not None:
+            start, end = self.get_tax_year_bounds(userid, taxyear)
+            groups = groups.filter(
+                CostBasisReport.date_sold >= start, CostBasisReport.date_sold < end
+            )
+        return [
+            {
+                "tax_year": int(tax_year),
+                "asset": asset,
+                "long_term": bool(long_term),
+                "count": count,
+                "proceeds": proceeds,
+                "basis": basis,
+                # Both sums are of whole dollars, so this matches the sum of
+                # each report's rounded gain_or_loss.
+                "gain_or_loss": proceeds - basis,
+            }
+            for tax_year, asset, long_term, count, proceeds, basis in groups
+        ]
+
     def download_8949(self, userid, taxyear):
         # type: (int, int) -> io.BytesIO
         reports = self.reports_in_taxyear(userid, taxyear)
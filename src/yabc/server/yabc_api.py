@@ -91,6 +91,49 @@ def download_8949(taxyear):
     return result
 
 
+@yabc_api.route("/yabc/v1/report_totals", methods=["GET"])
+@check_authorized
+def report_totals():
+    """
+    Totals of the user's basis reports by tax year, asset and holding period,
+    without loading the reports themselves. Pass taxyear to limit the year.
+    """
+    userid = get_userid()
+    taxyear = flask.request.args.get("taxyear") or None
+    if taxyear is not None:
+        try:
+            taxyear = int(taxyear)
+        except ValueError:
+            val = flask.jsonify({"result": "failure", "error": "invalid taxyear"})
+            return flask.make_response(val, 400)
+    backend = sql_backend.get_db()
+    totals = backend.report_totals(userid, taxyear)
+    for row in totals:
+        for key in ("proceeds", "basis", "gain_or_loss"):
+            row[key] = str(row[key])
+    return flask.jsonify({"totals": totals})
+
+
+@yabc_api.route("/yabc/v1/ohlc_stats", methods=["GET"])
+@check_authorized
+def ohlc_stats():
+    """
+    Hit and miss counts for the app's price cache.
+    """
+    ohlc = flask.current_app.ohlc
+    return flask.jsonify(ohlc.stats() if hasattr(ohlc, "stats") else {})
+
+
+@yabc_api.route("/yabc/v1/db_stats", methods=["GET"])
+@check_authorized
+def db_stats():
+    """
+    How long this process's requests waited for a database connection.
+    """
+    stats = sql_backend.get_db().engine.pool.checkout_stats
+    return flask.jsonify(stats.as_dict())
+
+
 @yabc_api.route("/yabc/v1/taxdocs", methods=["POST", "GET"])
 @check_authorized
 def taxdocs():
@@ -99,7 +142,10 @@ def taxdocs():
     if flask.request.method == "GET":
         return backend.taxdoc_list(userid)
     submitted_file = flask.request.files["taxdoc"]
-    return backend.import_transaction_document(userid, submitted_file)
+    incremental = flask.request.args.get("incremental") in ("1", "true")
+    return backend.import_transaction_document(
+        userid, submitted_file, incremental=incremental
+    )
 
 
 @yabc_api.route("/yabc/v1/transactions/by-exchange/<exchange_name>", methods=["DELETE"])
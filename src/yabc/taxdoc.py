@@ -1,5 +1,6 @@
 from sqlalchemy import Column
 from sqlalchemy import ForeignKey
+from sqlalchemy import Index
 from sqlalchemy import Integer
 from sqlalchemy import String
 
@@ -10,9 +11,13 @@ class TaxDoc(yabc.Base):
 
     """
     TODO: If we need to store these, do so in an encrypted object storage, not as rows in a databse.
+
+    Uploads are recorded by the sha256 of their contents. `contents` holds the
+    parsed transactions in the parsecache format, not the file itself.
     """
 
     __tablename__ = "taxdoc"
+    __table_args__ = (Index("ix_taxdoc_user_id_file_hash", "user_id", "file_hash"),)
     id = Column(Integer, primary_key=True)
     user_id = Column(Integer, ForeignKey("user.id"))
     file_name = Column(String)
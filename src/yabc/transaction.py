@@ -12,6 +12,8 @@ import yabc
 
 __author__ = "Robert Karl <robertkarljr@gmail.com>"
 
+RECORD_DATE_FORMAT = "%Y-%m-%d %H:%M:%S.%f"
+
 
 class PreciseDecimalString(TypeDecorator):
     impl = sqlalchemy.String
@@ -27,6 +29,45 @@ class PreciseDecimalString(TypeDecorator):
         return Decimal(value)
 
 
+# Decimal places kept by ScaledDecimal columns.
+SATOSHI_PLACES = 8
+CENT_PLACES = 2
+
+
+class ScaledDecimal(TypeDecorator):
+    """
+    A Decimal stored as an integer count of 10**-places units, so that the
+    database can compare and SUM it.
+
+    Values with more decimal places than the column holds are rejected rather
+    than rounded.
+    """
+
+    impl = sqlalchemy.BigInteger
+
+    def __init__(self, places, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.places = places
+
+    def process_bind_param(self, value, dialect):
+        if value is None:
+            return None
+        scaled = Decimal(value).scaleb(self.places)
+        if scaled != scaled.to_integral_value():
+            raise ValueError(
+                "{} has more than {} decimal places".format(value, self.places)
+            )
+        return int(scaled)
+
+    def process_result_value(self, value, dialect):
+        if value is None:
+            value = 0
+        amount = Decimal(value).scaleb(-self.places)
+        if amount == amount.to_integral_value():
+            return amount.quantize(1)
+        return amount.normalize()
+
+
 class TransactionOperationString(TypeDecorator):
     impl = sqlalchemy.String
 
@@ -104,6 +145,12 @@ class Transaction(yabc.Base):
         SPLIT = "Split"
 
     __tablename__ = "transaction"
+    __table_args__ = (
+        sqlalchemy.Index("ix_transaction_user_id_date", "user_id", "date"),
+        sqlalchemy.Index(
+            "ix_transaction_user_id_source_date", "user_id", "source", "date"
+        ),
+    )
     id = sqlalchemy.Column(sqlalchemy.Integer, primary_key=True)
     asset_name = sqlalchemy.Column(sqlalchemy.String)  # Deprecated
     quantity = sqlalchemy.Column(PreciseDecimalString)  # Deprecated
@@ -265,6 +312,74 @@ class Transaction(yabc.Base):
             Operation.PERPETUAL_PNL,
         }
 
+    def to_record(self):
+        """
+        A compact, JSON-friendly tuple of the fields needed to rebuild this
+        transaction with `from_record`. Database ids are not included.
+        """
+        return (
+            self.operation.value,
+            self.date.strftime(RECORD_DATE_FORMAT) if self.date else None,
+            self.symbol_received,
+            str(self.quantity_received),
+            self.symbol_traded,
+            str(self.quantity_traded),
+            str(self.fees),
+            self.fee_symbol,
+            self.source,
+            self.user_id,
+        )
+
+    def fingerprint(self):
+        """
+        Identifies the same exchange row across overlapping exports.
+
+        Amounts compare by value, so "1.50" and "1.5" match.
+        """
+        return (
+            self.source,
+            self.date,
+            self.operation,
+            self.symbol_received,
+            Decimal(self.quantity_received),
+            self.symbol_traded,
+            Decimal(self.quantity_traded),
+            Decimal(self.fees),
+            self.fee_symbol,
+        )
+
+    @staticmethod
+    def from_record(record):
+        """
+        Inverse of `to_record`.
+        """
+        (
+            operation,
+            date,
+            symbol_received,
+            quantity_received,
+            symbol_traded,
+            quantity_traded,
+            fees,
+            fee_symbol,
+            source,
+            user_id,
+        ) = record
+        if date is not None:
+            date = datetime.datetime.strptime(date, RECORD_DATE_FORMAT)
+        return Transaction(
+            Transaction.Operation(operation),
+            date=date,
+            symbol_received=symbol_received,
+            quantity_received=Decimal(quantity_received),
+            symbol_traded=symbol_traded,
+            quantity_traded=Decimal(quantity_traded),
+            fees=Decimal(fees),
+            fee_symbol=fee_symbol,
+            source=source,
+            user_id=user_id,
+        )
+
     def __repr__(self):
         return "<TX {date} {operation} {rcvd} {rcvd_symbol} for {traded} {traded_symbol}, from exchange {source}. Fee {fee} {feecoin}>".format(
             date=self.date,
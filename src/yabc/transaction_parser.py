@@ -1,30 +1,132 @@
 import collections
+import concurrent.futures
+import io
 import logging
 from typing import Sequence
 
 import yabc
 import yabc.formats
+from yabc import parsecache
+from yabc import transaction
+from yabc.formats import compression
 
 TxFile = collections.namedtuple("InputFile", ("file", "binary_file", "parser_hint"))
 
 
+def _file_contents(tx_file):
+    """
+    The contents of a TxFile, in a form that can be sent to another process.
+
+    :return: (contents, encoding, has_binary) where contents are bytes, or a
+        str when only a text stream without an underlying buffer is available.
+    """
+    f, binary_file, _ = tx_file
+    if binary_file is not None:
+        binary_file.seek(0)
+        return binary_file.read(), getattr(f, "encoding", None), True
+    buffer = getattr(f, "buffer", None)
+    if buffer is not None:
+        buffer.seek(0)
+        return buffer.read(), f.encoding, False
+    f.seek(0)
+    return f.read(), None, False
+
+
+def _parse_file(contents, encoding, has_binary, parser_hint):
+    """
+    Worker entry point. Parses one file's contents on a fresh parser.
+
+    :return: the transactions as Transaction.to_record() tuples, the flags,
+        the exchange, and whether parsing succeeded.
+    """
+    yabc.formats.add_supported_exchanges()
+    if isinstance(contents, str):
+        f, binary_file = io.StringIO(contents), None
+    else:
+        f = io.TextIOWrapper(io.BytesIO(contents), encoding=encoding)
+        binary_file = io.BytesIO(contents) if has_binary else None
+    parser = TransactionParser([TxFile(f, binary_file, parser_hint)])
+    parser.parse()
+    return (
+        [tx.to_record() for tx in parser.txs],
+        parser.flags,
+        parser._exchange,
+        parser.succeeded(),
+    )
+
+
+def _file_hash(tx_file):
+    """
+    The content hash of a TxFile, matching content_hash() of
+    _file_contents(). Every stream read is left at the start.
+    """
+    f, binary_file, _ = tx_file
+    stream = binary_file if binary_file is not None else getattr(f, "buffer", None)
+    if stream is None:
+        stream = f
+    stream.seek(0)
+    file_hash = parsecache.stream_hash(stream)
+    stream.seek(0)
+    return file_hash
+
+
 class TransactionParser:
     """
     Turn collections of file-like objects into a transaction list.
     """
 
     def parse(self):
-        for f, binary_file, hinted_parser in self.files:
-            self.txs.extend(self._get_txs(f, binary_file, hinted_parser))
+        files = self._expand_compressed()
+        if self._max_workers > 1 and len(files) > 1:
+            self._parse_parallel(files)
+            return
+        for tx_file in files:
+            if self._cache is None or tx_file.parser_hint is not None:
+                self.txs.extend(self._get_txs(*tx_file))
+                continue
+            file_hash = _file_hash(tx_file)
+            cached = self._cache_get(file_hash)
+            if cached is not None:
+                self._exchange, txs = cached
+                self._success = True
+                self.txs.extend(filter(self._is_new, txs))
+                continue
+            txs = self._get_txs(*tx_file)
+            if self._since is None:
+                # Only complete results are cached.
+                self._cache_put(file_hash, txs)
+            self.txs.extend(txs)
 
-    def __init__(self, files: Sequence[TxFile]):
+    def __init__(
+        self,
+        files: Sequence[TxFile],
+        max_workers=1,
+        cache=None,
+        since=None,
+        max_uncompressed=compression.MAX_UNCOMPRESSED_BYTES,
+    ):
         """
 
         :param files: a sequence of TxFile objects.
+        :param max_workers: processes to parse files on. With more than one,
+            each file is parsed in its own process; transactions and flags
+            are still collected in the order of `files`.
+        :param cache: where to look up and store parse results by content
+            hash, with get(file_hash) and put(file_hash, contents,
+            format_class) methods, e.g. a parsecache.DirectoryCache.
+        :param since: for incremental imports, a dict from source to the date
+            of the latest transaction already imported from it. Older
+            transactions from that source are dropped as they are parsed.
+        :param max_uncompressed: the most bytes a compressed file may expand
+            to; larger files are flagged and skipped.
         """
         self.txs = []
         self.flags = []
         self.files = files
+        self._max_workers = max_workers
+        self._cache = cache
+        self._since = since
+        self._max_uncompressed = max_uncompressed
         self._exchange = None
         self._success = False
 
@@ -36,18 +138,100 @@ class TransactionParser:
     def succeeded(self):
         return self._success
 
+    def _is_new(self, tx):
+        if not self._since or tx.date is None:
+            return True
+        latest = self._since.get(tx.source)
+        return latest is None or tx.date >= latest
+
+    def _cache_get(self, file_hash):
+        """
+        :return: the Format class and transactions cached for a file, or None.
+        """
+        contents = self._cache.get(file_hash)
+        if contents is None:
+            return None
+        return parsecache.loads(contents)
+
+    def _cache_put(self, file_hash, txs):
+        if self._success:
+            contents = parsecache.dumps(self._exchange, txs)
+            self._cache.put(file_hash, contents, self._exchange)
+
+    def _expand_compressed(self):
+        """
+        Replace each compressed file with the files it holds, decompressed in
+        memory.
+        """
+        files = []
+        for tx_file in self.files:
+            f, binary_file, parser_hint = tx_file
+            raw = binary_file if binary_file is not None else getattr(f, "buffer", None)
+            if raw is None or parser_hint is not None:
+                files.append(tx_file)
+                continue
+            try:
+                members = compression.decompress(raw, self._max_uncompressed)
+            except RuntimeError as e:
+                self._success = False
+                self.flags.append(str(e))
+                continue
+            if members is None:
+                files.append(tx_file)
+                continue
+            encoding = getattr(f, "encoding", None)
+            for contents in members:
+                text_file = io.TextIOWrapper(io.BytesIO(contents), encoding=encoding)
+                files.append(TxFile(text_file, io.BytesIO(contents), None))
+        return files
+
+    def _parse_parallel(self, files):
+        workers = min(self._max_workers, len(files))
+        with concurrent.futures.ProcessPoolExecutor(workers) as executor:
+            pending = []
+            for tx_file in files:
+                file_hash = None
+                if self._cache is not None and tx_file.parser_hint is None:
+                    file_hash = _file_hash(tx_file)
+                    cached = self._cache_get(file_hash)
+                    if cached is not None:
+                        pending.append((None, cached))
+                        continue
+                # Only files that have to be parsed are read into memory, to
+                # send to a worker.
+                contents = _file_contents(tx_file)
+                future = executor.submit(_parse_file, *contents, tx_file.parser_hint)
+                pending.append((file_hash, future))
+            for file_hash, result in pending:
+                if not isinstance(result, concurrent.futures.Future):
+                    self._exchange, txs = result
+                    self._success = True
+                    self.txs.extend(filter(self._is_new, txs))
+                    continue
+                records, flags, exchange, success = result.result()
+                txs = [transaction.Transaction.from_record(r) for r in records]
+                self.flags.extend(flags)
+                if exchange is not None:
+                    self._exchange = exchange
+                self._success = success
+                if file_hash is not None:
+                    self._cache_put(file_hash, txs)
+                self.txs.extend(filter(self._is_new, txs))
+
     def _get_txs(self, f, binary_file, hinted_parser):
         if hinted_parser is not None:
-            return list(hinted_parser(f))
-        # Try formats until something works.
-        for constructor in yabc.formats.FORMAT_CLASSES:
+            return list(filter(self._is_new, hinted_parser(f)))
+        # Try the formats whose signature matches first, then the others,
+        # until one works.
+        sample = yabc.formats.FileSample(f, binary_file)
+        for constructor in yabc.formats.candidates(sample):
             try:
                 f.seek(0)
                 if constructor.needs_binary():
                     generator = constructor(binary_file)
                 else:
                     generator = constructor(f)
-                values = list(generator)
+                values = list(filter(self._is_new, generator))
                 self._exchange = constructor
                 self._success = True
                 return values
@@ -0,0 +1,72 @@
+import datetime
+import unittest
+from unittest import mock
+
+from tests.transaction_utils import make_buy
+from tests.transaction_utils import make_sale
+from yabc import basis
+from yabc import coinpool
+
+
+def _history():
+    start = datetime.datetime(2018, 1, 1)
+    txs = []
+    for day in range(365):
+        date = start + datetime.timedelta(days=day)
+        if day % 3 == 2:
+            txs.append(make_sale(quantity=1, subtotal=200, date=date))
+        else:
+            txs.append(make_buy(quantity=1, subtotal=100, date=date))
+    return txs
+
+
+class CheckpointTest(unittest.TestCase):
+    def setUp(self):
+        self.txs = _history()
+
+    def _checkpoints(self):
+        bp = basis.BasisProcessor(
+            coinpool.PoolMethod.FIFO, self.txs, take_checkpoints=True
+        )
+        reports = bp.process()
+        return reports, bp.checkpoints()
+
+    def test_spacing(self):
+        with mock.patch.multiple(
+            basis, CHECKPOINT_MIN_TXS=60, CHECKPOINT_TXS_PER_COIN=0
+        ):
+            _, checkpoints = self._checkpoints()
+        # At the first month boundary at least 60 transactions after the last.
+        dates = [date for date, _ in checkpoints]
+        self.assertEqual(
+            dates, [datetime.datetime(2018, month, 1) for month in (4, 6, 8, 10, 12)]
+        )
+
+    def test_pool_size_spaces_checkpoints(self):
+        with mock.patch.object(basis, "CHECKPOINT_MIN_TXS", 1):
+            _, checkpoints = self._checkpoints()
+        # The pool grows a coin every three days, so checkpoints thin out.
+        self.assertEqual(len(checkpoints), 2)
+        previous = datetime.datetime.min
+        for date, contents in checkpoints:
+            pool = coinpool.CoinPool.from_json(contents)
+            processed = len([tx for tx in self.txs if previous <= tx.date < date])
+            self.assertGreaterEqual(
+                processed, basis.CHECKPOINT_TXS_PER_COIN * pool.lot_count()
+            )
+            previous = date
+
+    def test_replay_from_checkpoint(self):
+        with mock.patch.object(basis, "CHECKPOINT_MIN_TXS", 60):
+            reports, checkpoints = self._checkpoints()
+        date, contents = checkpoints[-1]
+        replayed = basis.BasisProcessor(
+            coinpool.PoolMethod.FIFO,
+            [tx for tx in self.txs if tx.date >= date],
+            pool=coinpool.CoinPool.from_json(contents),
+        ).process()
+        later = [r for r in reports if r.date_sold >= date]
+        self.assertEqual(
+            [(r.quantity, r.basis, r.proceeds) for r in replayed],
+            [(r.quantity, r.basis, r.proceeds) for r in later],
+        )
@@ -0,0 +1,72 @@
+import datetime
+import decimal
+import unittest
+
+from tests.transaction_utils import make_buy
+from tests.transaction_utils import make_sale
+from yabc import basis
+from yabc import coinpool
+from yabc import parallelbasis
+from yabc import transaction
+
+
+def _coin_to_coin(traded, received, quantity, date):
+    return transaction.Transaction(
+        transaction.Operation.SELL,
+        symbol_traded=traded,
+        quantity_traded=quantity,
+        symbol_received=received,
+        quantity_received=quantity * 30,
+        date=date,
+    )
+
+
+class ParallelBasisTest(unittest.TestCase):
+    def setUp(self):
+        start = datetime.datetime(2016, 12, 20)
+        day = datetime.timedelta(1)
+        self.txs = []
+        for i, symbol in enumerate(["BTC", "ETH", "LTC", "ZEC", "BCH"] * 4):
+            date = start + i * day
+            self.txs.append(
+                make_buy(quantity=3, subtotal=100 + i, date=date, symbol=symbol)
+            )
+            self.txs.append(
+                make_sale(
+                    quantity=decimal.Decimal("1.5"),
+                    subtotal=90 + 2 * i,
+                    date=date + day / 2,
+                    symbol=symbol,
+                )
+            )
+        self.txs.append(_coin_to_coin("ETH", "BTC", 1, start + 2 * day))
+        self.txs.append(make_sale(quantity=40, date=start + 30 * day, symbol="LTC"))
+
+    def test_partition_follows_coin_to_coin(self):
+        groups = parallelbasis.partition(self.txs)
+        symbol_sets = sorted(
+            sorted({self.txs[i].asset_name for i in group}) for group in groups
+        )
+        self.assertEqual(symbol_sets, [["BCH"], ["BTC", "ETH"], ["LTC"], ["ZEC"]])
+
+    def test_matches_serial(self):
+        for method in coinpool.PoolMethod:
+            serial = basis.BasisProcessor(method, self.txs)
+            expected = serial.process()
+            parallel = parallelbasis.ParallelBasisProcessor(
+                method, self.txs, max_workers=2
+            )
+            reports = parallel.process()
+            self.assertEqual(
+                [r.to_record() for r in reports], [r.to_record() for r in expected]
+            )
+            self.assertEqual(
+                [r.triggering_transaction for r in reports],
+                [r.triggering_transaction for r in expected],
+            )
+            self.assertEqual(parallel.flags(), serial.flags())
+            for symbol in serial.get_pool().known_symbols():
+                self.assertEqual(
+                    [c.to_record() for c in parallel.get_pool().get(symbol)],
+                    [c.to_record() for c in serial.get_pool().get(symbol)],
+                )
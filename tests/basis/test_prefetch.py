@@ -0,0 +1,78 @@
+import datetime
+import decimal
+import unittest
+from unittest import mock
+
+from tests.transaction_utils import make_buy
+from yabc import basis
+from yabc import coinpool
+from yabc import ohlcprovider
+from yabc import transaction
+
+
+class _CountingOhlc(ohlcprovider.OhlcProvider):
+    def __init__(self):
+        super().__init__()
+        self.get_calls = 0
+        self.get_many_calls = []
+
+    def get(self, symbol, dt):
+        self.get_calls += 1
+        if symbol == "ETH":
+            return ohlcprovider.OhlcData(*[decimal.Decimal(10)] * 4)
+        raise ohlcprovider.NoDataError(symbol)
+
+    def get_many(self, keys):
+        keys = list(keys)
+        self.get_many_calls.append(keys)
+        return super().get_many(keys)
+
+
+def _eth_to_btc(date):
+    return transaction.Transaction(
+        operation=transaction.Operation.SELL,
+        quantity_received="0.1",
+        symbol_received="BTC",
+        quantity_traded=1,
+        symbol_traded="ETH",
+        fees="0.001",
+        fee_symbol="BTC",
+        date=date,
+    )
+
+
+class PrefetchTest(unittest.TestCase):
+    def setUp(self):
+        start = datetime.datetime(2018, 1, 1)
+        self.txs = [make_buy(quantity=30, subtotal=200, date=start, symbol="ETH")]
+        self.txs.extend(
+            _eth_to_btc(start + datetime.timedelta(hours=i)) for i in range(1, 26)
+        )
+
+    def test_one_bulk_lookup(self):
+        ohlc = _CountingOhlc()
+        reports = basis.BasisProcessor(
+            coinpool.PoolMethod.FIFO, self.txs, ohlc
+        ).process()
+        self.assertEqual(len(reports), 25)
+        self.assertEqual(len(ohlc.get_many_calls), 1)
+        # Each distinct price is looked up once, even though several are needed
+        # for every trade.
+        self.assertEqual(ohlc.get_calls, 25 * 2)
+        self.assertEqual(reports[0].proceeds, 10)
+
+    def test_batches(self):
+        ohlc = _CountingOhlc()
+        with mock.patch.object(basis, "PREFETCH_BATCH", 10):
+            bp = basis.BasisProcessor(coinpool.PoolMethod.FIFO, iter(self.txs), ohlc)
+            streamed = [
+                report for reports, _ in bp.process_iter() for report in reports
+            ]
+        self.assertEqual(len(ohlc.get_many_calls), 3)
+        expected = basis.BasisProcessor(
+            coinpool.PoolMethod.FIFO, self.txs, _CountingOhlc()
+        ).process()
+        self.assertEqual(
+            [(r.quantity, r.basis, r.proceeds) for r in streamed],
+            [(r.quantity, r.basis, r.proceeds) for r in expected],
+        )
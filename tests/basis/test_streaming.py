@@ -0,0 +1,42 @@
+import datetime
+import unittest
+
+from tests.transaction_utils import make_buy
+from tests.transaction_utils import make_sale
+from yabc import basis
+from yabc import coinpool
+
+
+class StreamingTest(unittest.TestCase):
+    def setUp(self):
+        start = datetime.datetime(2016, 1, 1)
+        day = datetime.timedelta(1)
+        self.txs = [
+            make_buy(quantity=2, subtotal=200, date=start),
+            make_sale(quantity=1, subtotal=300, date=start + day),
+            make_sale(quantity=2, subtotal=500, date=start + 2 * day),
+            make_buy(quantity=1, subtotal=100, date=start + 3 * day),
+            make_sale(quantity=1, subtotal=50, date=start + 4 * day),
+        ]
+
+    def test_matches_process(self):
+        expected_bp = basis.BasisProcessor(coinpool.PoolMethod.FIFO, self.txs)
+        expected = expected_bp.process()
+        bp = basis.BasisProcessor(coinpool.PoolMethod.FIFO, iter(self.txs))
+        streamed = []
+        streamed_flags = []
+        for reports, flags in bp.process_iter():
+            streamed.extend(reports)
+            streamed_flags.extend(flags)
+        self.assertEqual(
+            [(r.quantity, r.basis, r.proceeds) for r in streamed],
+            [(r.quantity, r.basis, r.proceeds) for r in expected],
+        )
+        self.assertEqual(streamed_flags, expected_bp.flags())
+        self.assertEqual(bp.flags(), expected_bp.flags())
+        self.assertEqual(len(bp.get_pool().get("BTC")), 0)
+
+    def test_requires_sorted_input(self):
+        bp = basis.BasisProcessor(coinpool.PoolMethod.FIFO, reversed(self.txs))
+        with self.assertRaises(RuntimeError):
+            list(bp.process_iter())
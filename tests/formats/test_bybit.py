@@ -2,6 +2,7 @@ import datetime
 import decimal
 import unittest
 from typing import Sequence
+from unittest import mock
 
 from yabc import basis
 from yabc import coinpool
@@ -53,3 +54,22 @@ class BybitXLSXTest(unittest.TestCase):
         self.assertEqual(loss.quantity_received, decimal.Decimal("-0.00047"))
         self.assertEqual(loss.quantity_traded, 0)
         self.assertEqual(loss.symbol_traded, "BTCUSD")
+
+
+class _Rows:
+    closed = False
+
+    def __next__(self):
+        return ("Date(UTC)", "Market", "Type")
+
+    def close(self):
+        self.closed = True
+
+
+class BybitHeaderTest(unittest.TestCase):
+    def test_bad_headers_close_rows(self):
+        rows = _Rows()
+        with mock.patch.object(bybit, "xlsx_rows", return_value=rows):
+            with self.assertRaises(ValueError):
+                bybit.BybitPNLParser(None)
+        self.assertTrue(rows.closed)
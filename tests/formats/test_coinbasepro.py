@@ -1,5 +1,6 @@
 import datetime
 import decimal
+import io
 import unittest
 from typing import Sequence
 
@@ -64,3 +65,13 @@ class CoinbaseProCsvTest(unittest.TestCase):
         self.assertEqual(buy_eth_with_btc.date.date(), datetime.date(2020, 1, 21))
         self.assertEqual(buy_eth_with_btc.fees, decimal.Decimal("0.000049751199256"))
         self.assertEqual(buy_eth_with_btc.fee_symbol, "BTC")
+
+    def test_streams_rows(self):
+        with open(self.filenames[0]) as f:
+            header, row = f.readline(), f.readline()
+        contents = io.StringIO(header + row * 1000)
+        parser = coinbasepro.CoinbaseProParser(file=contents)
+        first = next(parser)
+        self.assertEqual(first.symbol_received, "ETH")
+        self.assertLess(contents.tell(), len(contents.getvalue()) // 100)
+        self.assertEqual(sum(1 for _ in parser), 999)
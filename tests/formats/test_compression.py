@@ -0,0 +1,85 @@
+import bz2
+import gzip
+import io
+import lzma
+import unittest
+import zipfile
+
+from yabc import formats
+from yabc.formats import compression
+from yabc.transaction_parser import TransactionParser
+from yabc.transaction_parser import TxFile
+
+formats.add_supported_exchanges()
+
+_CSV = "testdata/coinbase-pro/fills.csv"
+_XLSX = "testdata/binance/binance-yabc-sample.xlsx"
+
+
+def _read(fname):
+    with open(fname, "rb") as f:
+        return f.read()
+
+
+def _parse(contents, **kwargs):
+    tx_file = TxFile(io.TextIOWrapper(io.BytesIO(contents)), io.BytesIO(contents), None)
+    parser = TransactionParser([tx_file], **kwargs)
+    parser.parse()
+    return parser
+
+
+def _zip(*members):
+    archive = io.BytesIO()
+    with zipfile.ZipFile(archive, "w", zipfile.ZIP_DEFLATED) as z:
+        for name, contents in members:
+            z.writestr(name, contents)
+    return archive.getvalue()
+
+
+class CompressionTest(unittest.TestCase):
+    def assertSameTxs(self, expected, actual):
+        self.assertEqual(
+            [repr(tx) for tx in expected.txs], [repr(tx) for tx in actual.txs]
+        )
+
+    def test_plain_files_are_not_archives(self):
+        for fname in (_CSV, _XLSX):
+            with open(fname, "rb") as f:
+                self.assertIsNone(compression.decompress(f))
+
+    def test_stream_formats(self):
+        plain = _read(_CSV)
+        expected = _parse(plain)
+        self.assertTrue(expected.txs)
+        for compress in (gzip.compress, bz2.compress, lzma.compress):
+            parser = _parse(compress(plain))
+            self.assertTrue(parser.succeeded(), compress)
+            self.assertSameTxs(expected, parser)
+
+    def test_zip_of_several_exports(self):
+        archive = _zip(
+            ("exports/fills.csv", _read(_CSV)),
+            ("exports/", b""),
+            ("__MACOSX/exports/._fills.csv", b"\x00"),
+            ("exports/binance.xlsx", _read(_XLSX)),
+        )
+        parser = _parse(archive)
+        self.assertFalse(parser.flags)
+        expected = _parse(_read(_CSV)).txs + _parse(_read(_XLSX)).txs
+        self.assertEqual([repr(tx) for tx in expected], [repr(tx) for tx in parser.txs])
+
+    def test_size_cap(self):
+        plain = _read(_CSV)
+        parser = _parse(gzip.compress(plain), max_uncompressed=len(plain) - 1)
+        self.assertFalse(parser.succeeded())
+        self.assertFalse(parser.txs)
+        self.assertEqual(1, len(parser.flags))
+        archive = _zip(("a.csv", plain), ("b.csv", plain))
+        parser = _parse(archive, max_uncompressed=len(plain) + 1)
+        self.assertFalse(parser.txs)
+        self.assertEqual(1, len(parser.flags))
+
+    def test_corrupt_file(self):
+        parser = _parse(gzip.compress(_read(_CSV))[:50])
+        self.assertFalse(parser.succeeded())
+        self.assertEqual(1, len(parser.flags))
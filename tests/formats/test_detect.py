@@ -0,0 +1,67 @@
+import unittest
+from unittest import mock
+
+from yabc import formats
+from yabc.formats import adhoc
+from yabc.formats import binance
+from yabc.formats import bybit
+from yabc.formats import coinbase
+from yabc.formats import coinbasepro
+from yabc.formats import coinbasettr
+from yabc.formats import gemini
+from yabc.formats import localbitcoins
+from yabc.transaction_parser import TransactionParser
+from yabc.transaction_parser import TxFile
+
+formats.add_supported_exchanges()
+
+_EXPECTED = {
+    "testdata/adhoc/adhoc.csv": adhoc.AdhocParser,
+    "testdata/binance/binance.xlsx": binance.BinanceParser,
+    "testdata/bybit/assets_history_account.xlsx": bybit.BybitPNLParser,
+    "testdata/coinbase/sample_coinbase.csv": coinbase.CoinbaseParser,
+    "testdata/coinbase/UsTaxTransactionsReport.csv": coinbasettr.CoinbaseTTRParser,
+    "testdata/coinbase-pro/fills.csv": coinbasepro.CoinbaseProParser,
+    "testdata/gemini/sample_gemini.xlsx": gemini.GeminiParser,
+    "testdata/localbitcoins/localbitcoins.csv": localbitcoins.LocalBitcoinsParser,
+}
+
+
+class DetectTest(unittest.TestCase):
+    def test_detects_each_format(self):
+        for fname, expected in _EXPECTED.items():
+            with open(fname) as f, open(fname, "rb") as binary_file:
+                sample = formats.FileSample(f, binary_file)
+                self.assertEqual(formats.detect(sample), [expected], fname)
+
+    def test_text_only_upload(self):
+        with open("testdata/coinbase-pro/fills.csv") as f:
+            sample = formats.FileSample(f)
+        self.assertEqual(formats.detect(sample), [coinbasepro.CoinbaseProParser])
+
+    def test_parser_uses_detected_format(self):
+        fname = "testdata/binance/binance.xlsx"
+        with open(fname) as f, open(fname, "rb") as binary_file:
+            parser = TransactionParser([TxFile(f, binary_file, None)])
+            parser.parse()
+        self.assertTrue(parser.succeeded())
+        self.assertEqual(parser.get_exchange_name(), "binance")
+        self.assertTrue(parser.txs)
+
+    def test_candidates_put_detected_first(self):
+        fname = "testdata/coinbase-pro/fills.csv"
+        with open(fname) as f:
+            found = formats.candidates(formats.FileSample(f))
+        self.assertEqual(found[0], coinbasepro.CoinbaseProParser)
+        self.assertEqual(set(found), set(formats.FORMAT_CLASSES))
+
+    def test_unrecognized_header_is_still_parsed(self):
+        fname = "testdata/coinbase-pro/fills.csv"
+        with mock.patch.object(
+            coinbasepro.CoinbaseProParser, "HEADER_TOKENS", ("no such column",)
+        ), open(fname) as f:
+            self.assertEqual(formats.detect(formats.FileSample(f)), [])
+            parser = TransactionParser([TxFile(f, None, None)])
+            parser.parse()
+        self.assertTrue(parser.succeeded())
+        self.assertEqual(parser.get_exchange_name(), "coinbasepro")
@@ -0,0 +1,99 @@
+import datetime
+import unittest
+
+import delorean
+from dateutil import parser
+
+from yabc.formats import timestamps
+from yabc.formats.timestamps import TimestampParser
+
+# One timestamp in each style found in the test data.
+_STYLES = (
+    "{y}-{m:02}-{d:02} {H:02}:{M:02}:{S:02}",
+    "{y}-{m:02}-{d:02}T{H:02}:{M:02}:{S:02}.{f:03}Z",
+    "{y}-{m:02}-{d:02} {H:02}:{M:02}:{S:02}+00:00",
+    "{y}/{m}/{d}",
+    "{m}/{d}/{y} {H}:{M:02}",
+    "{m:02}/{d:02}/{y}",
+)
+
+
+def _delorean(text):
+    return delorean.parse(text, dayfirst=False).datetime
+
+
+class _CountingFallback:
+    def __init__(self, fallback):
+        self.calls = 0
+        self._fallback = fallback
+
+    def __call__(self, text):
+        self.calls += 1
+        return self._fallback(text)
+
+
+def _timestamps(style, count, short_year=False):
+    start = datetime.datetime(2017, 1, 1)
+    for i in range(count):
+        t = start + datetime.timedelta(hours=7 * i, seconds=i)
+        yield style.format(
+            y=t.year % 100 if short_year else t.year,
+            m=t.month,
+            d=t.day,
+            H=t.hour,
+            M=t.minute,
+            S=t.second,
+            f=i % 1000,
+        )
+
+
+class TimestampParserTest(unittest.TestCase):
+    def assertSameResults(self, ts_parser, reference, texts):
+        for text in texts:
+            expected = reference(text)
+            actual = ts_parser.parse(text)
+            self.assertEqual(expected, actual, text)
+            self.assertIs(expected.tzinfo, actual.tzinfo, text)
+
+    def test_matches_delorean(self):
+        for style in _STYLES:
+            fallback = _CountingFallback(_delorean)
+            ts_parser = TimestampParser(fallback)
+            self.assertSameResults(ts_parser, _delorean, _timestamps(style, 200))
+            # Only the first rows are checked against the fallback.
+            self.assertEqual(timestamps.SAMPLE_SIZE, fallback.calls, style)
+
+    def test_matches_dateutil_short_year(self):
+        fallback = _CountingFallback(parser.parse)
+        ts_parser = TimestampParser(fallback, yearfirst=False)
+        texts = _timestamps("{m}/{d}/{y:02} {H}:{M:02}", 200, short_year=True)
+        self.assertSameResults(ts_parser, parser.parse, texts)
+        self.assertEqual(timestamps.SAMPLE_SIZE, fallback.calls)
+
+    def test_short_year_uses_fallback_when_yearfirst(self):
+        # delorean reads 5/6/07 as 2005-06-07.
+        ts_parser = TimestampParser()
+        texts = list(_timestamps("{m}/{d}/{y:02} {H}:{M:02}", 50, short_year=True))
+        self.assertSameResults(ts_parser, _delorean, texts)
+
+    def test_mixed_styles(self):
+        texts = []
+        for style in _STYLES:
+            texts.extend(_timestamps(style, 30))
+        texts.extend(["2018/3/6 7:57PM", "2019-01-01T00:00:00-05:00", "Jan 3 2019"])
+        self.assertSameResults(TimestampParser(), _delorean, texts)
+
+    def test_invalid_dates_use_fallback(self):
+        ts_parser = TimestampParser()
+        self.assertSameResults(ts_parser, _delorean, _timestamps(_STYLES[0], 30))
+        with self.assertRaises(ValueError):
+            ts_parser.parse("2019-02-30 00:00:00")
+
+    def test_disagreement_disables_fast_path(self):
+        def shifted(text):
+            return _delorean(text) + datetime.timedelta(hours=1)
+
+        fallback = _CountingFallback(shifted)
+        ts_parser = TimestampParser(fallback)
+        self.assertSameResults(ts_parser, shifted, _timestamps(_STYLES[0], 50))
+        self.assertEqual(50, fallback.calls)
@@ -0,0 +1,144 @@
+import datetime
+import decimal
+import pickle
+import threading
+import unittest
+from unittest import mock
+
+from yabc import ohlcprovider
+
+_OLD_DAY = datetime.datetime(2017, 1, 1)
+
+
+class _CountingSource(ohlcprovider.OhlcProvider):
+    def __init__(self):
+        super().__init__()
+        self.calls = 0
+        self.many_calls = 0
+
+    def get(self, symbol, dt):
+        self.calls += 1
+        if symbol == "NONE":
+            raise ohlcprovider.NoDataError(symbol)
+        return ohlcprovider.OhlcData(*[decimal.Decimal(len(symbol))] * 4)
+
+    def get_many(self, keys):
+        self.many_calls += 1
+        return super().get_many(keys)
+
+
+class PriceFieldTest(unittest.TestCase):
+    def test_price(self):
+        self.assertEqual(
+            ohlcprovider.OhlcProvider().price("ETH", _OLD_DAY), decimal.Decimal("8.6")
+        )
+        close = ohlcprovider.OhlcProvider("close")
+        self.assertEqual(close.price("ETH", _OLD_DAY), decimal.Decimal("8.1"))
+        self.assertEqual(
+            ohlcprovider.CachingOhlcProvider(close).price("ETH", _OLD_DAY),
+            decimal.Decimal("8.1"),
+        )
+
+    def test_unknown_field(self):
+        with self.assertRaises(ValueError):
+            ohlcprovider.OhlcProvider("median")
+
+
+class CachingOhlcProviderTest(unittest.TestCase):
+    def setUp(self):
+        self.source = _CountingSource()
+        self.cache = ohlcprovider.CachingOhlcProvider(self.source, max_size=3)
+
+    def test_hits_and_misses(self):
+        for _ in range(3):
+            self.assertEqual(self.cache.get("BTC", _OLD_DAY).high, 3)
+        self.assertEqual(self.source.calls, 1)
+        self.assertEqual(self.cache.stats(), {"hits": 2, "misses": 1, "size": 1})
+
+    def test_trades_on_one_day_share_an_entry(self):
+        morning = datetime.datetime(2017, 1, 1, 9, 30, 12)
+        evening = datetime.datetime(2017, 1, 1, 21, 5, 48)
+        self.cache.get("BTC", morning)
+        self.cache.get("BTC", evening)
+        self.assertEqual(self.cache.stats(), {"hits": 1, "misses": 1, "size": 1})
+        self.assertEqual(self.source.calls, 1)
+        prices = self.cache.get_many(
+            [("ETH", morning), ("ETH", evening), ("BTC", morning)]
+        )
+        self.assertEqual(len(prices), 3)
+        self.assertEqual(self.source.calls, 2)
+
+    def test_exact_keys_for_intraday_sources(self):
+        class _IntradaySource(_CountingSource):
+            def cache_key(self, symbol, dt):
+                return (symbol, dt)
+
+        cache = ohlcprovider.CachingOhlcProvider(_IntradaySource())
+        cache.get("BTC", datetime.datetime(2017, 1, 1, 9))
+        cache.get("BTC", datetime.datetime(2017, 1, 1, 21))
+        self.assertEqual(cache.stats()["misses"], 2)
+
+    def test_no_data_is_cached(self):
+        for _ in range(2):
+            with self.assertRaises(ohlcprovider.NoDataError):
+                self.cache.get("NONE", _OLD_DAY)
+        self.assertEqual(self.source.calls, 1)
+
+    def test_least_recently_used_is_evicted(self):
+        for symbol in ("A", "BB", "CCC"):
+            self.cache.get(symbol, _OLD_DAY)
+        self.cache.get("A", _OLD_DAY)
+        self.cache.get("DDDD", _OLD_DAY)
+        self.assertEqual(self.cache.stats()["size"], 3)
+        self.cache.get("A", _OLD_DAY)
+        self.assertEqual(self.source.calls, 4)
+        self.cache.get("BB", _OLD_DAY)
+        self.assertEqual(self.source.calls, 5)
+
+    def test_recent_prices_expire(self):
+        cache = ohlcprovider.CachingOhlcProvider(self.source, recent_ttl=60)
+        today = datetime.datetime.utcnow()
+        with mock.patch("time.monotonic", return_value=1000):
+            cache.get("BTC", today)
+            cache.get("BTC", _OLD_DAY)
+        with mock.patch("time.monotonic", return_value=1030):
+            cache.get("BTC", today)
+        self.assertEqual(self.source.calls, 2)
+        with mock.patch("time.monotonic", return_value=1061):
+            cache.get("BTC", today)
+            cache.get("BTC", _OLD_DAY)
+        self.assertEqual(self.source.calls, 3)
+
+    def test_get_many_fetches_only_misses(self):
+        self.cache.get("BTC", _OLD_DAY)
+        keys = [("BTC", _OLD_DAY), ("ETH", _OLD_DAY), ("NONE", _OLD_DAY)]
+        prices = self.cache.get_many(keys)
+        self.assertEqual(set(prices), set(keys[:2]))
+        self.assertEqual(self.source.many_calls, 1)
+        self.assertEqual(self.source.calls, 3)
+        self.assertEqual(self.cache.get_many(keys), prices)
+        self.assertEqual(self.source.many_calls, 1)
+
+    def test_threads(self):
+        cache = ohlcprovider.CachingOhlcProvider(self.source, max_size=50)
+        days = [_OLD_DAY + datetime.timedelta(days=i) for i in range(100)]
+
+        def lookup():
+            for day in days:
+                self.assertEqual(cache.get("ETH", day).close, 3)
+
+        threads = [threading.Thread(target=lookup) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        stats = cache.stats()
+        self.assertEqual(stats["hits"] + stats["misses"], 800)
+        self.assertEqual(stats["size"], 50)
+
+    def test_pickle(self):
+        self.cache.get("BTC", _OLD_DAY)
+        copy = pickle.loads(pickle.dumps(self.cache))
+        self.assertEqual(copy.max_size, 3)
+        self.assertEqual(copy.stats(), {"hits": 0, "misses": 0, "size": 0})
+        self.assertEqual(copy.get("BTC", _OLD_DAY).open, 3)
@@ -0,0 +1,214 @@
+import datetime
+import decimal
+import io
+import os
+import pickle
+import tempfile
+import threading
+import unittest
+
+from yabc import basis
+from yabc import coinpool
+from yabc import ohlcprovider
+from yabc import ohlcstore
+from yabc import transaction
+
+_CSV = """symbol,date,open,high,low,close
+BTC,2017-01-01,1000,1008.6,990,1000
+BTC,2017-01-05,1100,1150.5,1050,1120
+ETH,2017-01-01,8.5,8.6,8.0,8.1
+DOGE,2017-01-01,0.00012345,0.0002,0.0001,0.00015
+"""
+
+
+class OhlcStoreTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.assertEqual(4, ohlcstore.load_csv(self.directory.name, io.StringIO(_CSV)))
+        self.store = ohlcstore.OhlcStore(self.directory.name)
+
+    def tearDown(self):
+        self.store.close()
+        self.directory.cleanup()
+
+    def test_get(self):
+        self.assertEqual(
+            self.store.get("BTC", datetime.datetime(2017, 1, 5, 13, 30)),
+            ohlcprovider.OhlcData(
+                decimal.Decimal(1100),
+                decimal.Decimal("1150.5"),
+                decimal.Decimal(1050),
+                decimal.Decimal(1120),
+            ),
+        )
+        self.assertEqual(
+            self.store.get("DOGE", datetime.date(2017, 1, 1)).open,
+            decimal.Decimal("0.00012345"),
+        )
+        self.assertEqual(
+            sorted(os.listdir(self.directory.name)),
+            ["BTC.ohlc", "DOGE.ohlc", "ETH.ohlc"],
+        )
+
+    def test_missing_data(self):
+        for symbol, day in (
+            ("BTC", datetime.date(2017, 1, 3)),
+            ("BTC", datetime.date(2016, 12, 31)),
+            ("BTC", datetime.date(2017, 1, 6)),
+            ("XRP", datetime.date(2017, 1, 1)),
+            ("../BTC", datetime.date(2017, 1, 1)),
+        ):
+            with self.assertRaises(ohlcprovider.NoDataError):
+                self.store.get(symbol, day)
+
+    def test_load_merges(self):
+        more = "symbol,date,open,high,low,close\nBTC,2017-01-03,1,2,0.5,1.5\n"
+        ohlcstore.load_csv(self.directory.name, io.StringIO(more))
+        self.store.close()
+        self.assertEqual(
+            self.store.get("BTC", datetime.date(2017, 1, 3)).high, decimal.Decimal(2)
+        )
+        self.assertEqual(
+            self.store.get("BTC", datetime.date(2017, 1, 1)).high,
+            decimal.Decimal("1008.6"),
+        )
+
+    def test_too_many_places(self):
+        bad = "symbol,date,open,high,low,close\nBTC,2017-01-03,1,2,0.5,0.123456789\n"
+        with self.assertRaises(ValueError):
+            ohlcstore.load_csv(self.directory.name, io.StringIO(bad))
+
+    def test_pickle(self):
+        self.store.get("BTC", datetime.date(2017, 1, 1))
+        copy = pickle.loads(pickle.dumps(self.store))
+        self.assertEqual(
+            copy.get("ETH", datetime.date(2017, 1, 1)),
+            self.store.get("ETH", datetime.date(2017, 1, 1)),
+        )
+        copy.close()
+
+    def test_coin_to_coin_basis(self):
+        trade = transaction.Transaction(
+            operation=transaction.Operation.SELL,
+            quantity_received=1,
+            symbol_received="BTC",
+            quantity_traded=100,
+            symbol_traded="ETH",
+            date=datetime.datetime(2017, 1, 5),
+        )
+        buy = transaction.Transaction(
+            operation=transaction.Operation.BUY,
+            quantity_received=100,
+            symbol_received="ETH",
+            quantity_traded=850,
+            symbol_traded="USD",
+            date=datetime.datetime(2017, 1, 1),
+        )
+        processor = basis.BasisProcessor(
+            coinpool.PoolMethod.FIFO, [buy, trade], self.store
+        )
+        (report,) = processor.process()
+        self.assertEqual(report.proceeds, 1150)
+        (btc,) = processor.get_pool().get("BTC")
+        self.assertEqual(btc.quantity_traded, decimal.Decimal("1150.5"))
+
+
+_INTRADAY_CSV = """symbol,time,open,high,low,close,vwap
+BTC,2017-01-05 13:00,1100,1110,1095,1105,1104.25
+BTC,2017-01-05 14:00,1105,1130,1100,1120,
+BTC,2017-01-05T16:00:00Z,1120,1125,1115,1118,1119
+"""
+
+
+class IntradayTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        ohlcstore.load_csv(self.directory.name, io.StringIO(_CSV))
+        rows = ohlcstore.load_intraday_csv(
+            self.directory.name, io.StringIO(_INTRADAY_CSV), 3600
+        )
+        self.assertEqual(rows, 3)
+        self.store = ohlcstore.OhlcStore(self.directory.name)
+
+    def tearDown(self):
+        self.store.close()
+        self.directory.cleanup()
+
+    def test_candle_lookup(self):
+        at = lambda hour, minute=0: datetime.datetime(2017, 1, 5, hour, minute)
+        self.assertEqual(self.store.get("BTC", at(13)).close, 1105)
+        self.assertEqual(
+            self.store.get("BTC", at(13, 59)).vwap, decimal.Decimal("1104.25")
+        )
+        self.assertEqual(self.store.get("BTC", at(14, 30)).high, 1130)
+        self.assertIsNone(self.store.get("BTC", at(14, 30)).vwap)
+        self.assertEqual(self.store.get("BTC", at(16, 1)).open, 1120)
+        aware = datetime.datetime(
+            2017, 1, 5, 8, 30, tzinfo=datetime.timezone(datetime.timedelta(hours=-5))
+        )
+        self.assertEqual(self.store.get("BTC", aware).open, 1100)
+
+    def test_cache_key(self):
+        dt = datetime.datetime(2017, 1, 5, 13, 30)
+        self.assertEqual(self.store.cache_key("BTC", dt), ("BTC", dt))
+        self.assertEqual(
+            self.store.cache_key("ETH", dt), ("ETH", datetime.date(2017, 1, 5))
+        )
+
+    def test_falls_back_to_daily(self):
+        for dt in (
+            datetime.datetime(2017, 1, 5, 12, 59),
+            datetime.datetime(2017, 1, 5, 15, 0),
+            datetime.datetime(2017, 1, 5, 17, 0),
+            datetime.date(2017, 1, 5),
+        ):
+            self.assertEqual(self.store.get("BTC", dt).high, decimal.Decimal("1150.5"))
+        with self.assertRaises(ohlcprovider.NoDataError):
+            self.store.get("BTC", datetime.datetime(2017, 1, 6, 13))
+
+    def test_merge(self):
+        more = "symbol,time,open,high,low,close\nBTC,2017-01-05 15:00,1,2,0.5,1.5\n"
+        ohlcstore.load_intraday_csv(self.directory.name, io.StringIO(more), 3600)
+        self.store.close()
+        self.assertEqual(
+            self.store.get("BTC", datetime.datetime(2017, 1, 5, 15, 5)).high, 2
+        )
+        self.assertEqual(
+            self.store.get("BTC", datetime.datetime(2017, 1, 5, 13, 5)).high, 1110
+        )
+        with self.assertRaises(ValueError):
+            ohlcstore.load_intraday_csv(self.directory.name, io.StringIO(more), 60)
+
+    def test_close_while_reading(self):
+        dt = datetime.datetime(2017, 1, 5, 13, 30)
+        errors = []
+
+        def lookup():
+            try:
+                for _ in range(2000):
+                    self.assertEqual(self.store.get("BTC", dt).close, 1105)
+            except Exception as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=lookup) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        while any(thread.is_alive() for thread in threads):
+            self.store.close()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(errors, [])
+
+    def test_price_field(self):
+        dt = datetime.datetime(2017, 1, 5, 14, 30)
+        self.assertEqual(self.store.price("BTC", dt), 1130)
+        store = pickle.loads(
+            pickle.dumps(ohlcstore.OhlcStore(self.directory.name, "vwap"))
+        )
+        self.assertEqual(
+            store.price("BTC", datetime.datetime(2017, 1, 5, 13)),
+            decimal.Decimal("1104.25"),
+        )
+        # No vwap, so the typical price.
+        self.assertEqual(store.price("BTC", dt), 3350 / decimal.Decimal(3))
+        store.close()
@@ -1,8 +1,10 @@
 #  Copyright (c) 2019. Robert Karl. All rights reserved.
 #  Licensed under the MIT License. See LICENSE in the project root for license information.
 import datetime
+import decimal
 import unittest
 
+from transaction_utils import make_buy
 from yabc import coinpool
 from yabc import transaction
 
@@ -37,3 +39,56 @@ class PoolRemoveSymbolMatches(unittest.TestCase):
         self.pool.apply(diff)
         self.assertEqual(self.pool.get("BCH"), [])
         self.assertEqual(len(self.pool.get("BTC")), 1)
+
+
+class LotQueueTest(unittest.TestCase):
+    def test_matches_list_semantics(self):
+        lots = coinpool.LotQueue()
+        expected = []
+        for i in range(50):
+            lot = make_buy(quantity=i + 1)
+            lots.append(lot)
+            expected.append(lot)
+            if i % 3 == 0:
+                lot = make_buy(quantity=decimal.Decimal("0.5"))
+                lots.appendleft(lot)
+                expected.insert(0, lot)
+            if i % 7 == 0:
+                lots.popleft(2)
+                expected = expected[2:]
+            self.assertEqual(lots, expected)
+        self.assertEqual(lots[-1], expected[-1])
+        self.assertEqual(lots[1:4], expected[1:4])
+        with self.assertRaises(IndexError):
+            lots[len(expected)]
+
+    def test_popleft_past_end_empties(self):
+        lots = coinpool.LotQueue([make_buy(), make_buy()])
+        lots.popleft(5)
+        self.assertEqual(lots, [])
+        lot = make_buy()
+        lots.appendleft(lot)
+        self.assertEqual(list(lots), [lot])
+
+    def test_coins_needed_matches_linear_scan(self):
+        lots = coinpool.LotQueue()
+        for i in range(40):
+            if i % 4 == 0:
+                lots.appendleft(make_buy(quantity=decimal.Decimal("0.25")))
+            else:
+                lots.append(make_buy(quantity=decimal.Decimal(i) / 10))
+            if i % 9 == 0:
+                lots.popleft(3)
+            for quantity in (decimal.Decimal("0.25"), decimal.Decimal("3.3"), 40):
+                total = decimal.Decimal(0)
+                expected = None
+                for count, lot in enumerate(lots, 1):
+                    total += lot.quantity_received
+                    if total >= quantity:
+                        expected = count
+                        break
+                needed = lots.coins_needed(quantity)
+                self.assertEqual(needed, expected)
+                if needed is not None:
+                    self.assertEqual(lots.quantity(needed), total)
+        self.assertEqual(lots.coins_needed(0), 0)
@@ -0,0 +1,122 @@
+import datetime
+import decimal
+import pickle
+import unittest
+
+from yabc import basis
+from yabc import coinpool
+from yabc import ohlcprovider
+from yabc import pricegraph
+from yabc import transaction
+
+_DAY = datetime.date(2019, 4, 16)
+
+
+def _candle(*prices):
+    return ohlcprovider.OhlcData(*[decimal.Decimal(p) for p in prices])
+
+
+class _DailySource(ohlcprovider.OhlcProvider):
+    def __init__(self, prices):
+        super().__init__()
+        self.prices = prices
+        self.many_calls = 0
+
+    def get(self, symbol, dt):
+        if isinstance(dt, datetime.datetime):
+            dt = dt.date()
+        try:
+            return self.prices[(symbol, dt)]
+        except KeyError:
+            raise ohlcprovider.NoDataError(symbol)
+
+    def get_many(self, keys):
+        self.many_calls += 1
+        return super().get_many(keys)
+
+
+class PriceGraphTest(unittest.TestCase):
+    def setUp(self):
+        self.source = _DailySource(
+            {
+                ("BTC", _DAY): _candle(5000, 5200, 4900, 5100),
+                ("XLM-BTC", _DAY): _candle("0.00002", "0.00003", "0.00001", "0.00002"),
+                ("BTC-BNB", _DAY): _candle(250, 260, 240, 250),
+                ("XYZ-USDT", _DAY): _candle(2, 3, 1, 2),
+                ("USDT-USD", _DAY): _candle("1.01", "1.02", "0.99", "1.0"),
+                ("ABC-DEF", _DAY): _candle(1, 1, 1, 1),
+            }
+        )
+        pairs = pricegraph.pairs_in(symbol for symbol, _ in self.source.prices)
+        self.graph = pricegraph.PriceGraph(self.source, pairs)
+
+    def test_pairs_in(self):
+        self.assertEqual(
+            pricegraph.pairs_in(["BTC", "XLM-BTC", "A-B-C", "-BTC"]), [("XLM", "BTC")]
+        )
+
+    def test_through_coin(self):
+        self.assertEqual(
+            self.graph.get("XLM", _DAY), _candle("0.1", "0.156", "0.049", "0.102")
+        )
+
+    def test_through_fiat_quote(self):
+        self.assertEqual(
+            self.graph.get("XYZ", datetime.datetime(2019, 4, 16, 12)),
+            _candle("2.02", "3.06", "0.99", "2.0"),
+        )
+
+    def test_inverse_quote(self):
+        bnb = self.graph.get("BNB", _DAY)
+        self.assertEqual(bnb.open, 20)
+        # The lowest BNB price comes from the highest BTC-BNB quote.
+        self.assertEqual(bnb.low, decimal.Decimal(4900) / 260)
+        self.assertIsNone(bnb.vwap)
+
+    def test_direct_prices_win(self):
+        self.assertEqual(self.graph.get("BTC", _DAY).open, 5000)
+
+    def test_unpriced(self):
+        for symbol, day in (("ABC", _DAY), ("XLM", _DAY + datetime.timedelta(1))):
+            with self.assertRaises(ohlcprovider.NoDataError):
+                self.graph.get(symbol, day)
+
+    def test_day_built_once(self):
+        keys = [("XLM", _DAY), ("BNB", _DAY), ("BTC", _DAY), ("ABC", _DAY)]
+        prices = self.graph.get_many(keys)
+        self.assertEqual(set(prices), set(keys[:3]))
+        self.graph.get("XYZ", _DAY)
+        # One call for the keys, one to build the day.
+        self.assertEqual(self.source.many_calls, 2)
+
+    def test_pickle(self):
+        copy = pickle.loads(pickle.dumps(self.graph))
+        self.assertEqual(copy.get("XLM", _DAY), self.graph.get("XLM", _DAY))
+
+    def test_coin_to_coin_basis(self):
+        date = datetime.datetime(2019, 4, 16, 9)
+        buy = transaction.Transaction(
+            operation=transaction.Operation.BUY,
+            quantity_received=100000,
+            symbol_received="XLM",
+            quantity_traded=8000,
+            symbol_traded="USD",
+            date=date,
+        )
+        sell = transaction.Transaction(
+            operation=transaction.Operation.SELL,
+            quantity_received=10,
+            symbol_received="BNB",
+            quantity_traded=100000,
+            symbol_traded="XLM",
+            date=date + datetime.timedelta(hours=1),
+        )
+        (report,) = basis.BasisProcessor(
+            coinpool.PoolMethod.FIFO, [buy, sell], self.graph
+        ).process()
+        # 10 BNB at the BTC high of 5200 over the BTC-BNB low of 240.
+        self.assertEqual(report.proceeds, 217)
+        (report,) = basis.BasisProcessor(
+            coinpool.PoolMethod.FIFO, [buy, sell], self.source
+        ).process()
+        self.assertEqual(report.proceeds, 0)
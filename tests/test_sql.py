@@ -1,8 +1,31 @@
+import collections
+import datetime
+import decimal
+import gzip
+import io
 import json
+import os
+import tempfile
 import unittest
+from unittest import mock
 
+import flask
+import sqlalchemy
+
+from transaction_utils import make_buy
+from transaction_utils import make_sale
+from yabc import basis
+from yabc import ohlcprovider
+from yabc import taxdoc
+from yabc import transaction
 from yabc import user  # noqa
+from yabc.costbasisreport import CostBasisReport
+from yabc.costbasisreport import ReportBatch
+from yabc.poolsnapshot import PoolSnapshot
+from yabc.server import sql_backend
+from yabc.server import yabc_api
 from yabc.server.sql_backend import SqlBackend
+from yabc.transaction_parser import TransactionParser
 
 
 class SqlTest(unittest.TestCase):
@@ -25,5 +48,491 @@ class SqlTest(unittest.TestCase):
         self.assertEqual(stuff[0]["quantity_traded"], "$2.00")
 
 
+class MigrateTest(unittest.TestCase):
+    def setUp(self):
+        # A file, so that every pooled connection sees the same database.
+        handle, self.db_path = tempfile.mkstemp(suffix=".sqlite")
+        os.close(handle)
+        self.db = SqlBackend("sqlite:///{}".format(self.db_path))
+        self.db.create_tables()
+
+    def tearDown(self):
+        self.db.session.close()
+        self.db.engine.dispose()
+        os.remove(self.db_path)
+
+    def _index_names(self, table):
+        inspector = sqlalchemy.inspect(self.db.engine)
+        return {index["name"] for index in inspector.get_indexes(table)}
+
+    def test_adds_missing_indexes(self):
+        dropped = [
+            "ix_basis_report_user_id_date_sold",
+            "ix_pool_snapshot_user_id_method_date",
+            "ix_transaction_user_id_date",
+        ]
+        for name in dropped:
+            self.db.session.execute("DROP INDEX {}".format(name))
+        self.db.session.commit()
+        created = self.db.migrate()
+        self.assertEqual(sorted(created), dropped)
+        self.assertEqual(
+            self._index_names("transaction"),
+            {"ix_transaction_user_id_date", "ix_transaction_user_id_source_date"},
+        )
+        self.assertEqual(self.db.migrate(), [])
+
+    def test_drops_obsolete_indexes(self):
+        self.db.session.execute(
+            'CREATE INDEX ix_transaction_user_id_source ON "transaction" '
+            "(user_id, source)"
+        )
+        self.db.session.commit()
+        self.assertEqual(self.db.migrate(), ["ix_transaction_user_id_source"])
+        self.assertNotIn(
+            "ix_transaction_user_id_source", self._index_names("transaction")
+        )
+        self.assertEqual(self.db.migrate(), [])
+
+    def test_converts_string_amounts(self):
+        self.db.session.commit()
+        CostBasisReport.__table__.drop(self.db.engine)
+        legacy = sqlalchemy.MetaData()
+        legacy_reports = sqlalchemy.Table(
+            "basis_report",
+            legacy,
+            *(
+                sqlalchemy.Column(column.name, sqlalchemy.String)
+                if isinstance(column.type, transaction.ScaledDecimal)
+                else column.copy()
+                for column in CostBasisReport.__table__.columns
+                if not column.foreign_keys
+            ),
+            sqlalchemy.Column("user_id", sqlalchemy.Integer)
+        )
+        legacy.create_all(self.db.engine)
+        date = datetime.datetime(2018, 3, 1)
+        self.db.engine.execute(
+            legacy_reports.insert(),
+            [
+                {
+                    "user_id": 1,
+                    "basis": "100",
+                    "proceeds": "250.5",
+                    "quantity": "0.000049494219921",
+                    "adjustment": "None",
+                    "date_purchased": date,
+                    "date_sold": date,
+                    "asset_name": "BTC",
+                }
+            ],
+        )
+        created = self.db.migrate()
+        self.assertIn("basis_report", created)
+        self.assertIn("ix_basis_report_user_id_date_sold", created)
+        report = self.db.session.query(CostBasisReport).one()
+        self.assertEqual(report.basis, 100)
+        self.assertEqual(str(report.proceeds), "250.5")
+        self.assertEqual(report.adjustment, 0)
+        self.assertEqual(str(report.quantity), "0.000049494219921")
+        total = self.db.session.query(
+            sqlalchemy.func.sum(CostBasisReport.__table__.c.proceeds)
+        ).scalar()
+        self.assertEqual(total, decimal.Decimal("250.5"))
+        self.assertEqual(self.db.migrate(), [])
+
+
+class IncrementalBasisTest(unittest.TestCase):
+    def setUp(self):
+        # Checkpoint at every month boundary, however short the history.
+        patcher = mock.patch.multiple(
+            basis, CHECKPOINT_MIN_TXS=1, CHECKPOINT_TXS_PER_COIN=0
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        app = flask.Flask(__name__)
+        app.ohlc = ohlcprovider.OhlcProvider()
+        self.context = app.app_context()
+        self.context.push()
+        self.db = SqlBackend("sqlite:///:memory:")
+        self.db.create_tables()
+        self.db.user_create("incremental")
+        self.start = datetime.datetime(2016, 1, 15)
+        for i in range(12):
+            date = self.start + datetime.timedelta(days=20 * i)
+            self._add(make_buy(quantity=2, subtotal=100 * (i + 1), date=date))
+            self._add(
+                make_sale(
+                    quantity=1,
+                    subtotal=150 * (i + 1),
+                    date=date + datetime.timedelta(days=3),
+                )
+            )
+        self.db.session.commit()
+
+    def tearDown(self):
+        self.db.session.close()
+        self.context.pop()
+
+    def _add(self, tx):
+        tx.user_id = 1
+        self.db.session.add(tx)
+
+    def _report_values(self):
+        reports = self.db.session.query(CostBasisReport).order_by(
+            CostBasisReport.date_sold, CostBasisReport.date_purchased
+        )
+        return [
+            (r.date_sold, r.date_purchased, r.quantity, r.basis, r.proceeds)
+            for r in reports
+        ]
+
+    def test_incremental_matches_full(self):
+        self.db.run_basis(1)
+        self.assertGreater(self.db.session.query(PoolSnapshot).count(), 0)
+        late_sale = make_sale(
+            quantity=3, subtotal=1000, date=datetime.datetime(2016, 6, 2)
+        )
+        self._add(late_sale)
+        self.db.session.commit()
+        bp = self.db.run_basis(1, since=late_sale.date)
+        self.assertLess(bp._txs.count(), 25)
+        incremental = self._report_values()
+        self.db.run_basis(1)
+        self.assertEqual(incremental, self._report_values())
+
+    def _assert_later_run_matches_full(self, since):
+        self.db.run_basis(1, since=since)
+        incremental = self._report_values()
+        self.db.run_basis(1)
+        self.assertEqual(incremental, self._report_values())
+
+    def test_add_tx_drops_stale_snapshots(self):
+        self.db.run_basis(1)
+        sale = {
+            "Transfer Total": "500",
+            "Transfer Fee": "0",
+            "Amount": "-1.5",
+            "Currency": "BTC",
+            "Timestamp": "2016-02-15 12:00:00",
+        }
+        self.db.add_tx(1, json.dumps(sale))
+        self._assert_later_run_matches_full(datetime.datetime(2016, 9, 1))
+
+    def test_tx_update_drops_stale_snapshots(self):
+        self.db.run_basis(1)
+        # Move the last sale from December back to March.
+        self.db.tx_update(1, 24, {"date": datetime.datetime(2016, 3, 2)})
+        self._assert_later_run_matches_full(datetime.datetime(2016, 11, 1))
+
+    def test_tx_update_parses_date(self):
+        self.db.run_basis(1)
+        checkpoint = self.db.session.query(
+            sqlalchemy.func.min(PoolSnapshot.date)
+        ).scalar()
+        # As the API passes it, a string from before the earliest checkpoint.
+        earlier = checkpoint - datetime.timedelta(days=1)
+        self.db.tx_update(1, 24, {"date": earlier.isoformat()})
+        moved = self.db.session.query(transaction.Transaction).get(24)
+        self.assertEqual(moved.date, earlier)
+        stale = self.db.session.query(PoolSnapshot).filter(PoolSnapshot.date >= earlier)
+        self.assertEqual(stale.count(), 0)
+        self._assert_later_run_matches_full(datetime.datetime(2016, 11, 1))
+
+    def test_delete_by_exchange_drops_stale_snapshots(self):
+        sale = make_sale(quantity=1, subtotal=500, date=datetime.datetime(2016, 3, 2))
+        sale.source = "gemini"
+        self._add(sale)
+        self.db.session.commit()
+        self.db.run_basis(1)
+        self.assertEqual(self.db.tx_delete_by_exchange(1, "gemini", False), 1)
+        self._assert_later_run_matches_full(datetime.datetime(2016, 11, 1))
+
+    def test_delete_replays_from_checkpoint(self):
+        self.db.run_basis(1)
+        self.db.tx_delete(1, 20)
+        deleted_only = self._report_values()
+        self.db.run_basis(1)
+        self.assertEqual(deleted_only, self._report_values())
+
+
+class ReportTotalsTest(unittest.TestCase):
+    def setUp(self):
+        self.app = flask.Flask(__name__)
+        self.app.ohlc = ohlcprovider.OhlcProvider()
+        self.context = self.app.app_context()
+        self.context.push()
+        self.db = SqlBackend("sqlite:///:memory:")
+        self.db.create_tables()
+        self.db.user_create("totals")
+        bought = datetime.datetime(2016, 1, 15)
+        for symbol in ("BTC", "ETH"):
+            for tx in (
+                make_buy(symbol=symbol, quantity=4, subtotal=400, date=bought),
+                make_sale(symbol=symbol, quantity=1, subtotal=150, date=bought),
+                make_sale(
+                    symbol=symbol,
+                    quantity=2,
+                    subtotal=333,
+                    date=datetime.datetime(2017, 3, 1),
+                ),
+            ):
+                tx.user_id = 1
+                self.db.session.add(tx)
+        self.db.session.commit()
+        self.db.run_basis(1)
+
+    def tearDown(self):
+        self.db.session.close()
+        self.context.pop()
+
+    def test_totals_match_reports(self):
+        totals = self.db.report_totals(1)
+        self.assertEqual(
+            [(row["tax_year"], row["asset"], row["long_term"]) for row in totals],
+            [
+                (2016, "BTC", False),
+                (2016, "ETH", False),
+                (2017, "BTC", True),
+                (2017, "ETH", True),
+            ],
+        )
+        for row in totals:
+            reports = [
+                r
+                for r in self.db.reports_in_taxyear(1, row["tax_year"])
+                if r.asset_name == row["asset"]
+            ]
+            expected = ReportBatch(reports).totals()
+            self.assertEqual(row["count"], len(reports))
+            for key in ("proceeds", "basis", "gain_or_loss"):
+                self.assertEqual(row[key], expected[key])
+
+    def test_single_year(self):
+        totals = self.db.report_totals(1, taxyear=2017)
+        self.assertEqual({row["tax_year"] for row in totals}, {2017})
+        self.assertEqual(sum(row["count"] for row in totals), 2)
+
+    def test_bad_taxyear(self):
+        self.app.register_blueprint(yabc_api.bp)
+        with mock.patch.dict(os.environ, {"FLASK_ENV": "development"}):
+            response = self.app.test_client().get(
+                "/yabc/v1/report_totals?user_id=1&taxyear=20l7"
+            )
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.get_json()["result"], "failure")
+
+
+class BulkImportTest(unittest.TestCase):
+    def setUp(self):
+        app = flask.Flask(__name__)
+        app.ohlc = ohlcprovider.OhlcProvider()
+        self.context = app.app_context()
+        self.context.push()
+        self.db = SqlBackend("sqlite:///:memory:", chunk_size=2)
+        self.db.create_tables()
+        self.db.user_create("importer")
+
+    def tearDown(self):
+        self.db.session.close()
+        self.context.pop()
+
+    def test_import_in_chunks(self):
+        with open("testdata/adhoc/adhoc.csv", "rb") as f:
+            response = self.db.import_transaction_document(1, f)
+        self.assertEqual(response.get_json(), {"result": "success"})
+        txs = self.db.session.query(transaction.Transaction).filter_by(user_id=1)
+        self.assertGreater(txs.count(), self.db.chunk_size)
+        self.assertEqual({tx.source for tx in txs}, {"adhoc"})
+        reports = self.db.session.query(CostBasisReport).filter_by(user_id=1)
+        self.assertGreater(reports.count(), 0)
+
+    def test_gzipped_upload(self):
+        with open("testdata/adhoc/adhoc.csv", "rb") as f:
+            contents = gzip.compress(f.read())
+        response = self.db.import_transaction_document(1, io.BytesIO(contents))
+        self.assertEqual(response.get_json(), {"result": "success"})
+        txs = self.db.session.query(transaction.Transaction).filter_by(user_id=1)
+        self.assertEqual({tx.source for tx in txs}, {"adhoc"})
+
+    def test_repeat_upload_is_not_parsed(self):
+        with open("testdata/adhoc/adhoc.csv", "rb") as f:
+            self.db.import_transaction_document(1, f)
+        first = self.db.session.query(transaction.Transaction).count()
+        with mock.patch.object(TransactionParser, "_get_txs") as get_txs:
+            with open("testdata/adhoc/adhoc.csv", "rb") as f:
+                response = self.db.import_transaction_document(1, f)
+        get_txs.assert_not_called()
+        self.assertEqual(response.get_json(), {"result": "success"})
+        self.assertEqual(self.db.session.query(transaction.Transaction).count(), first)
+        docs = self.db.session.query(taxdoc.TaxDoc).all()
+        self.assertEqual(len(docs), 1)
+        self.assertEqual(docs[0].exchange, "adhoc")
+
+    def test_overlapping_upload_skips_stored_rows(self):
+        with open("testdata/adhoc/adhoc.csv", "rb") as f:
+            lines = f.readlines()
+        # The first half, then everything with one row repeated.
+        self.db.import_transaction_document(1, io.BytesIO(b"".join(lines[:4])))
+        self.assertEqual(self.db.session.query(transaction.Transaction).count(), 3)
+        overlapping = io.BytesIO(b"".join(lines + lines[-1:]))
+        response = self.db.import_transaction_document(1, overlapping)
+        self.assertEqual(response.get_json(), {"result": "success"})
+        txs = self.db.session.query(transaction.Transaction).filter_by(user_id=1)
+        self.assertEqual(txs.count(), len(lines))
+        fingerprints = collections.Counter(tx.fingerprint() for tx in txs)
+        self.assertEqual(sorted(fingerprints.values()), [1] * (len(lines) - 2) + [2])
+
+    def test_incremental_upload(self):
+        with open("testdata/adhoc/adhoc.csv", "rb") as f:
+            lines = f.readlines()
+        self.db.import_transaction_document(1, io.BytesIO(b"".join(lines[:4])))
+        with mock.patch.object(SqlBackend, "run_basis") as run_basis:
+            response = self.db.import_transaction_document(
+                1, io.BytesIO(b"".join(lines)), incremental=True
+            )
+        self.assertEqual(response.get_json(), {"result": "success"})
+        txs = self.db.session.query(transaction.Transaction).filter_by(user_id=1)
+        self.assertEqual(txs.count(), len(lines) - 1)
+        # Basis is recalculated from the first new row, dated 2018/5/1.
+        run_basis.assert_called_once_with(1, datetime.datetime(2018, 5, 1))
+
+
+class SharedEngineTest(unittest.TestCase):
+    def setUp(self):
+        handle, self.db_path = tempfile.mkstemp(suffix=".sqlite")
+        os.close(handle)
+        self.app = flask.Flask(__name__)
+        self.app.config["DATABASE"] = "sqlite:///{}".format(self.db_path)
+        self.app.config["DB_POOL_SIZE"] = 2
+        self.app.config["DB_POOL_PRE_PING"] = True
+        sql_backend.init_app(self.app)
+
+    def tearDown(self):
+        with self.app.app_context():
+            sql_backend.get_db().engine.dispose()
+        os.remove(self.db_path)
+
+    def _request(self, name):
+        with self.app.app_context():
+            db = sql_backend.get_db()
+            self.assertIs(db, sql_backend.get_db())
+            db.create_tables()
+            db.user_create(name)
+            return db
+
+    def test_engine_is_shared_between_requests(self):
+        first = self._request("first")
+        second = self._request("second")
+        self.assertIsNot(first, second)
+        self.assertIsNot(first.session, second.session)
+        self.assertIs(first.engine, second.engine)
+        self.assertEqual(first.engine.pool.size(), 2)
+        # Each request's session returned its connection on teardown.
+        self.assertEqual(first.engine.pool.checkedout(), 0)
+
+    def test_checkout_waits_are_recorded(self):
+        db = self._request("first")
+        stats = db.engine.pool.checkout_stats
+        count = stats.count
+        self._request("second")
+        self.assertGreater(stats.count, count)
+        self.assertGreaterEqual(stats.longest, stats.mean())
+        db.engine.dispose()
+        self.assertIs(db.engine.pool.checkout_stats, stats)
+
+    def test_stats_endpoint(self):
+        self.app.register_blueprint(yabc_api.bp)
+        self._request("first")
+        with mock.patch.dict(os.environ, {"FLASK_ENV": "development"}):
+            response = self.app.test_client().get("/yabc/v1/db_stats?user_id=1")
+        stats = response.get_json()
+        self.assertEqual(set(stats), {"count", "mean_wait", "max_wait"})
+        self.assertGreaterEqual(stats["count"], 1)
+        self.assertGreaterEqual(stats["max_wait"], stats["mean_wait"])
+
+    def test_show_db_config(self):
+        self._request("first")
+        result = self.app.test_cli_runner().invoke(sql_backend.show_db_command)
+        self.assertIn("pool_size = 2", result.output)
+        self.assertRegex(result.output, r"checkouts: \d+ checkouts, mean wait")
+
+
+class RecomputeBasisCommandTest(unittest.TestCase):
+    def setUp(self):
+        handle, self.db_path = tempfile.mkstemp(suffix=".sqlite")
+        os.close(handle)
+        self.app = flask.Flask(__name__)
+        self.app.config["DATABASE"] = "sqlite:///{}".format(self.db_path)
+        self.app.ohlc = ohlcprovider.OhlcProvider()
+        sql_backend.init_app(self.app)
+        db = SqlBackend(self.app.config["DATABASE"])
+        db.create_tables()
+        date = datetime.datetime(2017, 3, 1)
+        for userid in range(1, 4):
+            db.user_create("user{}".format(userid))
+            for tx in (make_buy(date=date), make_sale(subtotal=12000, date=date)):
+                tx.user_id = userid
+                db.session.add(tx)
+        db.session.commit()
+        db.session.close()
+        db.engine.dispose()
+
+    def tearDown(self):
+        os.remove(self.db_path)
+
+    def _report_users(self):
+        db = SqlBackend(self.app.config["DATABASE"])
+        users = {r.user_id for r in db.session.query(CostBasisReport)}
+        db.session.close()
+        db.engine.dispose()
+        return users
+
+    def test_recompute_all_users(self):
+        result = self.app.test_cli_runner().invoke(
+            args=["recompute-basis", "--workers", "2"]
+        )
+        self.assertEqual(result.exit_code, 0, result.output)
+        self.assertIn("Recomputed 3/3 users, 0 failed.", result.output)
+        self.assertEqual(self._report_users(), {1, 2, 3})
+
+    def test_recompute_selected_users(self):
+        result = self.app.test_cli_runner().invoke(
+            args=["recompute-basis", "--user-id", "2", "--progress-every", "1"]
+        )
+        self.assertEqual(result.exit_code, 0, result.output)
+        self.assertIn("Recomputed 1/1 users, 0 failed.", result.output)
+        self.assertEqual(self._report_users(), {2})
+
+    def test_failed_user_is_isolated(self):
+        db = SqlBackend(self.app.config["DATABASE"])
+        db.user_create("broken")
+        date = datetime.datetime(2017, 1, 1)
+        # Fees worth more than the trade give negative proceeds, which raises.
+        bad_trade = transaction.Transaction(
+            transaction.Operation.SELL,
+            symbol_traded="ETH",
+            quantity_traded=1,
+            symbol_received="BTC",
+            quantity_received="0.001",
+            fees=1,
+            fee_symbol="BTC",
+            date=date,
+        )
+        for tx in (make_buy(symbol="ETH", date=date), bad_trade):
+            tx.user_id = 4
+            db.session.add(tx)
+        db.session.commit()
+        db.session.close()
+        db.engine.dispose()
+        result = self.app.test_cli_runner().invoke(
+            args=["recompute-basis", "--workers", "2"]
+        )
+        self.assertEqual(result.exit_code, 1)
+        self.assertIn("User 4 failed", result.output)
+        self.assertIn("Recomputed 4/4 users, 1 failed.", result.output)
+        self.assertEqual(self._report_users(), {1, 2, 3})
+
+
 if __name__ == "__main__":
     unittest.main()
@@ -126,6 +126,14 @@ class TransactionTest(unittest.TestCase):
         session.add(trans)
         session.commit()
 
+    def test_scaled_decimal(self):
+        satoshis = transaction.ScaledDecimal(transaction.SATOSHI_PLACES)
+        self.assertEqual(satoshis.process_bind_param(Decimal("0.1"), None), 10000000)
+        self.assertEqual(satoshis.process_result_value(10000000, None), Decimal("0.1"))
+        self.assertEqual(str(satoshis.process_result_value(300000000, None)), "3")
+        with self.assertRaises(ValueError):
+            satoshis.process_bind_param(Decimal("0.000049494219921"), None)
+
     def test_is_coin_to_coin(self):
         trans = transaction.Transaction(
             operation=transaction.Operation.SELL,
@@ -0,0 +1,135 @@
+import contextlib
+import io
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from yabc import formats
+from yabc import parsecache
+from yabc import transaction_parser
+from yabc.transaction_parser import TransactionParser
+from yabc.transaction_parser import TxFile
+
+formats.add_supported_exchanges()
+
+_FILES = (
+    "testdata/adhoc/adhoc.csv",
+    "testdata/binance/binance-yabc-sample.xlsx",
+    "testdata/bybit/assets_history_account.xlsx",
+    "testdata/coinbase/README.md",
+    "testdata/coinbase/sample_coinbase.csv",
+    "testdata/coinbase-pro/fills.csv",
+    "testdata/gemini/sample_gemini.xlsx",
+    "testdata/localbitcoins/localbitcoins.csv",
+)
+
+
+class ParallelParseTest(unittest.TestCase):
+    def _parse(self, max_workers):
+        with contextlib.ExitStack() as stack:
+            tx_files = [
+                TxFile(
+                    stack.enter_context(open(fname)),
+                    stack.enter_context(open(fname, "rb")),
+                    None,
+                )
+                for fname in _FILES
+            ]
+            with open("testdata/coinbase-pro/fills.csv") as f:
+                tx_files.append(TxFile(io.StringIO(f.read()), None, None))
+            parser = TransactionParser(tx_files, max_workers=max_workers)
+            parser.parse()
+        return parser
+
+    def test_matches_serial(self):
+        serial = self._parse(1)
+        parallel = self._parse(3)
+        self.assertEqual(
+            [tx.to_record() for tx in serial.txs],
+            [tx.to_record() for tx in parallel.txs],
+        )
+        self.assertEqual(
+            [repr(tx) for tx in serial.txs], [repr(tx) for tx in parallel.txs]
+        )
+        self.assertEqual(1, len(parallel.flags))
+        self.assertEqual(serial.flags, parallel.flags)
+        self.assertEqual(serial.get_exchange_name(), parallel.get_exchange_name())
+        self.assertEqual(serial.succeeded(), parallel.succeeded())
+
+
+class ParseCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.cache = parsecache.DirectoryCache(self.directory.name)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def _parse(self, fname, max_workers=1):
+        with contextlib.ExitStack() as stack:
+            tx_files = [
+                TxFile(
+                    stack.enter_context(open(fname)),
+                    stack.enter_context(open(fname, "rb")),
+                    None,
+                )
+                for _ in range(2)
+            ]
+            parser = TransactionParser(
+                tx_files, max_workers=max_workers, cache=self.cache
+            )
+            parser.parse()
+        return parser
+
+    def test_stream_hash_matches_content_hash(self):
+        data = "date,amount\n2019-01-01,\u00e9\n" * 10
+        with mock.patch.object(parsecache, "HASH_CHUNK_SIZE", 7):
+            self.assertEqual(
+                parsecache.stream_hash(io.BytesIO(data.encode("utf-8"))),
+                parsecache.content_hash(data.encode("utf-8")),
+            )
+            self.assertEqual(
+                parsecache.stream_hash(io.StringIO(data)), parsecache.content_hash(data)
+            )
+
+    def test_cache_hit_does_not_read_whole_file(self):
+        fname = "testdata/coinbase-pro/fills.csv"
+        self._parse(fname)
+        for max_workers in (1, 2):
+            with mock.patch.object(
+                transaction_parser, "_file_contents", side_effect=AssertionError
+            ):
+                parser = self._parse(fname, max_workers=max_workers)
+            self.assertTrue(parser.succeeded())
+            self.assertTrue(parser.txs)
+
+    def test_repeat_parse_uses_cache(self):
+        fname = "testdata/binance/binance-yabc-sample.xlsx"
+        first = self._parse(fname)
+        self.assertEqual(1, len(os.listdir(self.directory.name)))
+        with mock.patch.object(TransactionParser, "_get_txs") as get_txs:
+            second = self._parse(fname)
+        get_txs.assert_not_called()
+        self.assertTrue(second.succeeded())
+        self.assertEqual(first.get_exchange_name(), second.get_exchange_name())
+        self.assertEqual(
+            [repr(tx) for tx in first.txs], [repr(tx) for tx in second.txs]
+        )
+
+    def test_parallel_parse_fills_cache(self):
+        fname = "testdata/coinbase-pro/fills.csv"
+        parallel = self._parse(fname, max_workers=2)
+        with mock.patch.object(TransactionParser, "_get_txs") as get_txs:
+            cached = self._parse(fname)
+        get_txs.assert_not_called()
+        self.assertEqual(
+            [repr(tx) for tx in parallel.txs], [repr(tx) for tx in cached.txs]
+        )
+
+    def test_other_parser_version_is_ignored(self):
+        fname = "testdata/coinbase-pro/fills.csv"
+        self._parse(fname)
+        with mock.patch.object(parsecache, "PARSER_VERSION", -1):
+            parser = self._parse(fname)
+        self.assertTrue(parser.txs)
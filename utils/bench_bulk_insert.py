@@ -0,0 +1,108 @@
+"""
+Compare inserting transactions and reports one ORM object at a time against
+SqlBackend's bulk path.
+
+SQLite is always measured, using a temporary file. Pass --postgres-url to
+also measure Postgres, for example:
+
+    PYTHONPATH=src python utils/bench_bulk_insert.py --rows 50000 \
+        --postgres-url postgresql://yabc@localhost/yabc_bench
+
+Every table in the Postgres database is dropped and recreated.
+"""
+import argparse
+import datetime
+import os
+import tempfile
+import time
+
+from yabc import Base
+from yabc import costbasisreport
+from yabc import transaction
+from yabc import user
+from yabc.server.sql_backend import SqlBackend
+
+
+def _make_txs(count):
+    start = datetime.datetime(2017, 1, 1)
+    return [
+        transaction.Transaction(
+            transaction.Operation.BUY,
+            symbol_received="BTC",
+            quantity_received="0.00123456",
+            symbol_traded="USD",
+            quantity_traded="12.34",
+            fees="0.05",
+            date=start + datetime.timedelta(minutes=i),
+            source="coinbase",
+            user_id=1,
+        )
+        for i in range(count)
+    ]
+
+
+def _make_reports(count):
+    return [costbasisreport.CostBasisReport.make_random_report() for _ in range(count)]
+
+
+def _fresh_backend(db_url, chunk_size):
+    db = SqlBackend(db_url, chunk_size=chunk_size)
+    Base.metadata.drop_all(db.engine)
+    db.create_tables()
+    db.session.add(user.User("bench", ""))
+    db.session.commit()
+    return db
+
+
+def _orm_insert(db, objects):
+    for obj in objects:
+        db.session.add(obj)
+    db.session.commit()
+
+
+def _bulk_insert(db, objects):
+    if isinstance(objects[0], transaction.Transaction):
+        db.insert_transactions(objects)
+        return
+    # As run_basis() writes reports: a chunk at a time, one commit at the end.
+    for start in range(0, len(objects), db.chunk_size):
+        db._insert_rows(objects[start : start + db.chunk_size])
+        db.session.flush()
+    db.session.commit()
+
+
+def _measure(name, db_url, rows, chunk_size):
+    for kind, make in (("transactions", _make_txs), ("reports", _make_reports)):
+        for label, insert in (("orm", _orm_insert), ("bulk", _bulk_insert)):
+            db = _fresh_backend(db_url, chunk_size)
+            objects = make(rows)
+            start = time.perf_counter()
+            insert(db, objects)
+            elapsed = time.perf_counter() - start
+            db.session.close()
+            db.engine.dispose()
+            print(
+                "{:<9} {:<13} {:<5} {:>10.0f} rows/s".format(
+                    name, kind, label, rows / elapsed
+                )
+            )
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=50000)
+    parser.add_argument("--chunk-size", type=int, default=1000)
+    parser.add_argument("--postgres-url")
+    args = parser.parse_args()
+    handle, path = tempfile.mkstemp(suffix=".sqlite")
+    os.close(handle)
+    try:
+        _measure("sqlite", "sqlite:///{}".format(path), args.rows, args.chunk_size)
+    finally:
+        os.remove(path)
+    if args.postgres_url:
+        _measure("postgres", args.postgres_url, args.rows, args.chunk_size)
+
+
+if __name__ == "__main__":
+    main()
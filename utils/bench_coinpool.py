@@ -0,0 +1,96 @@
+"""
+Time basis calculations for a dollar-cost-averaging history.
+
+Each run buys a small lot every hour and sells a larger amount once a day, so
+the pool holds many open lots and every sale consumes several of them. Time
+per transaction should stay flat as the history grows.
+
+With --checkpoints, each size is also run with the pool checkpoints that
+run_basis takes, to show how much they add to a full recompute and how
+much they would store.
+
+Usage:
+
+    PYTHONPATH=src python utils/bench_coinpool.py --sizes 10000 100000 1000000
+    PYTHONPATH=src python utils/bench_coinpool.py --sizes 100000 --checkpoints
+"""
+import argparse
+import datetime
+import time
+
+from yabc import basis
+from yabc import coinpool
+from yabc import transaction
+
+
+def _make_history(count):
+    start = datetime.datetime(2015, 1, 1)
+    hour = datetime.timedelta(hours=1)
+    txs = []
+    for i in range(count):
+        date = start + i * hour
+        if i % 24 == 23:
+            txs.append(
+                transaction.Transaction(
+                    transaction.Operation.SELL,
+                    symbol_traded="BTC",
+                    quantity_traded="0.015",
+                    symbol_received="USD",
+                    quantity_received=150,
+                    date=date,
+                )
+            )
+        else:
+            txs.append(
+                transaction.Transaction(
+                    transaction.Operation.BUY,
+                    symbol_traded="USD",
+                    quantity_traded=10,
+                    symbol_received="BTC",
+                    quantity_received="0.001",
+                    date=date,
+                )
+            )
+    return txs
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--sizes", nargs="+", type=int, default=[10000, 100000, 1000000]
+    )
+    parser.add_argument(
+        "--method", choices=[m.name for m in coinpool.PoolMethod], default="FIFO"
+    )
+    parser.add_argument("--checkpoints", action="store_true")
+    args = parser.parse_args()
+    method = coinpool.PoolMethod[args.method]
+    for size in args.sizes:
+        txs = _make_history(size)
+        start = time.perf_counter()
+        reports = basis.BasisProcessor(method, txs).process()
+        elapsed = time.perf_counter() - start
+        print(
+            "{:>9} txs {:>9} reports {:8.2f}s {:8.2f}us/tx".format(
+                size, len(reports), elapsed, elapsed / size * 1e6
+            )
+        )
+        if args.checkpoints:
+            start = time.perf_counter()
+            bp = basis.BasisProcessor(method, txs, take_checkpoints=True)
+            bp.process()
+            with_checkpoints = time.perf_counter() - start
+            checkpoints = bp.checkpoints()
+            print(
+                "{:>9} with {} checkpoints, {:.1f} MB: {:.2f}s, {:+.0%}".format(
+                    "",
+                    len(checkpoints),
+                    sum(len(contents) for _, contents in checkpoints) / 1e6,
+                    with_checkpoints,
+                    with_checkpoints / elapsed - 1,
+                )
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,166 @@
+"""
+Show how the per-user indexes change the plans and timings of the hot
+queries.
+
+The script seeds a database without the indexes, with transactions and basis
+reports spread over many users. It explains and times each query, runs
+SqlBackend.migrate() to add the indexes, and repeats the measurements.
+
+    PYTHONPATH=src python utils/bench_indexes.py --rows 1000000
+
+Pass --postgres-url to use Postgres instead of a temporary SQLite file. Every
+table in that database is dropped and recreated.
+"""
+import argparse
+import datetime
+import os
+import random
+import tempfile
+import time
+
+import sqlalchemy
+
+from yabc import Base
+from yabc import costbasisreport
+from yabc import transaction
+from yabc import user
+from yabc.server.sql_backend import SqlBackend
+
+CHUNK = 10000
+
+QUERIES = (
+    ("tx_list", 'SELECT * FROM "transaction" WHERE user_id = :user ORDER BY date'),
+    (
+        "tx_delete_by_exchange",
+        'SELECT min(date) FROM "transaction" '
+        "WHERE user_id = :user AND source = :source",
+    ),
+    (
+        "reports_in_taxyear",
+        "SELECT * FROM basis_report WHERE user_id = :user "
+        "AND date_sold >= :start AND date_sold < :end",
+    ),
+)
+
+
+def _seed(db, rows, users):
+    Base.metadata.drop_all(db.engine)
+    Base.metadata.create_all(db.engine)
+    for table in (transaction.Transaction, costbasisreport.CostBasisReport):
+        for index in list(table.__table__.indexes):
+            index.drop(db.engine)
+    db.session.execute(
+        user.User.__table__.insert(),
+        [{"username": "user{}".format(i), "password": ""} for i in range(users)],
+    )
+    rng = random.Random(0)
+    start = datetime.datetime(2015, 1, 1)
+    sources = ["coinbase", "gemini", "binance", "adhoc"]
+    for offset in range(0, rows, CHUNK):
+        count = min(CHUNK, rows - offset)
+        dates = [
+            start + datetime.timedelta(minutes=rng.randrange(5 * 365 * 24 * 60))
+            for _ in range(count)
+        ]
+        userids = [rng.randrange(users) + 1 for _ in range(count)]
+        db.session.execute(
+            transaction.Transaction.__table__.insert(),
+            [
+                {
+                    "user_id": userid,
+                    "date": date,
+                    "source": rng.choice(sources),
+                    "operation": transaction.Operation.BUY,
+                    "symbol_received": "BTC",
+                    "quantity_received": "0.01",
+                    "symbol_traded": "USD",
+                    "quantity_traded": "100",
+                    "fees": "1",
+                }
+                for userid, date in zip(userids, dates)
+            ],
+        )
+        db.session.execute(
+            costbasisreport.CostBasisReport.__table__.insert(),
+            [
+                {
+                    "user_id": userid,
+                    "date_sold": date,
+                    "date_purchased": date,
+                    "asset_name": "BTC",
+                    "basis": "100",
+                    "proceeds": "120",
+                    "quantity": "0.01",
+                    "adjustment": "0",
+                    "long_term": False,
+                }
+                for userid, date in zip(userids, dates)
+            ],
+        )
+        db.session.commit()
+
+
+def _explain(db, sql, params):
+    if db.engine.dialect.name == "sqlite":
+        rows = db.session.execute("EXPLAIN QUERY PLAN " + sql, params)
+        return [row[-1] for row in rows]
+    return [row[0] for row in db.session.execute("EXPLAIN " + sql, params)]
+
+
+def _measure(db, params, repeat):
+    for name, sql in QUERIES:
+        print("{}:".format(name))
+        for line in _explain(db, sql, params):
+            print("    {}".format(line))
+        start = time.perf_counter()
+        for _ in range(repeat):
+            db.session.execute(sqlalchemy.text(sql), params).fetchall()
+        elapsed = (time.perf_counter() - start) / repeat
+        print("    {:.2f} ms per query".format(elapsed * 1000))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=1000000)
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--postgres-url")
+    args = parser.parse_args()
+    path = None
+    db_url = args.postgres_url
+    if db_url is None:
+        handle, path = tempfile.mkstemp(suffix=".sqlite")
+        os.close(handle)
+        db_url = "sqlite:///{}".format(path)
+    try:
+        db = SqlBackend(db_url)
+        start = time.perf_counter()
+        _seed(db, args.rows, args.users)
+        print(
+            "Seeded {} transactions and reports in {:.1f}s".format(
+                args.rows, time.perf_counter() - start
+            )
+        )
+        params = {
+            "user": args.users // 2,
+            "source": "gemini",
+            "start": datetime.datetime(2017, 1, 1),
+            "end": datetime.datetime(2018, 1, 1),
+        }
+        print("\nWithout indexes\n")
+        _measure(db, params, args.repeat)
+        db.session.commit()
+        print("\nCreated {}".format(", ".join(db.migrate())))
+        if db.engine.dialect.name == "sqlite":
+            db.session.execute("ANALYZE")
+        print("\nWith indexes\n")
+        _measure(db, params, args.repeat)
+        db.session.close()
+        db.engine.dispose()
+    finally:
+        if path is not None:
+            os.remove(path)
+
+
+if __name__ == "__main__":
+    main()
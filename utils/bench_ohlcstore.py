@@ -0,0 +1,137 @@
+"""
+Time bulk loading and lookups in the memory-mapped OHLC store.
+
+Generates daily prices for many symbols, loads them from CSV, then looks up
+random days. Lookups should cost the same however many symbols are stored.
+With --minutes, also loads a year of minute candles for one symbol and
+times the binary search on its own as well as full lookups.
+
+Usage:
+
+    PYTHONPATH=src python utils/bench_ohlcstore.py --symbols 1000 --days 3650
+    PYTHONPATH=src python utils/bench_ohlcstore.py --minutes 525600
+"""
+import argparse
+import datetime
+import io
+import random
+import tempfile
+import time
+
+from yabc import ohlcstore
+
+
+def _make_csv(symbols, days):
+    start = datetime.date(2015, 1, 1)
+    out = io.StringIO()
+    out.write("symbol,date,open,high,low,close\n")
+    for s in range(symbols):
+        for d in range(days):
+            price = 1 + (s * 7 + d) % 1000
+            out.write(
+                "S{},{},{},{},{},{}\n".format(
+                    s,
+                    start + datetime.timedelta(days=d),
+                    price,
+                    price + 1,
+                    price,
+                    price,
+                )
+            )
+    out.seek(0)
+    return out
+
+
+def _make_intraday_csv(minutes):
+    start = datetime.datetime(2019, 1, 1)
+    out = io.StringIO()
+    out.write("symbol,time,open,high,low,close,vwap\n")
+    for m in range(minutes):
+        price = 5000 + m % 1000
+        out.write(
+            "BTC,{:%Y-%m-%d %H:%M},{},{},{},{},{}\n".format(
+                start + datetime.timedelta(minutes=m),
+                price,
+                price + 2,
+                price - 1,
+                price + 1,
+                price + 0.5,
+            )
+        )
+    out.seek(0)
+    return out
+
+
+def _time(label, fn, args):
+    start = time.perf_counter()
+    for arg in args:
+        fn(*arg)
+    elapsed = time.perf_counter() - start
+    print("{}: {:.2f} us each".format(label, elapsed / len(args) * 1e6))
+
+
+def _bench_intraday(directory, minutes, lookups):
+    start = time.perf_counter()
+    rows = ohlcstore.load_intraday_csv(
+        directory, _make_intraday_csv(minutes), ohlcstore.INTERVALS["minute"]
+    )
+    elapsed = time.perf_counter() - start
+    print("loaded {} minute candles in {:.2f}s".format(rows, elapsed))
+
+    store = ohlcstore.OhlcStore(directory, price_field="vwap")
+    first = datetime.datetime(2019, 1, 1)
+    queries = [
+        ("BTC", first + datetime.timedelta(seconds=random.randrange(minutes * 60)))
+        for _ in range(lookups)
+    ]
+    store.get(*queries[0])
+    candles = store._file("BTC", ohlcstore._INTRADAY_SUFFIX)
+    stamps = [(ohlcstore._timestamp(dt),) for _, dt in queries]
+    _time("intraday search", candles.get, stamps)
+    _time("intraday lookups", store.get, queries)
+    _time("intraday prices", store.price, queries)
+    store.close()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--symbols", type=int, default=1000)
+    parser.add_argument("--days", type=int, default=3650)
+    parser.add_argument("--lookups", type=int, default=200000)
+    parser.add_argument("--minutes", type=int, default=0)
+    args = parser.parse_args()
+    if args.minutes:
+        with tempfile.TemporaryDirectory() as directory:
+            _bench_intraday(directory, args.minutes, args.lookups)
+        return
+    csv_file = _make_csv(args.symbols, args.days)
+    with tempfile.TemporaryDirectory() as directory:
+        start = time.perf_counter()
+        rows = ohlcstore.load_csv(directory, csv_file)
+        elapsed = time.perf_counter() - start
+        print("loaded {} rows in {:.2f}s".format(rows, elapsed))
+
+        store = ohlcstore.OhlcStore(directory)
+        first = datetime.datetime(2015, 1, 1)
+        queries = [
+            (
+                "S{}".format(random.randrange(args.symbols)),
+                first + datetime.timedelta(days=random.randrange(args.days)),
+            )
+            for _ in range(args.lookups)
+        ]
+        for attempt in ("cold", "warm"):
+            start = time.perf_counter()
+            for symbol, dt in queries:
+                store.get(symbol, dt)
+            elapsed = time.perf_counter() - start
+            print(
+                "{} lookups: {:.2f} us each".format(
+                    attempt, elapsed / len(queries) * 1e6
+                )
+            )
+        store.close()
+
+
+if __name__ == "__main__":
+    main()
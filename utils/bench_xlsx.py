@@ -0,0 +1,99 @@
+"""
+Compare peak memory and time for reading a Binance trade history with
+openpyxl's full mode, as the parser used to, against the streaming read-only
+path.
+
+Each measurement runs in a fresh process so that peak RSS is its own.
+
+Usage:
+
+    PYTHONPATH=src python utils/bench_xlsx.py --rows 200000
+"""
+import argparse
+import datetime
+import multiprocessing
+import os
+import resource
+import tempfile
+import time
+
+import openpyxl
+
+from yabc.formats import binance
+
+
+def _write_history(path, count):
+    workbook = openpyxl.Workbook(write_only=True)
+    sheet = workbook.create_sheet()
+    sheet.append(binance._HEADERS)
+    start = datetime.datetime(2018, 1, 1)
+    for i in range(count):
+        date = start + datetime.timedelta(minutes=i)
+        side = "BUY" if i % 2 == 0 else "SELL"
+        sheet.append(
+            [
+                date.strftime("%Y-%m-%d %H:%M:%S"),
+                "ETHBTC",
+                side,
+                "0.031975",
+                "0.615",
+                "0.01966462",
+                "0.000615",
+                "ETH",
+            ]
+        )
+    workbook.save(path)
+
+
+def _read_full(path):
+    with open(path, "rb") as f:
+        workbook = openpyxl.load_workbook(f)
+        rows = list(workbook.active.rows)
+        binance._raise_if_headers_bad([cell.value for cell in rows[0]])
+        return sum(
+            1
+            for row in rows[1:]
+            if binance._tx_from_binance_row([cell.value for cell in row])
+        )
+
+
+def _read_streaming(path):
+    with open(path, "rb") as f:
+        return sum(1 for _ in binance.BinanceParser(f))
+
+
+def _measure(reader, path, results):
+    start = time.perf_counter()
+    count = reader(path)
+    elapsed = time.perf_counter() - start
+    # ru_maxrss is in kilobytes on Linux.
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    results.put((count, elapsed, peak))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=200000)
+    args = parser.parse_args()
+    handle, path = tempfile.mkstemp(suffix=".xlsx")
+    os.close(handle)
+    context = multiprocessing.get_context("spawn")
+    try:
+        _write_history(path, args.rows)
+        for name, reader in (("full", _read_full), ("streaming", _read_streaming)):
+            results = context.Queue()
+            process = context.Process(target=_measure, args=(reader, path, results))
+            process.start()
+            count, elapsed, peak = results.get()
+            process.join()
+            print(
+                "{:<10} {} transactions in {:.1f}s, peak RSS {:.0f} MiB".format(
+                    name, count, elapsed, peak / 1024
+                )
+            )
+    finally:
+        os.remove(path)
+
+
+if __name__ == "__main__":
+    main()